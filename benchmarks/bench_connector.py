@@ -0,0 +1,111 @@
+from argparse import ArgumentParser
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from statistics import quantiles
+from time import perf_counter
+
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.connectors import SlotTakenException, UpstreamUnavailableException
+from vaccination.login import StaticLoginProvider
+from vaccination.ratelimit import RateLimiter
+from vaccination.resilience import CircuitOpenException
+from vaccination.scanning import DailyScan, CursorScan
+from vaccination.services import VaccinationAppointmentService
+
+FIRST_DAY = date(2021, 12, 13)
+
+
+def percentiles(latencies):
+    if len(latencies) < 2:
+        return latencies[0], latencies[0]
+    cuts = quantiles(latencies, n=100, method='inclusive')
+    return cuts[49], cuts[98]
+
+
+class Scenario:
+    def __init__(self, arguments, concurrency):
+        self.arguments = arguments
+        self.concurrency = concurrency
+        self.adapter = ReplayAdapter(random_slots(FIRST_DAY, arguments.days, arguments.slots_per_day, seed=1),
+                                     latency=arguments.latency)
+        self.service = VaccinationAppointmentService(replay_connector_type(self.adapter))
+        self.authentication = self.service.authentication(StaticLoginProvider({'username': 'u', 'password': 'p'}))
+        # errors are only injected into the measured operations, not into setting them up
+        self.adapter.error_rate = arguments.error_rate
+
+    def close(self):
+        self.service.pool.close()
+
+    def run(self, name, operation, upstream_endpoint):
+        calls_before = sum(self.adapter.calls.values())
+        endpoint_before = self.adapter.calls[upstream_endpoint]
+        latencies = []
+        errors = 0
+        started = perf_counter()
+        for _ in range(self.arguments.repeat):
+            operation_started = perf_counter()
+            try:
+                operation()
+            except (UpstreamUnavailableException, CircuitOpenException):
+                errors += 1  # an injected error failed the whole operation, it still took its time
+            latencies.append(perf_counter() - operation_started)
+        elapsed = perf_counter() - started
+        calls = sum(self.adapter.calls.values()) - calls_before
+        p50, p99 = percentiles(latencies)
+        print(f'{name:<14} {self.concurrency:>5} {calls / elapsed:>9.1f} {p50 * 1e3:>9.1f} {p99 * 1e3:>9.1f} '
+              f'{(self.adapter.calls[upstream_endpoint] - endpoint_before) / self.arguments.repeat:>10.1f} '
+              f'{errors / self.arguments.repeat:>7.0%}')
+
+    def scan(self, strategy_factory):
+        return lambda: self.service.appointments_in_range(self.authentication, FIRST_DAY, self.arguments.days,
+                                                          strategy=strategy_factory())
+
+    def logins(self):
+        def login(index):
+            return self.service.authentication(StaticLoginProvider({'username': f'user{index}', 'password': 'p'}))
+
+        def operation():
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                list(executor.map(login, range(self.concurrency)))
+        return operation
+
+    def bookings(self):
+        def book(slot):
+            try:
+                self.service.book_appointment(self.authentication, slot)
+            except SlotTakenException:
+                pass  # somebody else won the race for this slot
+
+        def operation():
+            with ThreadPoolExecutor(max_workers=self.concurrency) as executor:
+                list(executor.map(book, self.adapter.slots[:self.concurrency]))
+        return operation
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='benchmark the connector against the offline replay adapter')
+    parser.add_argument('--levels', type=int, nargs='+', default=[1, 4, 8, 16], help='concurrency levels')
+    parser.add_argument('--latency', type=float, default=.02, help='simulated upstream latency in seconds')
+    parser.add_argument('--error-rate', type=float, default=0, help='share of upstream calls answered with 503')
+    parser.add_argument('--slots-per-day', type=float, default=.5)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--repeat', type=int, default=5)
+    parser.add_argument('--paced', action='store_true', help='keep the rate limiter configured from the env')
+    arguments = parser.parse_args(argv)
+    if not arguments.paced:
+        RateLimiter.use_shared(RateLimiter(rate=1_000_000, capacity=1_000_000))
+
+    print(f'{"operation":<14} {"conc.":>5} {"req/s":>9} {"p50 ms":>9} {"p99 ms":>9} {"calls/op":>10} {"errors":>7}')
+    for concurrency in arguments.levels:
+        scenario = Scenario(arguments, concurrency)
+        try:
+            scenario.run('daily scan', scenario.scan(lambda: DailyScan(max_workers=concurrency)), 'appointments/next')
+            scenario.run('cursor scan', scenario.scan(CursorScan), 'appointments/next')
+            scenario.run('login', scenario.logins(), 'login')
+            scenario.run('booking', scenario.bookings(), 'booking')
+        finally:
+            scenario.close()
+
+
+if __name__ == '__main__':
+    main()
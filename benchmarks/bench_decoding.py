@@ -0,0 +1,115 @@
+import json
+from argparse import ArgumentParser
+from datetime import date, datetime
+from time import perf_counter
+
+from requests import Response
+from requests.structures import CaseInsensitiveDict
+
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination import decoding
+from vaccination.entities import Appointment, slot_date_time
+from vaccination.login import StaticLoginProvider
+from vaccination.ratelimit import RateLimiter
+from vaccination.scanning import DailyScan
+from vaccination.services import VaccinationAppointmentService
+
+FIRST_DAY = date(2021, 12, 13)
+
+
+def slot_responses(slots):
+    responses = []
+    for slot in slots:
+        response = Response()
+        response.status_code = 200
+        response._content = json.dumps({'siteId': slot.site, 'vaccinationDate': slot.date_time.date().isoformat(),
+                                        'vaccinationTime': slot.date_time.time().isoformat('minutes')}).encode()
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json'})
+        responses.append(response)
+    return responses
+
+
+def parse_text(responses):
+    # what the connector did before: charset detection, a str copy and a fresh fromisoformat per slot
+    appointments = []
+    for response in responses:
+        slot_json = json.loads(response.text)
+        appointments.append(Appointment(slot_json['siteId'], datetime.fromisoformat(
+            f'{slot_json["vaccinationDate"]} {slot_json["vaccinationTime"]}')))
+    return appointments
+
+
+def parse_response_json(responses):
+    appointments = []
+    for response in responses:
+        slot_json = response.json()
+        appointments.append(Appointment(slot_json['siteId'], datetime.fromisoformat(
+            f'{slot_json["vaccinationDate"]} {slot_json["vaccinationTime"]}')))
+    return appointments
+
+
+def parse_bytes(loads):
+    return lambda responses: [Appointment.from_json(loads(response.content)) for response in responses]
+
+
+def best_of(parse, responses, repeat):
+    timings = []
+    for _ in range(repeat):
+        slot_date_time.cache_clear()
+        started = perf_counter()
+        parse(responses)
+        timings.append(perf_counter() - started)
+    return min(timings)
+
+
+def scan_seconds(days, loads, repeat):
+    adapter = ReplayAdapter(random_slots(FIRST_DAY, days, per_day=1, seed=1))
+    service = VaccinationAppointmentService(replay_connector_type(adapter))
+    authentication = service.authentication(StaticLoginProvider({'username': 'u', 'password': 'p'}))
+    default_loads, decoding.loads = decoding.loads, loads
+    try:
+        timings = []
+        for _ in range(repeat):
+            slot_date_time.cache_clear()
+            started = perf_counter()
+            service.appointments_in_range(authentication, FIRST_DAY, days, strategy=DailyScan(max_workers=1))
+            timings.append(perf_counter() - started)
+        return min(timings), adapter.calls['appointments/next'] // repeat
+    finally:
+        decoding.loads = default_loads
+        service.pool.close()
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='benchmark decoding slot payloads into appointments')
+    parser.add_argument('--slots', type=int, default=5000, help='slot payloads to decode')
+    parser.add_argument('--days', type=int, default=2000, help='days walked by the replayed scan')
+    parser.add_argument('--repeat', type=int, default=5)
+    arguments = parser.parse_args(argv)
+    RateLimiter.use_shared(RateLimiter(rate=1_000_000, capacity=1_000_000))
+
+    default_backend, default_loads = decoding.backend()
+    backends = {'json': json.loads}
+    if 'orjson' == default_backend:
+        backends['orjson'] = default_loads
+    responses = slot_responses(random_slots(FIRST_DAY, arguments.slots // 8, per_day=8, seed=1)[:arguments.slots])
+    cases = {'response.text + json': parse_text, 'response.json()': parse_response_json}
+    for name, loads in backends.items():
+        cases[f'bytes + {name}'] = parse_bytes(loads)
+
+    print(f'[{len(responses)}] slot payloads, decoding with [{default_backend}] by default')
+    print(f'{"case":<28} {"total ms":>10} {"µs/slot":>9} {"speedup":>8}')
+    baseline = None
+    for name, parse in cases.items():
+        seconds = best_of(parse, responses, arguments.repeat)
+        baseline = baseline or seconds
+        print(f'{name:<28} {seconds * 1e3:>10.1f} {seconds / len(responses) * 1e6:>9.2f} {baseline / seconds:>7.1f}x')
+
+    print(f'\n{"replayed daily scan":<28} {"total ms":>10} {"µs/call":>9}')
+    for name, loads in backends.items():
+        seconds, calls = scan_seconds(arguments.days, loads, arguments.repeat)
+        print(f'{name:<28} {seconds * 1e3:>10.1f} {seconds / calls * 1e6:>9.1f}')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+from timeit import Timer
+
+from benchmarks.replay import KEYCLOAK_PAGE, LOGIN_PAGE
+from vaccination.parsing import _fast_login_form_action, _soup_login_form_action, _fast_login_feedback, \
+    _soup_login_feedback
+
+CASES = {
+    'form action (replay)': (_soup_login_form_action, _fast_login_form_action, LOGIN_PAGE),
+    'form action (keycloak)': (_soup_login_form_action, _fast_login_form_action, KEYCLOAK_PAGE),
+    'feedback (keycloak)': (_soup_login_feedback, _fast_login_feedback, KEYCLOAK_PAGE),
+}
+
+
+def best_of(function, html, number):
+    return min(Timer(lambda: function(html)).repeat(repeat=5, number=number)) / number
+
+
+def main(number=2000):
+    print(f'{"case":<24} {"soup µs":>10} {"fast µs":>10} {"speedup":>8}')
+    for case, (soup, fast, html) in CASES.items():
+        soup_time = best_of(soup, html, number)
+        fast_time = best_of(fast, html, number)
+        print(f'{case:<24} {soup_time * 1e6:>10.1f} {fast_time * 1e6:>10.1f} {soup_time / fast_time:>7.1f}x')
+
+
+if __name__ == '__main__':
+    main()
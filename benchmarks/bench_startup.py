@@ -0,0 +1,81 @@
+import os
+import re
+import subprocess
+import sys
+from argparse import ArgumentParser
+from statistics import median
+from time import perf_counter, sleep
+from urllib.request import urlopen
+
+from web.server import bind
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODULES = ('cli', 'app', 'web.server', 'vaccination.connectors')
+IMPORT_TIME = re.compile(r'^import time:\s+\d+ \|\s+(\d+) \|(\s*)(\S+)$')
+
+
+def import_seconds(module):
+    # cumulative time of the top level import, the interpreter's own site imports are not ours to fix
+    output = subprocess.run([sys.executable, '-X', 'importtime', '-c', f'import {module}'], cwd=ROOT,
+                            check=True, capture_output=True, text=True).stderr
+    for line in output.splitlines():
+        match = IMPORT_TIME.match(line)
+        if match and ' ' == match.group(2) and module == match.group(3):
+            return int(match.group(1)) / 1e6
+    raise ValueError(f'no import time reported for [{module}]')
+
+
+def process_seconds(*arguments):
+    started = perf_counter()
+    subprocess.run([sys.executable, *arguments], cwd=ROOT, check=True, stdout=subprocess.DEVNULL)
+    return perf_counter() - started
+
+
+def first_request_seconds(timeout=30):
+    listening = bind('127.0.0.1', 0)
+    port = listening.getsockname()[1]
+    listening.close()
+    started = perf_counter()
+    server = subprocess.Popen([sys.executable, '-m', 'web.server', '--host', '127.0.0.1', '--port', str(port)],
+                              cwd=ROOT, env={**os.environ, 'PREFETCH_LOGIN_LINKS': '0'},
+                              stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    try:
+        while perf_counter() - started < timeout:
+            try:
+                with urlopen(f'http://127.0.0.1:{port}/', timeout=5) as response:
+                    if 200 == response.status:
+                        return perf_counter() - started
+            except OSError:
+                sleep(.005)
+        raise TimeoutError(f'no response on port [{port}] within [{timeout}]s')
+    finally:
+        server.kill()
+        server.wait()
+
+
+def main(argv=None):
+    parser = ArgumentParser(description='measure how long the entry points take to become useful')
+    parser.add_argument('--repeat', type=int, default=5, help='runs per measurement, the median is reported')
+    parser.add_argument('--max-import-ms', type=float, help='fail if any import exceeds this budget')
+    arguments = parser.parse_args(argv)
+
+    over_budget = []
+    print(f'{"measurement":<30} {"median ms":>10} {"min ms":>8} {"max ms":>8}')
+
+    def report(name, measure):
+        timings = [measure() * 1e3 for _ in range(arguments.repeat)]
+        print(f'{name:<30} {median(timings):>10.1f} {min(timings):>8.1f} {max(timings):>8.1f}')
+        return median(timings)
+
+    for module in MODULES:
+        if report(f'import {module}', lambda: import_seconds(module)) > (arguments.max_import_ms or float('inf')):
+            over_budget.append(module)
+    report('python cli.py --help', lambda: process_seconds('cli.py', '--help'))
+    report('web.server first request', first_request_seconds)
+
+    if over_budget:
+        sys.exit(f'import budget of [{arguments.max_import_ms}]ms exceeded by {over_budget}')
+
+
+if __name__ == '__main__':
+    main()
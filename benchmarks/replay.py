@@ -0,0 +1,158 @@
+import json
+import random
+from collections import Counter
+from datetime import datetime, date, timedelta, time
+from threading import Lock
+from time import sleep, perf_counter
+from typing import List, Optional, Callable, Dict
+from urllib.parse import urlparse, parse_qs
+
+from requests import Response
+from requests.adapters import BaseAdapter
+from requests.structures import CaseInsensitiveDict
+
+from vaccination.connectors import ImpzentrenBayernConnector
+from vaccination.entities import Appointment
+
+LOGIN_ACTION_URL = 'https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/login-actions/authenticate' \
+                   '?session_code=replay&execution=replay&client_id=c19v-frontend&tab_id=replay'
+LOGIN_PAGE = f'''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Anmeldung bei C19V-Citizen</title></head>
+<body><form id="kc-form-login" action="{LOGIN_ACTION_URL.replace('&', '&amp;')}" method="post">
+<input name="username"><input name="password" type="password"></form></body></html>'''
+INVALID_CREDENTIALS_PAGE = f'''<!DOCTYPE html>
+<html><head><title>Anmeldung bei C19V-Citizen</title></head><body>
+<div class="alert alert-error"><span class="kc-feedback-text">{ImpzentrenBayernConnector.INVALID_CREDENTIALS_TEXT}</span>
+</div></body></html>'''
+# a login page as keycloak renders it after a failed attempt, with its feedback and the next form
+KEYCLOAK_PAGE = '''<!DOCTYPE html>
+<html><head><meta charset="utf-8"><title>Anmeldung bei C19V-Citizen</title></head>
+<body>
+<div class='alert alert-error'><span class="kc-feedback-text">Ung&uuml;ltiger Benutzername oder Passwort.</span></div>
+<form id="kc-form-login" onsubmit="login.disabled = true; return true;"
+      action="https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/login-actions/authenticate?session_code=abc&amp;execution=def&amp;client_id=c19v-frontend&amp;tab_id=ghi"
+      method="post">
+</form>
+</body></html>'''
+
+
+def random_slots(first_day: date, days: int, per_day: float, sites=('site a', 'site b'), seed=0) -> List[Appointment]:
+    generator = random.Random(seed)
+    slots = set()
+    for day in range(days + 1):
+        for _ in range(int(per_day) + (generator.random() < per_day % 1)):
+            slot_time = time(generator.randrange(8, 18), generator.choice((0, 15, 30, 45)))
+            slots.add(Appointment(generator.choice(sites),
+                                  datetime.combine(first_day + timedelta(days=day), slot_time)))
+    return sorted(slots)
+
+
+class ReplayAdapter(BaseAdapter):
+    def __init__(self, slots: List[Appointment] = (), latency: float = 0, error_rate: float = 0,
+                 passwords: Dict[str, str] = None, seed: int = 0, clock: Callable[[], float] = perf_counter):
+        super().__init__()
+        self.slots = sorted(slots)
+        self.latency = latency
+        self.error_rate = error_rate
+        self.passwords = passwords
+        self.booked: Optional[Appointment] = None
+        self.booking_refusal: Optional[int] = None
+        self.calls = Counter()
+        self.timings: List[tuple] = []
+        self.clock = clock
+        self._random = random.Random(seed)
+        self._lock = Lock()
+
+    def mount(self, connector: ImpzentrenBayernConnector) -> ImpzentrenBayernConnector:
+        connector._session.mount('https://', self)
+        return connector
+
+    def close(self):
+        pass
+
+    def send(self, request, **kwargs):
+        started = self.clock()
+        endpoint, status, body, headers = self._route(request)
+        with self._lock:
+            failed = self._random.random() < self.error_rate
+        if self.latency:
+            sleep(self.latency)
+        if failed:
+            status, body, headers = 503, 'upstream unavailable', {}
+        with self._lock:
+            self.calls[endpoint] += 1
+            self.timings.append((endpoint, status, self.clock() - started))
+        return self._response(request, status, body, headers)
+
+    def _route(self, request):
+        url = urlparse(request.url)
+        path = url.path
+        if path.endswith('/protocol/openid-connect/auth'):
+            return 'auth', 200, LOGIN_PAGE, {}
+        if path.endswith('/login-actions/authenticate'):
+            return ('login',) + self._login(parse_qs(request.body or ''))
+        if path.endswith('/protocol/openid-connect/token'):
+            return 'token', 200, json.dumps({'token_type': 'Bearer', 'access_token': 'replay token',
+                                             'refresh_token': 'replay refresh token', 'expires_in': 300}), {}
+        if path.endswith('/users/current/citizens'):
+            return 'citizens', 200, json.dumps([{'id': 'citizen_id'}]), {}
+        if path.endswith('/appointments/next'):
+            return ('appointments/next',) + self._next_appointment(parse_qs(url.query))
+        if path.endswith('/appointments/') and 'POST' == request.method:
+            return ('booking',) + self._book(json.loads(request.body))
+        if path.endswith('/appointments/'):
+            return ('appointments',) + self._current_appointment()
+        return 'unknown', 404, '{}', {}
+
+    def _login(self, form):
+        username, password = form.get('username', [''])[0], form.get('password', [''])[0]
+        if self.passwords is not None and self.passwords.get(username) != password:
+            return 200, INVALID_CREDENTIALS_PAGE, {}
+        return 302, '', {'Location': 'https://impfzentren.bayern/citizen/#state=replay&code=replay-code'}
+
+    def _next_appointment(self, query):
+        last = datetime.fromisoformat(f'{query["lastDate"][0]} {query["lastTime"][0]}')
+        with self._lock:
+            slot = next((slot for slot in self.slots if slot.date_time >= last), None)
+        if slot is None:
+            return 404, '{}', {}
+        return 200, json.dumps({'siteId': slot.site,
+                                'vaccinationDate': slot.date_time.date().isoformat(),
+                                'vaccinationTime': slot.date_time.time().isoformat('minutes')}), {}
+
+    def _current_appointment(self):
+        future = [] if self.booked is None else [{'slotId': {'siteId': self.booked.site,
+                                                             'date': self.booked.date_time.date().isoformat(),
+                                                             'time': self.booked.date_time.time().isoformat()}}]
+        return 200, json.dumps({'futureAppointments': future, 'pastAppointments': []}), {}
+
+    def _book(self, book_json):
+        appointment = Appointment(book_json['siteId'], datetime.fromisoformat(
+            f'{book_json["vaccinationDate"]} {book_json["vaccinationTime"]}'))
+        with self._lock:
+            if self.booking_refusal is not None:
+                return self.booking_refusal, '{"error": "booking refused"}', {}
+            if appointment not in self.slots:
+                return 409, '{"error": "slot taken"}', {}
+            self.slots.remove(appointment)
+            self.booked = appointment
+        return 200, '{}', {}
+
+    @staticmethod
+    def _response(request, status, body, headers):
+        response = Response()
+        response.status_code = status
+        response._content = body.encode('utf-8')
+        response.encoding = 'utf-8'
+        response.headers = CaseInsensitiveDict({'Content-Type': 'application/json', **headers})
+        response.url = request.url
+        response.request = request
+        return response
+
+
+def replay_connector_type(adapter: ReplayAdapter):
+    class ReplayConnector(ImpzentrenBayernConnector):
+        def mount_adapter(self, pool_connections: int, pool_maxsize: int):
+            adapter.mount(self)
+
+    return ReplayConnector
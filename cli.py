@@ -1,30 +1,116 @@
 from __future__ import annotations
 import logging
+from argparse import ArgumentParser
 from logging import getLogger
 from datetime import datetime, timedelta
 from logging import basicConfig
 
+from vaccination.booking import BookingEngine
 from vaccination.connectors import ImpzentrenBayernConnector
-from vaccination.login import FileLoginProvider
+from vaccination.history import SlotHistory
+from vaccination.login import FileLoginProvider, AccountsFileLoginProvider
+from vaccination.monitor import BatchMonitor, summary_table
+from vaccination.pool import ConnectorPool
+from vaccination.scanning import DailyScan, CursorScan
 from vaccination.services import VaccinationAppointmentService
+from vaccination.watcher import SlotWatcher, LoggingCallback, AutoBookCallback
 
+SCAN_WORKERS = 8
+SCAN_DAYS = 60
 
-def main():
+
+def scan_strategy(arguments):
+    if 'cursor' == arguments.strategy:
+        return CursorScan()
+    return DailyScan(max_workers=arguments.workers)
+
+
+def parse_arguments(argv=None):
+    parser = ArgumentParser(description='look for vaccination appointments in bavaria')
+    parser.add_argument('--strategy', choices=('daily', 'cursor'), default='daily',
+                        help='walk every day (optionally in parallel) or jump from slot to slot')
+    parser.add_argument('--workers', type=int, default=SCAN_WORKERS,
+                        help='concurrent requests for the daily scan')
+    parser.add_argument('--history', metavar='PATH', help='record every slot found in this SQLite file')
+    commands = parser.add_subparsers(dest='command')
+    monitor = commands.add_parser('monitor', help='check many accounts at once')
+    monitor.add_argument('accounts', help='JSON list or JSON lines file of {"username": .., "password": ..}')
+    monitor.add_argument('--concurrency', type=int, default=SCAN_WORKERS,
+                         help='accounts checked in parallel')
+    watch = commands.add_parser('watch', help='keep polling and report slots as they appear')
+    watch.add_argument('--interval', type=float, default=60, help='seconds between polls')
+    watch.add_argument('--auto-book', action='store_true', help='book the first slot that appears')
+    history = commands.add_parser('history', help='list slots recorded with --history')
+    history.add_argument('--site', help='only slots at this site')
+    history.add_argument('--days', type=int, default=7, help='slots from today until this many days ahead')
+    return parser.parse_args(argv)
+
+
+def main(arguments=None):
+    arguments = arguments or parse_arguments([])
     now = datetime.now()
-    later = now + timedelta(days=60)
+    later = now + timedelta(days=SCAN_DAYS)
     log = getLogger(__name__).info
+    history = SlotHistory(arguments.history) if arguments.history else None
+    if 'history' == arguments.command:
+        assert history, 'history needs --history PATH'
+        return show_history(history, arguments, now)
     log(f'looking for appointment [{now}] to [{later}]...')
-    service = VaccinationAppointmentService(ImpzentrenBayernConnector)
+    with ConnectorPool(ImpzentrenBayernConnector, prefetch_logins='monitor' == arguments.command) as pool:
+        service = VaccinationAppointmentService(ImpzentrenBayernConnector, pool, history)
+        if 'monitor' == arguments.command:
+            monitor(service, arguments, now)
+        elif 'watch' == arguments.command:
+            watch(service, arguments)
+        else:
+            search(service, arguments, now)
+    log('done.')
+
+
+def search(service, arguments, now):
+    log = getLogger(__name__).info
     authentication = service.authentication(FileLoginProvider())
     if service.has_next_appointment(authentication):
         log(f'your next appointment is {service.current_appointment(authentication)}')
     else:
-        for appointment in service.appointments_in_range(authentication, now, 60):
+        for appointment in service.appointments_in_range(authentication, now, SCAN_DAYS,
+                                                         strategy=scan_strategy(arguments)):
             log(appointment)
-    log('done.')
+
+
+def monitor(service, arguments, now):
+    batch_monitor = BatchMonitor(service, max_workers=arguments.concurrency)
+    reports, appointments = batch_monitor.check(AccountsFileLoginProvider(arguments.accounts).login_providers(),
+                                                now, SCAN_DAYS, strategy_factory=lambda: scan_strategy(arguments))
+    print(summary_table(reports, appointments))
+
+
+def watch(service, arguments):
+    authentication = service.authentication(FileLoginProvider())
+    watcher = SlotWatcher(service, authentication, days=SCAN_DAYS, interval=arguments.interval,
+                          strategy_factory=lambda: scan_strategy(arguments), callbacks=[LoggingCallback()])
+    if arguments.auto_book:
+        engine = BookingEngine(service, authentication)
+        watcher.add_callback(AutoBookCallback(engine, on_booked=lambda _: watcher.stop()))
+    try:
+        watcher.run()
+    except KeyboardInterrupt:
+        watcher.stop()
+
+
+def show_history(history, arguments, now):
+    start = datetime.combine(now.date(), datetime.min.time())
+    records = history.slots(site=arguments.site, start=start, end=start + timedelta(days=arguments.days))
+    for record in records:
+        print(f'{record.date_time} {record.site:<40} seen {record.first_seen:%Y-%m-%d %H:%M} '
+              f'for {timedelta(seconds=round(record.lifetime))}')
+    mean_lifetime = history.mean_lifetime(site=arguments.site, start=start,
+                                          end=start + timedelta(days=arguments.days))
+    if mean_lifetime is not None:
+        print(f'[{len(records)}] slots, seen for [{timedelta(seconds=round(mean_lifetime))}] on average')
 
 
 if __name__ == '__main__':
     basicConfig(level=logging.INFO)
     getLogger(ImpzentrenBayernConnector.__name__).setLevel(logging.DEBUG)
-    main()
+    main(parse_arguments())
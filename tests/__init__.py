@@ -0,0 +1,13 @@
+import os
+import sys
+
+from vaccination.ratelimit import RateLimiter
+from vaccination.resilience import Hedging, CircuitBreaker
+
+# fixtures answer instantly, pacing them would only slow the suite down
+RateLimiter.use_shared(RateLimiter(rate=1_000_000, capacity=1_000_000))
+# hedges would duplicate the upstream calls tests count, injected errors must not fail fast in later tests
+Hedging.use_shared(Hedging(min_samples=sys.maxsize))
+CircuitBreaker.use_shared(CircuitBreaker(failures=sys.maxsize))
+# and must never reach out to the real login page in the background
+os.environ['PREFETCH_LOGIN_LINKS'] = '0'
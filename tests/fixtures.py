@@ -8,6 +8,7 @@ class ResponseFixture(Response):
         super().__init__()
         self.url = url
         self._text = text
+        self._content = text.encode('utf-8')
         self.status_code = status_code
 
     @property
@@ -0,0 +1,74 @@
+from datetime import date, datetime
+from unittest import IsolatedAsyncioTestCase
+
+from more_itertools import one
+
+from tests.fixtures import ResponseFixture, ResponseFixtures, FixtureLoginProvider
+from vaccination.aio import AsyncImpzentrenBayernConnector, AsyncVaccinationAppointmentService
+from vaccination.connectors import Authentication, InvalidCredentialsException, \
+    AuthenticationRefreshNeededException
+from vaccination.entities import Appointment
+
+
+class AsyncImpzentrenBayernConnectorMock(AsyncImpzentrenBayernConnector):
+    def __init__(self):
+        super().__init__()
+        self.fixtures = ResponseFixtures.fixtures()
+        self._client.get = self._fixture
+        self._client.post = self._fixture
+
+    async def _fixture(self, url, **_):
+        return self.fixtures[url]
+
+
+class AsyncImpzentrenBayernConnectorTest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.connector = AsyncImpzentrenBayernConnectorMock()
+
+    async def asyncTearDown(self) -> None:
+        await self.connector.close()
+
+    async def test_login(self):
+        self.assertEqual('testcode', await self.connector.login({'username': None, 'password': None}))
+
+    async def test_raises_credentials_error(self):
+        self.connector.fixtures['http://test.login'] = ResponseFixture(
+            200, f'<div class="alert alert-error"><span class="kc-feedback-text">'
+                 f'{self.connector.INVALID_CREDENTIALS_TEXT}')
+        with self.assertRaises(InvalidCredentialsException):
+            await self.connector.login({'username': None, 'password': None})
+
+    async def test_raises_expired_auth(self):
+        self.connector.fixtures['https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/next'] \
+            .status_code = 401
+        with self.assertRaises(AuthenticationRefreshNeededException):
+            await self.connector.get_next_appointment(date(2021, 12, 12))
+
+    async def test_find_appointments_concurrently(self):
+        self.assertEqual(Appointment('site id', datetime(2021, 12, 13, 15, 0)),
+                         one(await self.connector.get_appointments_in_range(date(2021, 12, 13), days=5,
+                                                                            max_concurrency=3)))
+
+    async def test_book_appointment(self):
+        self.assertIsNone(await self.connector.book_appointment(Appointment('site', datetime.now())))
+
+
+class AsyncVaccinationAppointmentServiceTest(IsolatedAsyncioTestCase):
+    async def asyncSetUp(self) -> None:
+        self.service = AsyncVaccinationAppointmentService(AsyncImpzentrenBayernConnectorMock)
+        self.authentication = await self.service.authentication(FixtureLoginProvider())
+
+    async def asyncTearDown(self) -> None:
+        await self.service.close()
+
+    async def test_login(self):
+        self.assertEqual(Authentication('test token', 'test refresh token'), self.authentication)
+
+    async def test_current_appointment(self):
+        self.assertTrue(await self.service.has_next_appointment(self.authentication))
+        self.assertEqual(Appointment('site id', datetime(2021, 12, 13, 15, 0)),
+                         await self.service.current_appointment(self.authentication))
+
+    async def test_next_appointment(self):
+        self.assertEqual(Appointment('site id', datetime(2021, 12, 13, 15, 0)),
+                         await self.service.next_appointment(self.authentication, date(2021, 12, 13)))
@@ -0,0 +1,204 @@
+from datetime import date
+from unittest import TestCase
+
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.pool import ConnectorPool
+from vaccination.services import VaccinationAppointmentService
+from vaccination.snapshot import SnapshotRefresher
+from web import create_app
+
+
+class ApiTestCase(TestCase):
+    def setUp(self) -> None:
+        self.test_app = create_app()
+        self.adapter = ReplayAdapter(random_slots(date.today(), days=5, per_day=1, seed=11),
+                                     passwords={'user': 'secret'})
+        connector_type = replay_connector_type(self.adapter)
+        self.pool = ConnectorPool(connector_type)
+        self.refresher = SnapshotRefresher(VaccinationAppointmentService(connector_type, self.pool), days=5)
+        self.test_app.extensions['connector_pool'] = self.pool
+        self.test_app.extensions['slot_refresher'] = self.refresher
+        self.test_client = self.test_app.test_client()
+
+    def tearDown(self) -> None:
+        self.refresher.stop()
+        self.pool.close()
+
+    def login(self):
+        response = self.test_client.post('/api/v1/session', json={'username': 'user', 'password': 'secret'})
+        self.assertEqual(204, response.status_code, response.data)
+
+
+class SessionApiTest(ApiTestCase):
+    def test_rejects_wrong_password(self):
+        response = self.test_client.post('/api/v1/session', json={'username': 'user', 'password': 'wrong'})
+
+        self.assertEqual(401, response.status_code)
+
+    def test_requires_login(self):
+        self.assertEqual(401, self.test_client.get('/api/v1/appointments').status_code)
+
+    def test_cookie_carries_only_session_id(self):
+        self.login()
+
+        with self.test_client.session_transaction() as session:
+            self.assertEqual(['sid'], list(session.keys()))
+
+    def test_logout_ends_server_side_session(self):
+        self.login()
+        self.assertEqual(204, self.test_client.delete('/api/v1/session').status_code)
+
+        self.assertEqual(0, len(self.test_app.extensions['session_store']))
+        self.assertEqual(401, self.test_client.get('/api/v1/appointments').status_code)
+
+    def test_logout_withdraws_authentication_from_background_scan(self):
+        self.login()
+        self.test_client.get('/api/v1/slots')
+        self.assertIsNotNone(self.refresher._authentication)
+
+        self.test_client.delete('/api/v1/session')
+        self.assertIsNone(self.refresher._authentication)
+
+    def test_session_remembers_citizen(self):
+        self.login()
+        self.test_client.get('/api/v1/appointments')
+        self.pool.read_cache.citizens.clear()
+        self.pool.read_cache.current_appointments.clear()
+
+        self.test_client.get('/api/v1/appointments')
+        self.assertEqual(1, self.adapter.calls['citizens'])
+
+    def test_validates_payload(self):
+        self.assertEqual(400, self.test_client.post('/api/v1/session', json={'username': 'user'}).status_code)
+
+
+class AppointmentsApiTest(ApiTestCase):
+    def test_no_current_appointment(self):
+        self.login()
+
+        self.assertEqual({'appointment': None}, self.test_client.get('/api/v1/appointments').json)
+
+    def test_books_appointment(self):
+        self.login()
+        slot = self.adapter.slots[0]
+        booking = {'siteId': slot.site, 'vaccinationDate': slot.date_time.date().isoformat(),
+                   'vaccinationTime': slot.date_time.time().isoformat('minutes')}
+
+        response = self.test_client.post('/api/v1/appointments', json=booking)
+
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(booking, response.json)
+        self.assertEqual(slot, self.adapter.booked)
+        self.assertEqual({'appointment': booking}, self.test_client.get('/api/v1/appointments').json)
+
+    def test_taken_slot_conflicts(self):
+        self.login()
+        taken = {'siteId': 'site a', 'vaccinationDate': '2000-01-01', 'vaccinationTime': '08:00'}
+
+        response = self.test_client.post('/api/v1/appointments', json=taken)
+
+        self.assertEqual(409, response.status_code)
+        self.assertIsNone(self.adapter.booked)
+
+    def test_refused_booking_is_not_a_conflict(self):
+        self.login()
+        self.adapter.booking_refusal = 422
+        slot = self.adapter.slots[0]
+        booking = {'siteId': slot.site, 'vaccinationDate': slot.date_time.date().isoformat(),
+                   'vaccinationTime': slot.date_time.time().isoformat('minutes')}
+
+        response = self.test_client.post('/api/v1/appointments', json=booking)
+
+        self.assertEqual(422, response.status_code)
+        self.assertIn('refused the booking with [422]', response.json['message'])
+
+    def test_unavailable_upstream(self):
+        self.login()
+        self.adapter.error_rate = 1
+
+        self.assertEqual(503, self.test_client.get('/api/v1/appointments').status_code)
+
+    def test_books_first_free_candidate(self):
+        self.login()
+        slot = self.adapter.slots[1]
+        taken = {'siteId': 'site a', 'vaccinationDate': '2000-01-01', 'vaccinationTime': '08:00'}
+        free = {'siteId': slot.site, 'vaccinationDate': slot.date_time.date().isoformat(),
+                'vaccinationTime': slot.date_time.time().isoformat('minutes')}
+
+        response = self.test_client.post('/api/v1/appointments/candidates', json={'candidates': [taken, free]})
+
+        self.assertEqual(201, response.status_code)
+        self.assertEqual(free, response.json)
+        self.assertEqual(slot, self.adapter.booked)
+
+
+class SlotsApiTest(ApiTestCase):
+    def test_lists_slots_of_snapshot(self):
+        self.login()
+
+        response = self.test_client.get('/api/v1/slots')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(len(self.adapter.slots), len(response.json['slots']))
+        self.assertEqual(5, response.json['days'])
+        self.assertEqual(f'"{self.refresher.snapshot.etag}"', response.headers['ETag'])
+
+    def test_answers_unchanged_slots_with_not_modified(self):
+        self.login()
+        etag = self.test_client.get('/api/v1/slots').headers['ETag']
+
+        response = self.test_client.get('/api/v1/slots', headers={'If-None-Match': etag})
+
+        self.assertEqual(304, response.status_code)
+        self.assertEqual(b'', response.data)
+        self.assertEqual(etag, response.headers['ETag'])
+
+    def test_rescan_with_same_slots_keeps_etag(self):
+        self.login()
+        etag = self.test_client.get('/api/v1/slots').headers['ETag']
+
+        self.assertEqual(304, self.test_client.get('/api/v1/slots?rescan=1',
+                                                   headers={'If-None-Match': etag}).status_code)
+
+    def test_changed_slots_change_etag(self):
+        self.login()
+        etag = self.test_client.get('/api/v1/slots').headers['ETag']
+        self.adapter.slots.pop()
+
+        response = self.test_client.get('/api/v1/slots?rescan=1', headers={'If-None-Match': etag})
+
+        self.assertEqual(200, response.status_code)
+        self.assertNotEqual(etag, response.headers['ETag'])
+
+
+class WatchApiTest(ApiTestCase):
+    def test_reports_refresher(self):
+        self.assertEqual({'running': False, 'interval': 60.0, 'days': 5, 'takenAt': None, 'slots': None},
+                         self.test_client.get('/api/v1/watch').json)
+
+    def test_reports_latest_scan(self):
+        self.login()
+        self.test_client.get('/api/v1/slots')
+
+        watch = self.test_client.get('/api/v1/watch').json
+        self.assertTrue(watch['running'])
+        self.assertEqual(len(self.adapter.slots), watch['slots'])
+
+
+class SlotHistoryApiTest(ApiTestCase):
+    def test_lists_recorded_slots(self):
+        self.refresher.service.history = self.test_app.extensions['slot_history']
+        self.login()
+        self.test_client.get('/api/v1/slots')
+        first = self.adapter.slots[0]
+
+        response = self.test_client.get(f'/api/v1/slots/history?site={first.site}'
+                                        f'&start={first.date_time.date().isoformat()}')
+
+        self.assertEqual(200, response.status_code)
+        self.assertEqual(first.date_time.isoformat(), response.json['slots'][0]['dateTime'])
+        self.assertEqual({first.site}, {record['siteId'] for record in response.json['slots']})
+        self.assertEqual(0, response.json['meanLifetime'])
+
+    def test_rejects_invalid_dates(self):
+        self.assertEqual(400, self.test_client.get('/api/v1/slots/history?start=monday').status_code)
@@ -0,0 +1,148 @@
+from datetime import date, datetime
+from unittest import TestCase
+
+from tests.fixtures import FixtureLoginProvider
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.booking import BookingEngine, BookingEngines, NoSlotBookedException
+from vaccination.connectors import SlotTakenException, BookingRefusedException, zone_offset
+from vaccination.entities import Appointment
+from vaccination.metrics import BOOKING_LATENCY
+from vaccination.services import VaccinationAppointmentService
+
+FIRST_DAY = date(2021, 12, 13)
+GONE = Appointment('site a', datetime(2021, 12, 12, 8, 0))
+
+
+class BookingEngineTest(TestCase):
+    def setUp(self) -> None:
+        self.slots = random_slots(FIRST_DAY, days=10, per_day=1, seed=5)
+        self.adapter = ReplayAdapter(self.slots)
+        self.service = VaccinationAppointmentService(replay_connector_type(self.adapter))
+        self.authentication = self.service.authentication(FixtureLoginProvider())
+        self.engine = BookingEngine(self.service, self.authentication)
+
+    def tearDown(self) -> None:
+        self.engine.close()
+        self.service.pool.close()
+
+    def test_books_best_ranked_candidate(self):
+        self.engine.offer(reversed(self.slots[:3]))
+
+        result = self.engine.book()
+
+        self.assertEqual(self.slots[0], result.appointment)
+        self.assertEqual([self.slots[0]], result.attempts)
+        self.assertEqual(self.slots[0], self.adapter.booked)
+
+    def test_prepared_booking_is_a_single_request(self):
+        self.engine.offer(self.slots[:2])
+        calls = sum(self.adapter.calls.values())
+
+        self.engine.book()
+
+        self.assertEqual(calls + 1, sum(self.adapter.calls.values()))
+
+    def test_moves_on_to_next_candidate(self):
+        result = self.engine.book([GONE, self.slots[2]])
+
+        self.assertEqual(self.slots[2], result.appointment)
+        self.assertEqual([GONE, self.slots[2]], result.attempts)
+        self.assertEqual([], self.engine.candidates)
+
+    def test_reports_when_every_candidate_is_taken(self):
+        with self.assertRaises(NoSlotBookedException) as raised:
+            self.engine.book([GONE])
+
+        self.assertEqual([GONE], raised.exception.attempts)
+        self.assertIsNone(self.adapter.booked)
+
+    def test_stops_when_portal_refuses_the_booking(self):
+        self.adapter.booking_refusal = 403
+
+        with self.assertRaises(BookingRefusedException) as raised:
+            self.engine.book(self.slots[:3])
+
+        self.assertEqual(self.slots[0], raised.exception.appointment)
+        self.assertEqual(1, self.adapter.calls['booking'])
+
+    def test_books_picked_slot_before_ranked_fallbacks(self):
+        self.engine.offer(self.slots[:3])
+
+        result = self.engine.book_first(self.slots[2])
+        self.assertEqual([self.slots[2]], result.attempts)
+
+        self.adapter.slots.remove(self.slots[1])
+        self.assertEqual([self.slots[1], self.slots[0]], self.engine.book_first(self.slots[1]).attempts)
+
+    def test_keeps_ranking_of_caller(self):
+        engine = BookingEngine(self.service, self.authentication, rank=list)
+
+        self.assertEqual(self.slots[3], engine.book([self.slots[3], self.slots[0]]).appointment)
+        engine.close()
+
+    def test_withdrawn_slots_are_not_tried(self):
+        self.engine.offer(self.slots[:2])
+        self.engine.withdraw(self.slots[:1])
+
+        self.assertEqual([self.slots[1]], self.engine.candidates)
+
+    def test_records_time_to_confirmation(self):
+        booked = BOOKING_LATENCY.count(outcome='booked')
+
+        result = self.engine.book(self.slots[:1])
+
+        self.assertGreater(result.seconds, 0)
+        self.assertEqual(booked + 1, BOOKING_LATENCY.count(outcome='booked'))
+
+    def test_holds_warm_connector(self):
+        self.engine.warm()
+        self.service.pool.max_idle_seconds = -1
+        self.service.pool.evict_idle()
+
+        self.assertEqual(1, len(self.service.pool))
+        self.engine.close()
+        self.service.pool.evict_idle()
+        self.assertEqual(0, len(self.service.pool))
+
+    def test_service_raises_for_taken_slot(self):
+        with self.assertRaises(SlotTakenException) as raised:
+            self.service.book_appointment(self.authentication, GONE)
+
+        self.assertEqual(GONE, raised.exception.appointment)
+        self.assertEqual(409, raised.exception.response.status_code)
+
+
+class BookingEnginesTest(TestCase):
+    def setUp(self) -> None:
+        self.adapter = ReplayAdapter(random_slots(FIRST_DAY, days=3, per_day=1, seed=5))
+        self.service = VaccinationAppointmentService(replay_connector_type(self.adapter))
+        self.authentication = self.service.authentication(FixtureLoginProvider())
+        self.engines = BookingEngines(max_idle_seconds=60)
+
+    def tearDown(self) -> None:
+        self.engines.close_all()
+        self.service.pool.close()
+
+    def test_one_engine_per_account(self):
+        engine = self.engines.engine(self.service, self.authentication)
+
+        self.assertIs(engine, self.engines.engine(self.service, self.authentication))
+        self.engines.close(self.authentication.account_key)
+        self.assertIsNot(engine, self.engines.engine(self.service, self.authentication))
+
+    def test_closes_idle_engines(self):
+        engine = self.engines.engine(self.service, self.authentication)
+        engine.warm()
+        self.engines.max_idle_seconds = -1
+        self.engines.evict_idle()
+
+        self.assertEqual(0, len(self.engines))
+        self.service.pool.max_idle_seconds = -1
+        self.service.pool.evict_idle()
+        self.assertEqual(0, len(self.service.pool))
+
+
+class ZoneOffsetTest(TestCase):
+    def test_follows_daylight_saving(self):
+        self.assertEqual('+01:00', zone_offset(datetime(2021, 12, 13, 15, 0)))
+        self.assertEqual('+02:00', zone_offset(datetime(2021, 6, 13, 15, 0)))
@@ -0,0 +1,83 @@
+from collections import Counter
+from datetime import datetime
+from unittest import TestCase
+
+from tests.fixtures import ResponseFixtures
+from vaccination.cache import TTLCache, ReadCache
+from vaccination.connectors import ImpzentrenBayernConnector, Authentication
+from vaccination.entities import Appointment
+
+
+class TTLCacheTest(TestCase):
+    def test_loads_once(self):
+        cache = TTLCache()
+        loads = []
+
+        for _ in range(3):
+            self.assertEqual('value', cache.get_or_load('key', lambda: loads.append(1) or 'value'))
+
+        self.assertEqual(1, len(loads))
+        self.assertEqual(2, cache.hits)
+        self.assertEqual(1, cache.misses)
+
+    def test_expires_entries(self):
+        cache = TTLCache(ttl=-1)
+        cache.put('key', 'value')
+
+        self.assertNotIn('key', cache)
+        self.assertEqual(0, len(cache))
+
+    def test_evicts_least_recently_used(self):
+        cache = TTLCache(maxsize=2)
+        cache.put('first', 1)
+        cache.put('second', 2)
+        cache.get('first')
+        cache.put('third', 3)
+
+        self.assertIn('first', cache)
+        self.assertNotIn('second', cache)
+        self.assertIn('third', cache)
+
+
+class ConnectorReadCacheTest(TestCase):
+    def setUp(self) -> None:
+        self.fixture = ResponseFixtures.fixtures()
+        self.requests = Counter()
+        self.read_cache = ReadCache()
+        self.connector = self._connector()
+
+    def _connector(self):
+        connector = ImpzentrenBayernConnector()
+        connector.read_cache = self.read_cache
+        connector.authenticate_session(Authentication('test token'))
+        connector._session.get = lambda url, params=None, **_: self.requests.update([url]) or self.fixture[url]
+        connector._session.post = lambda url, data=None, json=None, **_: self.requests.update([url]) or self.fixture[url]
+        return connector
+
+    def test_citizen_shared_between_connectors(self):
+        self.connector.citizen
+        self._connector().citizen
+
+        self.assertEqual(1, self.requests['https://impfzentren.bayern/api/v1/users/current/citizens'])
+
+    def test_current_appointment_fetched_once(self):
+        self.assertTrue(self.connector.has_next_appointment())
+        self.connector.get_current_appointment()
+
+        self.assertEqual(1, self.requests['https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/'])
+
+    def test_booking_invalidates_current_appointment(self):
+        self.connector.get_current_appointment()
+        self.connector.book_appointment(Appointment('site id', datetime(2021, 12, 13, 15, 0)))
+        self.connector.get_current_appointment()
+
+        # one booking post plus two reads
+        self.assertEqual(3, self.requests['https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/'])
+
+    def test_caches_per_account(self):
+        self.connector.get_current_appointment()
+        other = self._connector()
+        other.authenticate_session(Authentication('other token'))
+        other.get_current_appointment()
+
+        self.assertEqual(2, self.requests['https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/'])
@@ -1,11 +1,14 @@
 import unittest
+from base64 import urlsafe_b64encode
 from datetime import date, datetime
+from time import time
 
 from more_itertools import one
+from requests import ReadTimeout
 
 from tests.fixtures import ResponseFixture, FixtureLoginProvider, ResponseFixtures
 from vaccination.connectors import ImpzentrenBayernConnector, LoginError, \
-    InvalidCredentialsException, AuthenticationRefreshNeededException
+    InvalidCredentialsException, AuthenticationRefreshNeededException, Authentication, UpstreamUnavailableException
 from vaccination.entities import Appointment
 
 
@@ -15,8 +18,8 @@ class ImpzentrenBayerConnectorTest(unittest.TestCase):
         self.connector = ImpzentrenBayernConnector()
         self.fixture = ResponseFixtures.fixtures()
 
-        self.connector._session.get = lambda url, params: self.fixture[url]
-        self.connector._session.post = lambda url, data=None, json=None: self.fixture[url]
+        self.connector._session.get = lambda url, params=None, **_: self.fixture[url]
+        self.connector._session.post = lambda url, data=None, json=None, **_: self.fixture[url]
 
     def test_raises_login_error(self):
         self.fixture['http://test.login'] = ResponseFixture(200, '<div class="alert alert-error">')
@@ -60,6 +63,26 @@ class ImpzentrenBayerConnectorTest(unittest.TestCase):
     def test_book_appointment(self):
         self.assertEqual(None, self.connector.book_appointment(Appointment('site', datetime.now())))
 
+    def test_times_out_per_endpoint(self):
+        timeouts = []
+        self.connector._session.get = lambda url, timeout=None, **_: timeouts.append(timeout) or self.fixture[url]
+        self.connector._session.post = lambda url, timeout=None, **_: timeouts.append(timeout) or self.fixture[url]
+        self.connector.timeouts['appointments/next'] = (1, 2)
+
+        self.connector.get_next_appointment(date(2021, 12, 13))
+        self.connector.book_appointment(Appointment('site', datetime.now()))
+
+        self.assertEqual([self.connector.TIMEOUTS['citizens'], (1, 2), self.connector.TIMEOUTS['booking']], timeouts)
+
+    def test_unanswered_request_is_upstream_unavailable(self):
+        def timed_out(url, **_):
+            raise ReadTimeout(url)
+        self.connector._session.get = timed_out
+
+        with self.assertRaises(UpstreamUnavailableException) as raised:
+            self.connector.get_next_appointment(date(2021, 12, 13))
+        self.assertIsNone(raised.exception.retry_after)
+
     def test_no_current_appointment(self):
         self.fixture['https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/'] = ResponseFixture(200,
                                                                                                               '{"futureAppointments":[],"pastAppointments":[]}')
@@ -71,5 +94,137 @@ class ImpzentrenBayerConnectorTest(unittest.TestCase):
                          self.connector.get_current_appointment())
 
 
+class LoginLinkTest(unittest.TestCase):
+    LOGIN_PAGE_URL = ImpzentrenBayernConnector.LOGIN_PAGE_URL
+
+    def setUp(self) -> None:
+        self.connector = ImpzentrenBayernConnector()
+        self.fixture = ResponseFixtures.fixtures()
+        self.login_responses = []
+        self.requested = []
+
+        self.connector._session.get = lambda url, params=None, **_: self.requested.append(url) or self.fixture[url]
+        self.connector._session.post = self._post
+
+    def _post(self, url, data=None, json=None, **_):
+        self.requested.append(url)
+        if 'http://test.login' == url and self.login_responses:
+            return self.login_responses.pop(0)
+        return self.fixture[url]
+
+    def test_reads_code_from_redirect_without_following_it(self):
+        redirect = ResponseFixture(302, '')
+        redirect.headers['Location'] = 'https://impfzentren.bayern/citizen/#state=s&code=redirected'
+        self.login_responses.append(redirect)
+
+        self.assertEqual('redirected', self.connector.login({'username': None}))
+        self.assertNotIn('https://impfzentren.bayern/citizen/', self.requested)
+
+    def test_uses_prefetched_login_link(self):
+        self.connector.prefetch_login_link()
+        self.assertTrue(self.connector.has_fresh_login_link)
+        self.requested.clear()
+
+        self.assertEqual('testcode', self.connector.login({'username': None}))
+        self.assertEqual(['http://test.login'], self.requested)
+        self.assertFalse(self.connector.has_fresh_login_link)
+
+    def test_retries_stale_prefetched_login_link_once(self):
+        self.connector.prefetch_login_link()
+        self.login_responses.append(self.fixture[self.LOGIN_PAGE_URL])
+
+        self.assertEqual('testcode', self.connector.login({'username': None}))
+        self.assertEqual(2, self.requested.count(self.LOGIN_PAGE_URL))
+
+    def test_expired_prefetched_login_link_is_not_used(self):
+        self.connector.prefetch_login_link()
+        self.connector.LOGIN_LINK_TTL_SECONDS = 0
+
+        self.assertFalse(self.connector.has_fresh_login_link)
+
+
+class AuthenticationRefreshTest(unittest.TestCase):
+    def setUp(self) -> None:
+        self.connector = ImpzentrenBayernConnector()
+        self.fixture = ResponseFixtures.fixtures()
+        self.fixture['https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/protocol/openid-connect/token'] = \
+            ResponseFixture(200, '{"token_type" : "Bearer", "access_token" : "fresh token", '
+                                 '"refresh_token" : "fresh refresh token", "expires_in" : 300}')
+        self.posted = []
+        self.sent_tokens = []
+
+        self.connector._session.get = self._get
+        self.connector._session.post = lambda url, data=None, json=None, **_: self.posted.append(data) or self.fixture[url]
+
+    def _get(self, url, params=None, **_):
+        token = self.connector._session.headers['Authorization']
+        self.sent_tokens.append(token)
+        if 'Bearer stale token' == token:
+            return ResponseFixture(401, '')
+        return self.fixture[url]
+
+    def test_refreshes_and_retries_once_on_401(self):
+        authentication = Authentication('stale token', 'refresh token')
+        self.connector.authenticate_session(authentication)
+
+        self.assertEqual('citizen_id', self.connector.citizen['id'])
+        self.assertEqual(['Bearer stale token', 'Bearer fresh token'], self.sent_tokens)
+        self.assertEqual('refresh token', one(self.posted)['refresh_token'])
+        self.assertEqual('fresh token', authentication.access_token)
+        self.assertFalse(authentication.expires_soon)
+
+    def test_refreshes_before_expiry(self):
+        authentication = Authentication('expiring token', 'refresh token', expires_at=time())
+        self.connector.authenticate_session(authentication)
+        self.connector.citizen
+
+        self.assertEqual(['Bearer fresh token'], self.sent_tokens)
+
+    def test_refused_refresh_grant_ends_session(self):
+        self.fixture['https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/protocol/openid-connect/token'] = \
+            ResponseFixture(400, '{"error": "invalid_grant", "error_description": "Session not active"}')
+        self.connector.authenticate_session(Authentication('stale token', 'refresh token'))
+
+        with self.assertRaises(InvalidCredentialsException):
+            self.connector.citizen
+
+    def test_does_not_refresh_without_refresh_token(self):
+        self.connector.authenticate_session(Authentication('stale token'))
+        with self.assertRaises(AuthenticationRefreshNeededException):
+            self.connector.citizen
+
+    def test_hands_refreshed_tokens_to_older_authentication(self):
+        fresh = Authentication('fresh token', 'fresh refresh token', expires_at=time() + 300)
+        self.connector.authenticate_session(fresh)
+        stale = Authentication('fresh token', 'refresh token', expires_at=time() - 300)
+        self.connector.authenticate_session(stale)
+
+        self.assertEqual(fresh, stale)
+
+
+class AuthenticationTest(unittest.TestCase):
+    def test_session_round_trip(self):
+        authentication = Authentication.from_access_token({'access_token': 'token', 'refresh_token': 'refresh',
+                                                           'expires_in': 300})
+        self.assertEqual(authentication, Authentication.from_session(authentication.to_session()))
+
+    def test_from_legacy_session(self):
+        self.assertEqual(Authentication('token'), Authentication.from_session('token'))
+
+    def test_account_key_from_token_subject(self):
+        payload = urlsafe_b64encode(b'{"sub": "account"}').decode().rstrip('=')
+        self.assertEqual('account', Authentication(f'header.{payload}.signature').account_key)
+        self.assertEqual('opaque token', Authentication('opaque token').account_key)
+
+    def test_account_key_follows_token(self):
+        payload = urlsafe_b64encode(b'{"sub": "account"}').decode().rstrip('=')
+        authentication = Authentication('opaque token')
+        authentication.update({'access_token': f'header.{payload}.signature'})
+        self.assertEqual('account', authentication.account_key)
+        refreshed = Authentication('opaque token')
+        refreshed.update_from(authentication)
+        self.assertEqual('account', refreshed.account_key)
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,28 @@
+import json
+import sys
+from unittest import TestCase, mock
+
+from tests.fixtures import ResponseFixture
+from vaccination import decoding
+from vaccination.decoding import decode_json, loads
+
+
+class DecodingTest(TestCase):
+    def test_parses_bytes(self):
+        self.assertEqual({'siteId': 'Impfzentrum Fürth'}, loads('{"siteId": "Impfzentrum Fürth"}'.encode('utf-8')))
+
+    def test_decodes_response_body(self):
+        self.assertEqual([{'id': 'citizen_id'}], decode_json(ResponseFixture(200, '[{"id": "citizen_id"}]')))
+
+    def test_raises_value_error_for_invalid_body(self):
+        with self.assertRaises(ValueError):
+            loads(b'<html>maintenance</html>')
+
+    def test_falls_back_to_standard_library(self):
+        with mock.patch.dict(sys.modules, {'orjson': None}):
+            self.assertEqual(('json', json.loads), decoding._load_backend())
+
+    def test_backends_agree(self):
+        body = b'{"vaccinationDate": "2021-12-13", "slots": [1, 2.5, null, true]}'
+
+        self.assertEqual(json.loads(body), loads(body))
@@ -0,0 +1,57 @@
+import pickle
+from datetime import datetime
+from unittest import TestCase
+
+from vaccination.entities import Appointment, NoAppointment
+
+
+class AppointmentTest(TestCase):
+    def test_value_semantics(self):
+        appointment = Appointment('site id', datetime(2021, 12, 13, 15, 0))
+
+        self.assertEqual(Appointment('site id', datetime(2021, 12, 13, 15, 0)), appointment)
+        self.assertEqual(hash(Appointment('site id', datetime(2021, 12, 13, 15, 0))), hash(appointment))
+        self.assertNotEqual(Appointment('other site', datetime(2021, 12, 13, 15, 0)), appointment)
+        self.assertEqual(1, len({appointment, Appointment('site id', datetime(2021, 12, 13, 15, 0))}))
+
+    def test_immutable(self):
+        appointment = Appointment('site id', datetime(2021, 12, 13, 15, 0))
+        with self.assertRaises(AttributeError):
+            appointment.site = 'other site'
+        with self.assertRaises(AttributeError):
+            appointment.anything = 'else'
+
+    def test_orders_by_date_time(self):
+        later = Appointment('a site', datetime(2021, 12, 14, 9, 0))
+        earlier = Appointment('z site', datetime(2021, 12, 13, 15, 0))
+
+        self.assertEqual([earlier, later], sorted([later, earlier]))
+        self.assertLess(earlier, later)
+
+    def test_from_json(self):
+        self.assertEqual(Appointment('site id', datetime(2021, 12, 13, 15, 0)),
+                         Appointment.from_json({'siteId': 'site id', 'vaccinationDate': '2021-12-13',
+                                                'vaccinationTime': '15:00'}))
+        self.assertIs(NoAppointment(), Appointment.from_json({}))
+
+    def test_from_json_parses_each_slot_time_once(self):
+        first = Appointment.from_json({'siteId': 'site id', 'vaccinationDate': '2021-12-13', 'vaccinationTime': '15:00'})
+        other = Appointment.from_json({'siteId': 'other site', 'vaccinationDate': '2021-12-13',
+                                       'vaccinationTime': '15:00'})
+
+        self.assertIs(first.date_time, other.date_time)
+
+    def test_pickles(self):
+        appointment = Appointment('site id', datetime(2021, 12, 13, 15, 0))
+
+        self.assertEqual(appointment, pickle.loads(pickle.dumps(appointment)))
+        self.assertIs(NoAppointment(), pickle.loads(pickle.dumps(NoAppointment())))
+
+
+class NoAppointmentTest(TestCase):
+    def test_singleton(self):
+        self.assertIs(NoAppointment(), Appointment.no_appointment())
+        self.assertEqual('NoAppointment()', repr(NoAppointment()))
+
+    def test_differs_from_appointment(self):
+        self.assertNotEqual(Appointment('None', datetime(1970, 1, 1)), NoAppointment())
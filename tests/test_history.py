@@ -0,0 +1,96 @@
+import os
+from datetime import datetime, date, timedelta
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from tests.fixtures import FixtureLoginProvider
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.entities import Appointment, NoAppointment
+from vaccination.history import SlotHistory
+from vaccination.services import VaccinationAppointmentService
+
+MONDAY = datetime(2021, 12, 13, 9, 0)
+
+
+class SlotHistoryTest(TestCase):
+    def setUp(self) -> None:
+        self.history = SlotHistory()
+
+    def tearDown(self) -> None:
+        self.history.close()
+
+    def test_keeps_first_and_last_seen(self):
+        slot = Appointment('site a', MONDAY)
+        self.history.record([slot], observed_at=datetime(2021, 12, 1, 10, 0))
+        self.history.record([slot], observed_at=datetime(2021, 12, 1, 10, 5))
+
+        record, = self.history.slots()
+        self.assertEqual(slot, record.appointment)
+        self.assertEqual(datetime(2021, 12, 1, 10, 0), record.first_seen)
+        self.assertEqual(datetime(2021, 12, 1, 10, 5), record.last_seen)
+        self.assertEqual(300, record.lifetime)
+
+    def test_ignores_no_appointment(self):
+        self.assertEqual(0, self.history.record([NoAppointment()]))
+        self.assertEqual(0, len(self.history))
+
+    def test_queries_by_site_and_date(self):
+        self.history.record([Appointment('site a', MONDAY), Appointment('site b', MONDAY),
+                             Appointment('site a', MONDAY + timedelta(days=7))])
+
+        self.assertEqual([Appointment('site a', MONDAY)],
+                         [record.appointment for record in
+                          self.history.slots(site='site a', start=MONDAY, end=MONDAY + timedelta(days=7))])
+        self.assertEqual(['site a', 'site b'], self.history.sites())
+
+    def test_mean_lifetime(self):
+        self.history.record([Appointment('site a', MONDAY), Appointment('site b', MONDAY)],
+                            observed_at=datetime(2021, 12, 1, 10, 0))
+        self.history.record([Appointment('site a', MONDAY)], observed_at=datetime(2021, 12, 1, 10, 10))
+
+        self.assertAlmostEqual(300, self.history.mean_lifetime(), places=3)
+        self.assertAlmostEqual(600, self.history.mean_lifetime(site='site a'), places=3)
+        self.assertIsNone(self.history.mean_lifetime(site='site c'))
+
+    def test_records_while_passing_slots_through(self):
+        slots = [Appointment('site a', MONDAY + timedelta(hours=hour)) for hour in range(5)]
+        recording = self.history.recording(iter(slots), batch_size=2)
+
+        self.assertEqual(slots[:3], [next(recording) for _ in range(3)])
+        self.assertEqual(2, len(self.history))
+        self.assertEqual(slots[3:], list(recording))
+        self.assertEqual(5, len(self.history))
+
+    def test_keeps_slots_found_before_scan_failed(self):
+        def failing_scan():
+            yield Appointment('site a', MONDAY)
+            raise ConnectionError()
+
+        with self.assertRaises(ConnectionError):
+            list(self.history.recording(failing_scan()))
+        self.assertEqual(1, len(self.history))
+
+    def test_persists_to_file(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'history.db')
+            history = SlotHistory(path)
+            history.record([Appointment('site a', MONDAY)])
+            history.close()
+
+            reopened = SlotHistory(path)
+            self.assertEqual(1, len(reopened))
+            reopened.close()
+
+
+class ServiceHistoryTest(TestCase):
+    def test_records_scanned_slots(self):
+        adapter = ReplayAdapter(random_slots(date(2021, 12, 13), days=10, per_day=1, seed=2))
+        history = SlotHistory()
+        service = VaccinationAppointmentService(replay_connector_type(adapter), history=history)
+        try:
+            found = service.appointments_in_range(service.authentication(FixtureLoginProvider()),
+                                                  date(2021, 12, 13), 10)
+        finally:
+            service.pool.close()
+
+        self.assertEqual(found, {record.appointment for record in history.slots()})
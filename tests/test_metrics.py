@@ -0,0 +1,112 @@
+from datetime import date
+from unittest import TestCase
+
+from tests.fixtures import FixtureLoginProvider
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.cache import ReadCache
+from vaccination.connectors import UpstreamUnavailableException
+from vaccination.metrics import Registry, endpoint_name, cache_families, UPSTREAM_LATENCY, UPSTREAM_RESPONSES
+from vaccination.services import VaccinationAppointmentService
+from web import create_app
+
+FIRST_DAY = date(2021, 12, 13)
+
+
+class RegistryTest(TestCase):
+    def setUp(self) -> None:
+        self.registry = Registry()
+
+    def test_renders_counter(self):
+        counter = self.registry.counter('test_total', 'test counter', ('status',))
+        counter.inc(status=200)
+        counter.inc(2, status=200)
+
+        self.assertIn('# TYPE test_total counter\ntest_total{status="200"} 3\n', self.registry.render())
+
+    def test_renders_cumulative_histogram(self):
+        histogram = self.registry.histogram('test_seconds', 'test histogram', buckets=(.1, 1))
+        for value in (.05, .5, 5):
+            histogram.observe(value)
+
+        rendered = self.registry.render()
+        self.assertIn('test_seconds_bucket{le="0.1"} 1\n', rendered)
+        self.assertIn('test_seconds_bucket{le="1.0"} 2\n', rendered)
+        self.assertIn('test_seconds_bucket{le="+Inf"} 3\n', rendered)
+        self.assertIn('test_seconds_sum 5.55\n', rendered)
+        self.assertIn('test_seconds_count 3\n', rendered)
+
+    def test_registers_metric_once(self):
+        self.assertIs(self.registry.counter('test_total', 'test'), self.registry.counter('test_total', 'test'))
+
+    def test_escapes_label_values(self):
+        self.registry.counter('test_total', 'test', ('name',)).inc(name='say "hi"')
+
+        self.assertIn('test_total{name="say \\"hi\\""} 1', self.registry.render())
+
+    def test_renders_cache_hit_ratio(self):
+        read_cache = ReadCache()
+        read_cache.citizens.get_or_load('account', lambda: 'citizen')
+        read_cache.citizens.get_or_load('account', lambda: 'citizen')
+
+        rendered = self.registry.render([lambda: cache_families(read_cache.caches)])
+        self.assertIn('vaccination_cache_hit_ratio{cache="citizens"} 0.5', rendered)
+        self.assertIn('vaccination_cache_hit_ratio{cache="current_appointments"} 0.0', rendered)
+
+
+class EndpointNameTest(TestCase):
+    def test_names_upstream_endpoints(self):
+        self.assertEqual('auth', endpoint_name(
+            'https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/protocol/openid-connect/auth?client_id=c'))
+        self.assertEqual('token', endpoint_name(
+            'https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/protocol/openid-connect/token'))
+        self.assertEqual('citizens', endpoint_name('https://impfzentren.bayern/api/v1/users/current/citizens'))
+        self.assertEqual('appointments/next', endpoint_name(
+            'https://impfzentren.bayern/api/v1/citizens/id/appointments/next'))
+        self.assertEqual('appointments', endpoint_name('https://impfzentren.bayern/api/v1/citizens/id/appointments/'))
+        self.assertEqual('other', endpoint_name('https://example.com/'))
+
+
+class ConnectorInstrumentationTest(TestCase):
+    def setUp(self) -> None:
+        self.slots = random_slots(FIRST_DAY, days=5, per_day=1, seed=5)
+        self.adapter = ReplayAdapter(self.slots)
+        self.service = VaccinationAppointmentService(replay_connector_type(self.adapter))
+
+    def tearDown(self) -> None:
+        self.service.pool.close()
+
+    def test_observes_upstream_calls(self):
+        before_next = UPSTREAM_LATENCY.count(endpoint='appointments/next', method='GET')
+        before_booking = UPSTREAM_RESPONSES.value(endpoint='booking', method='POST', status=200)
+
+        authentication = self.service.authentication(FixtureLoginProvider())
+        self.service.next_appointment(authentication, FIRST_DAY)
+        self.service.book_appointment(authentication, self.slots[0])
+
+        self.assertEqual(before_next + 1, UPSTREAM_LATENCY.count(endpoint='appointments/next', method='GET'))
+        self.assertEqual(before_booking + 1, UPSTREAM_RESPONSES.value(endpoint='booking', method='POST', status=200))
+
+    def test_counts_upstream_errors_by_status(self):
+        self.adapter.error_rate = 1
+        before = UPSTREAM_RESPONSES.value(endpoint='auth', method='GET', status=503)
+
+        with self.assertRaises(UpstreamUnavailableException):
+            self.service.authentication(FixtureLoginProvider())
+
+        self.assertEqual(before + 1, UPSTREAM_RESPONSES.value(endpoint='auth', method='GET', status=503))
+
+
+class MetricsViewTest(TestCase):
+    def setUp(self) -> None:
+        self.test_client = create_app().test_client()
+
+    def test_exposes_metrics(self):
+        self.test_client.get('/')
+        response = self.test_client.get('/metrics')
+
+        self.assertEqual(200, response.status_code)
+        self.assertTrue(response.content_type.startswith('text/plain'))
+        text = response.get_data(as_text=True)
+        self.assertIn('vaccination_http_request_seconds_count{endpoint="HomeView:index",method="GET",status="200"}',
+                      text)
+        self.assertIn('vaccination_cache_hits_total{cache="citizens"}', text)
@@ -0,0 +1,96 @@
+import json
+import os
+import tempfile
+from datetime import date, datetime
+from unittest import TestCase
+
+from tests.fixtures import ResponseFixture
+from tests.test_service import ImpzentrenBayernConnectorMock
+from vaccination.connectors import InvalidCredentialsException, UpstreamUnavailableException
+from vaccination.entities import Appointment
+from vaccination.login import AccountsFileLoginProvider, StaticLoginProvider
+from vaccination.monitor import BatchMonitor, summary_table
+from vaccination.services import VaccinationAppointmentService
+
+
+class AccountsConnectorMock(ImpzentrenBayernConnectorMock):
+    def __init__(self):
+        super().__init__()
+        self.fixtures['https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/'] = \
+            ResponseFixture(200, '{"futureAppointments":[],"pastAppointments":[]}')
+
+    def login(self, login_json):
+        if 'invalid' == login_json['username']:
+            raise InvalidCredentialsException()
+        return super().login(login_json)
+
+
+class BatchMonitorTest(TestCase):
+    def setUp(self) -> None:
+        self.service = VaccinationAppointmentService(AccountsConnectorMock)
+        self.scans = 0
+        appointments_in_range = self.service.appointments_in_range
+
+        def counting_appointments_in_range(*args, **kwargs):
+            self.scans += 1
+            return appointments_in_range(*args, **kwargs)
+
+        self.service.appointments_in_range = counting_appointments_in_range
+        self.monitor = BatchMonitor(self.service, max_workers=4)
+
+    def test_scans_once_for_all_accounts(self):
+        reports, appointments = self.monitor.check(
+            [StaticLoginProvider({'username': f'user{i}', 'password': None}) for i in range(5)],
+            date(2021, 12, 13), 3)
+
+        self.assertEqual(1, self.scans)
+        self.assertEqual({Appointment('site id', datetime(2021, 12, 13, 15, 0))}, appointments)
+        self.assertEqual(['looking'] * 5, [report.status for report in reports])
+
+    def test_reports_failed_accounts(self):
+        reports, _ = self.monitor.check([StaticLoginProvider({'username': 'invalid', 'password': None}),
+                                         StaticLoginProvider({'username': 'valid', 'password': None})],
+                                        date(2021, 12, 13), 3)
+
+        self.assertEqual(['error: InvalidCredentialsException', 'looking'], [report.status for report in reports])
+        table = summary_table(reports, set())
+        self.assertIn('invalid  error: InvalidCredentialsException', table)
+        self.assertIn('[0] free slots', table)
+
+    def test_reports_failed_scan(self):
+        def failing_appointments_in_range(*_, **__):
+            raise UpstreamUnavailableException()
+        self.service.appointments_in_range = failing_appointments_in_range
+
+        reports, appointments = self.monitor.check([StaticLoginProvider({'username': f'user{i}', 'password': None})
+                                                    for i in range(2)], date(2021, 12, 13), 3)
+
+        self.assertIsNone(appointments)
+        self.assertEqual(['error: UpstreamUnavailableException'] * 2, [report.status for report in reports])
+        self.assertIn('scan failed', summary_table(reports, appointments))
+
+    def test_scans_again_on_every_check(self):
+        providers = [StaticLoginProvider({'username': 'user', 'password': None})]
+        self.monitor.check(providers, date(2021, 12, 13), 3)
+        self.monitor.check(providers, date(2021, 12, 13), 3)
+
+        self.assertEqual(2, self.scans)
+
+
+class AccountsFileLoginProviderTest(TestCase):
+    def _accounts_file(self, content):
+        with tempfile.NamedTemporaryFile('w', suffix='.json', delete=False) as accounts:
+            accounts.write(content)
+        self.addCleanup(os.remove, accounts.name)
+        return accounts.name
+
+    def test_reads_json_list(self):
+        accounts = self._accounts_file(json.dumps([{'username': 'a', 'password': 'x'},
+                                                   {'username': 'b', 'password': 'y'}]))
+        self.assertEqual(['a', 'b'], [provider.get_login_json()['username']
+                                      for provider in AccountsFileLoginProvider(accounts).login_providers()])
+
+    def test_reads_json_lines(self):
+        accounts = self._accounts_file('{"username": "a", "password": "x"}\n\n{"username": "b", "password": "y"}\n')
+        self.assertEqual(['a', 'b'], [provider.get_login_json()['username']
+                                      for provider in AccountsFileLoginProvider(accounts).login_providers()])
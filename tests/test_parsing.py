@@ -0,0 +1,54 @@
+from unittest import TestCase
+
+from benchmarks.replay import KEYCLOAK_PAGE
+from tests.fixtures import ResponseFixtures
+from vaccination.parsing import login_form_action, login_feedback, _fast_login_form_action, \
+    _soup_login_form_action, _fast_login_feedback, _soup_login_feedback
+
+LOGIN_PAGE = ResponseFixtures.fixtures()[
+    'https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/protocol/openid-connect/auth?client_id=c19v-frontend'
+    '&redirect_uri=https%3A%2F%2Fimpfzentren.bayern%2Fcitizen%2F&response_mode=fragment&response_type=code'
+    '&scope=openid'].text
+
+
+class LoginPageParsingTest(TestCase):
+    def test_fixture_form_action(self):
+        self.assertEqual('http://test.login', _fast_login_form_action(LOGIN_PAGE))
+        self.assertEqual(_soup_login_form_action(LOGIN_PAGE), login_form_action(LOGIN_PAGE))
+
+    def test_unescapes_form_action(self):
+        self.assertEqual(_soup_login_form_action(KEYCLOAK_PAGE), _fast_login_form_action(KEYCLOAK_PAGE))
+
+    def test_falls_back_to_soup(self):
+        page = '<title>Anmeldung bei C19V-Citizen</title>' \
+               '<form data-hint="a>b" id="kc-form-login" action="http://test.login">'
+        self.assertIsNone(_fast_login_form_action(page))
+        self.assertEqual('http://test.login', login_form_action(page))
+
+    def test_rejects_unexpected_page(self):
+        with self.assertRaises(AssertionError):
+            login_form_action('<title>Wartungsarbeiten</title>')
+
+
+class LoginFeedbackParsingTest(TestCase):
+    def test_no_errors(self):
+        self.assertEqual(([], None), login_feedback('see response url'))
+
+    def test_feedback_matches_soup(self):
+        errors, feedback = _fast_login_feedback(KEYCLOAK_PAGE)
+        soup_errors, soup_feedback = _soup_login_feedback(KEYCLOAK_PAGE)
+
+        self.assertEqual(soup_errors, errors)
+        self.assertEqual(soup_feedback, feedback)
+        self.assertEqual('Ungültiger Benutzername oder Passwort.', feedback)
+
+    def test_falls_back_to_soup(self):
+        page = '<div data-hint="a>b" class="alert alert-error">'
+        self.assertIsNone(_fast_login_feedback(page))
+        self.assertEqual(1, len(login_feedback(page)[0]))
+
+    def test_unbalanced_error_falls_back_to_soup(self):
+        page = '<div class="alert alert-error"><span class="kc-feedback-text">unclosed</div>'
+        self.assertIsNone(_fast_login_feedback(page))
+        self.assertEqual((['<div class="alert alert-error"><span class="kc-feedback-text">unclosed</span></div>'],
+                          'unclosed'), login_feedback(page))
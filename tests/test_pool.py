@@ -0,0 +1,104 @@
+from time import sleep
+from unittest import TestCase
+
+from tests.test_service import ImpzentrenBayernConnectorMock
+from vaccination.connectors import Authentication, ImpzentrenBayernConnector
+from vaccination.pool import ConnectorPool
+
+
+class ClosingConnector(ImpzentrenBayernConnector):
+    def __init__(self):
+        super().__init__()
+        self.closed = False
+
+    def close(self):
+        self.closed = True
+        super().close()
+
+
+class ConnectorPoolTest(TestCase):
+    def setUp(self) -> None:
+        self.pool = ConnectorPool(ClosingConnector, pool_maxsize=4)
+        self.authentication = Authentication('test token', 'test refresh token')
+
+    def tearDown(self) -> None:
+        self.pool.close()
+
+    def test_reuses_connector_per_authentication(self):
+        with self.pool.lease(self.authentication) as first:
+            pass
+        with self.pool.lease(Authentication('test token')) as second:
+            pass
+
+        self.assertIs(first, second)
+        self.assertEqual(1, len(self.pool))
+
+    def test_separates_accounts(self):
+        with self.pool.lease(self.authentication) as first, \
+                self.pool.lease(Authentication('other token')) as second:
+            self.assertIsNot(first, second)
+            self.assertEqual('Bearer other token', second._session.headers['Authorization'])
+
+    def test_tunes_adapter_pool_size(self):
+        with self.pool.lease(self.authentication) as connector:
+            self.assertEqual(4, connector._session.get_adapter('https://impfzentren.bayern')._pool_maxsize)
+
+    def test_adopts_logged_in_connector(self):
+        connector = self.pool.connector()
+        self.pool.adopt(self.authentication, connector)
+
+        with self.pool.lease(self.authentication) as leased:
+            self.assertIs(connector, leased)
+
+    def test_evicts_idle_connectors(self):
+        self.pool.max_idle_seconds = -1
+        with self.pool.lease(self.authentication) as connector:
+            self.pool.evict_idle()
+            self.assertFalse(connector.closed)
+        self.pool.evict_idle()
+
+        self.assertTrue(connector.closed)
+        self.assertEqual(0, len(self.pool))
+
+    def test_close_closes_connectors(self):
+        with self.pool.lease(self.authentication) as connector:
+            pass
+        self.pool.close()
+
+        self.assertTrue(connector.closed)
+        self.assertEqual(0, len(self.pool))
+
+
+class LoginPrefetchTest(TestCase):
+    def setUp(self) -> None:
+        self.pool = ConnectorPool(ImpzentrenBayernConnectorMock, prefetch_logins=True)
+
+    def tearDown(self) -> None:
+        self.pool.close()
+
+    def _await_spare(self):
+        for _ in range(100):
+            if self.pool._login_spare is not None:
+                return self.pool._login_spare
+            sleep(.01)
+        self.fail('no login link prefetched')
+
+    def test_hands_out_prefetched_connector(self):
+        self.pool.prefetch_login()
+        spare = self._await_spare()
+
+        login_connector = self.pool.login_connector()
+        self.assertIs(spare, login_connector)
+        self.assertTrue(login_connector.has_fresh_login_link)
+
+    def test_prefetches_next_login(self):
+        first = self.pool.login_connector()
+
+        self.assertIsNot(first, self._await_spare())
+
+    def test_does_not_prefetch_unless_enabled(self):
+        self.pool.prefetch_logins = False
+        self.pool.login_connector()
+        sleep(.05)
+
+        self.assertIsNone(self.pool._login_spare)
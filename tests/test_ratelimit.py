@@ -0,0 +1,58 @@
+import os
+import tempfile
+from unittest import TestCase
+
+from vaccination.ratelimit import TokenBucket, RateLimiter, SqliteTokenBucket
+
+
+class TokenBucketTest(TestCase):
+    def test_allows_burst_then_queues(self):
+        bucket = TokenBucket(rate=10, capacity=3)
+
+        self.assertEqual([0, 0, 0], [bucket.reserve() for _ in range(3)])
+        first_wait, second_wait = bucket.reserve(), bucket.reserve()
+        self.assertTrue(0 < first_wait <= .1, first_wait)
+        self.assertTrue(first_wait < second_wait <= .2, second_wait)
+
+
+class SqliteTokenBucketTest(TestCase):
+    def setUp(self) -> None:
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, 'budgets.sqlite')
+
+    def test_shares_budget_between_buckets(self):
+        first = SqliteTokenBucket(self.path, 'host', rate=10, capacity=2)
+        second = SqliteTokenBucket(self.path, 'host', rate=10, capacity=2)
+
+        self.assertEqual(0, first.reserve())
+        self.assertEqual(0, second.reserve())
+        self.assertTrue(0 < first.reserve() <= .1)
+
+
+class RateLimiterTest(TestCase):
+    def test_budgets_per_host(self):
+        limiter = RateLimiter(rate=1, capacity=1, budgets={'ciam.impfzentren.bayern': (1, 2)})
+
+        self.assertEqual(0, limiter.reserve('https://impfzentren.bayern/api/v1/users/current/citizens'))
+        self.assertEqual(0, limiter.reserve('https://ciam.impfzentren.bayern/auth'))
+        self.assertEqual(0, limiter.reserve('https://ciam.impfzentren.bayern/auth'))
+        self.assertGreater(limiter.reserve('https://impfzentren.bayern/api/v1/users/current/citizens'), .9)
+
+    def test_reports_wait_and_budget(self):
+        limiter = RateLimiter(rate=100, capacity=1)
+        for _ in range(3):
+            limiter.acquire('https://impfzentren.bayern/api/v1')
+
+        stats = limiter.stats()['impfzentren.bayern']
+        self.assertEqual(3, stats['requests'])
+        self.assertEqual(2, stats['queued'])
+        self.assertGreater(stats['wait_seconds'], 0)
+        self.assertEqual(1, stats['capacity'])
+
+    def test_reads_budgets_from_env(self):
+        os.environ['RATE_LIMIT_BUDGETS'] = 'impfzentren.bayern=5/10, ciam.impfzentren.bayern=2/4'
+        self.addCleanup(os.environ.pop, 'RATE_LIMIT_BUDGETS')
+
+        self.assertEqual({'impfzentren.bayern': (5, 10), 'ciam.impfzentren.bayern': (2, 4)},
+                         RateLimiter.from_env().budgets)
@@ -0,0 +1,76 @@
+from contextlib import redirect_stdout
+from datetime import date, datetime
+from io import StringIO
+from unittest import TestCase
+
+from benchmarks import bench_connector
+from tests.fixtures import FixtureLoginProvider
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.connectors import InvalidCredentialsException, UpstreamUnavailableException
+from vaccination.entities import Appointment
+from vaccination.login import StaticLoginProvider
+from vaccination.scanning import DailyScan, CursorScan
+from vaccination.services import VaccinationAppointmentService
+
+FIRST_DAY = date(2021, 12, 13)
+
+
+class ReplayServiceTest(TestCase):
+    def setUp(self) -> None:
+        self.slots = random_slots(FIRST_DAY, days=10, per_day=.5, seed=3)
+        self.adapter = ReplayAdapter(self.slots)
+        self.service = VaccinationAppointmentService(replay_connector_type(self.adapter))
+        self.authentication = self.service.authentication(FixtureLoginProvider())
+
+    def tearDown(self) -> None:
+        self.service.pool.close()
+
+    def test_login_flow(self):
+        self.assertEqual('replay token', self.authentication.access_token)
+        self.assertEqual(1, self.adapter.calls['auth'])
+        self.assertEqual(1, self.adapter.calls['login'])
+        self.assertEqual(1, self.adapter.calls['token'])
+
+    def test_rejects_wrong_password(self):
+        self.adapter.passwords = {'user': 'secret'}
+        with self.assertRaises(InvalidCredentialsException):
+            self.service.authentication(StaticLoginProvider({'username': 'user', 'password': 'wrong'}))
+
+    def test_daily_and_cursor_scans_agree(self):
+        daily = self.service.appointments_in_range(self.authentication, FIRST_DAY, 10, strategy=DailyScan(4))
+        daily_calls = self.adapter.calls['appointments/next']
+        cursor = self.service.appointments_in_range(self.authentication, FIRST_DAY, 10, strategy=CursorScan())
+
+        self.assertEqual(daily, cursor)
+        self.assertEqual(11, daily_calls)
+        self.assertLess(self.adapter.calls['appointments/next'] - daily_calls, daily_calls)
+
+    def test_books_slot(self):
+        slot = self.slots[0]
+        self.service.book_appointment(self.authentication, slot)
+
+        self.assertEqual(slot, self.service.current_appointment(self.authentication))
+        self.assertNotIn(slot, self.adapter.slots)
+
+    def test_injects_errors(self):
+        self.adapter.error_rate = 1
+        with self.assertRaises(UpstreamUnavailableException):
+            self.service.next_appointment(self.authentication, FIRST_DAY)
+
+    def test_random_slots_are_reproducible(self):
+        self.assertEqual(self.slots, random_slots(FIRST_DAY, days=10, per_day=.5, seed=3))
+        self.assertTrue(all(isinstance(slot, Appointment) and slot.date_time >= datetime(2021, 12, 13)
+                            for slot in self.slots))
+
+
+class ConnectorBenchmarkTest(TestCase):
+    def test_reports_injected_errors(self):
+        output = StringIO()
+        with redirect_stdout(output):
+            bench_connector.main(['--levels', '2', '--latency', '0', '--error-rate', '.5', '--days', '5',
+                                  '--repeat', '4'])
+
+        rows = output.getvalue().splitlines()
+        self.assertTrue(rows[0].endswith('errors'))
+        self.assertEqual(['daily scan', 'cursor scan', 'login', 'booking'], [row[:14].strip() for row in rows[1:]])
+        self.assertTrue(any('0%' != row.split()[-1] for row in rows[1:]))
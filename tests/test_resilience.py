@@ -0,0 +1,228 @@
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from threading import Event, Lock, Timer
+from time import perf_counter, sleep
+from unittest import TestCase
+
+from tests.fixtures import FixtureLoginProvider
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.connectors import UpstreamUnavailableException
+from vaccination.metrics import Registry, resilience_families
+from vaccination.resilience import LatencyWindow, Hedging, CircuitBreaker, CircuitOpenException
+from vaccination.services import VaccinationAppointmentService
+
+
+class LatencyWindowTest(TestCase):
+    def test_quantile_of_recent_latencies(self):
+        window = LatencyWindow(size=100)
+        for latency in range(200):
+            window.add(latency)
+
+        self.assertEqual(100, len(window))
+        self.assertEqual(195, window.quantile(.95))
+        self.assertIsNone(LatencyWindow().quantile(.95))
+
+
+class HedgingTest(TestCase):
+    def setUp(self) -> None:
+        self.hedging = Hedging(min_samples=3, min_delay=.01, max_delay=1)
+        for _ in range(3):
+            self.hedging.call('appointments/next', lambda: None)
+        self.release = Event()
+
+    def tearDown(self) -> None:
+        self.release.set()
+        self.hedging.close()
+
+    def _answers(self, *answers):
+        calls = iter(answers)
+
+        def send():
+            answer = next(calls)
+            if 'stalled' == answer:
+                self.release.wait(5)
+            elif 'timed out' == answer:
+                self.release.wait(5)
+                raise UpstreamUnavailableException()
+            elif 'failing slowly' == answer:
+                sleep(.1)
+                raise UpstreamUnavailableException()
+            elif 'slow hedge' == answer:
+                sleep(.3)
+            elif isinstance(answer, Exception):
+                raise answer
+            return answer
+        return send
+
+    def test_waits_for_enough_samples(self):
+        self.assertIsNone(Hedging(min_samples=3).delay('appointments/next'))
+        self.assertEqual(.01, self.hedging.delay('appointments/next'))
+
+    def test_hedge_answer_wins_over_stalled_primary(self):
+        started = perf_counter()
+
+        self.assertEqual('hedge', self.hedging.call('appointments/next', self._answers('stalled', 'hedge')))
+        self.assertLess(perf_counter() - started, 1)
+        self.assertEqual(1, self.hedging.hedged['appointments/next'])
+        self.assertEqual(1, self.hedging.hedges_won['appointments/next'])
+
+    def test_hedge_answers_for_timed_out_request(self):
+        Timer(.2, self.release.set).start()
+
+        self.assertEqual('hedge', self.hedging.call('appointments/next', self._answers('timed out', 'hedge')))
+        self.assertEqual(1, self.hedging.hedges_won['appointments/next'])
+
+    def test_failed_primary_waits_for_hedge_in_flight(self):
+        self.assertEqual('slow hedge', self.hedging.call('appointments/next',
+                                                         self._answers('failing slowly', 'slow hedge')))
+        self.assertEqual(1, self.hedging.hedges_won['appointments/next'])
+
+    def test_no_hedge_for_fast_request(self):
+        self.assertEqual('primary', self.hedging.call('appointments/next', self._answers('primary')))
+        self.assertEqual(0, self.hedging.hedged['appointments/next'])
+
+    def test_hedge_paces_itself(self):
+        paced = []
+        self.hedging.call('appointments/next', self._answers('stalled', 'hedge'), before_hedge=lambda: paced.append(1))
+
+        self.assertEqual([1], paced)
+
+    def test_primary_error_when_every_attempt_failed(self):
+        Timer(.2, self.release.set).start()
+
+        with self.assertRaises(UpstreamUnavailableException):
+            self.hedging.call('appointments/next', self._answers('timed out', RuntimeError('hedge failed')))
+        self.assertEqual(0, self.hedging.hedges_won['appointments/next'])
+
+    def test_raises_when_primary_failed_before_hedging(self):
+        with self.assertRaises(RuntimeError):
+            self.hedging.call('appointments/next', self._answers(RuntimeError('primary failed')))
+        self.assertEqual(0, self.hedging.hedged['appointments/next'])
+
+    def test_no_hedge_without_free_worker(self):
+        hedging = Hedging(min_samples=3, min_delay=.01, max_workers=1)
+        for _ in range(3):
+            hedging.call('appointments/next', lambda: None)
+        Timer(.3, self.release.set).start()
+        with ThreadPoolExecutor(max_workers=2) as callers:
+            calls = [callers.submit(hedging.call, 'appointments/next', self._answers('stalled', 'stalled'))
+                     for _ in range(2)]
+        hedging.close()
+
+        self.assertEqual(['stalled', 'stalled'], [call.result() for call in calls])
+        self.assertEqual(1, hedging.hedged['appointments/next'])
+
+    def test_queued_callers_do_not_hedge(self):
+        # flat latency with many concurrent callers, only the genuine stragglers may send a duplicate
+        hedging = Hedging(min_samples=20, min_delay=.01)
+        sent = Counter()
+        lock = Lock()
+
+        def send():
+            with lock:
+                sent['requests'] += 1
+            sleep(.1)
+
+        reads = 160
+        with ThreadPoolExecutor(max_workers=40) as callers:
+            for call in [callers.submit(hedging.call, 'appointments/next', send) for _ in range(reads)]:
+                call.result()
+        hedging.close()
+
+        self.assertEqual(reads + hedging.hedged['appointments/next'], sent['requests'])
+        self.assertLess(sent['requests'], reads * 1.3)
+
+
+class CircuitBreakerTest(TestCase):
+    URL = 'https://impfzentren.bayern/api/v1/users/current/citizens'
+
+    def setUp(self) -> None:
+        self.now = 0
+        self.breaker = CircuitBreaker(failures=2, reset_seconds=30, clock=lambda: self.now)
+
+    def _fail(self):
+        def failing():
+            raise UpstreamUnavailableException()
+        with self.assertRaises(UpstreamUnavailableException):
+            self.breaker.call(self.URL, failing, failures=(UpstreamUnavailableException,))
+
+    def _succeed(self):
+        return self.breaker.call(self.URL, lambda: 'answer', failures=(UpstreamUnavailableException,))
+
+    def test_opens_after_consecutive_failures(self):
+        self._fail()
+        self._fail()
+        self.now = 10
+
+        with self.assertRaises(CircuitOpenException) as raised:
+            self._succeed()
+        self.assertEqual(20, raised.exception.retry_after)
+        self.assertEqual('open', self.breaker.states()['impfzentren.bayern']['state'])
+
+    def test_success_resets_failures(self):
+        self._fail()
+        self._succeed()
+        self._fail()
+
+        self.assertEqual('answer', self._succeed())
+
+    def test_trial_request_closes_circuit(self):
+        self._fail()
+        self._fail()
+        self.now = 30
+
+        self.assertEqual('answer', self._succeed())
+        self.assertEqual('closed', self.breaker.states()['impfzentren.bayern']['state'])
+
+    def test_failed_trial_reopens_circuit(self):
+        self._fail()
+        self._fail()
+        self.now = 30
+        self._fail()
+
+        with self.assertRaises(CircuitOpenException):
+            self._succeed()
+
+    def test_other_errors_mean_upstream_answers(self):
+        def refused():
+            raise KeyError('not a failure of the upstream')
+        self._fail()
+        with self.assertRaises(KeyError):
+            self.breaker.call(self.URL, refused, failures=(UpstreamUnavailableException,))
+        self._fail()
+
+        self.assertEqual('answer', self._succeed())
+
+    def test_exposes_state(self):
+        self._fail()
+        self._fail()
+        with self.assertRaises(CircuitOpenException):
+            self._succeed()
+
+        rendered = Registry().render([lambda: resilience_families(Hedging(), self.breaker)])
+        self.assertIn('vaccination_upstream_circuit_open{host="impfzentren.bayern"} 1.0', rendered)
+        self.assertIn('vaccination_upstream_circuit_rejected_total{host="impfzentren.bayern"} 1', rendered)
+
+
+class ConnectorResilienceTest(TestCase):
+    def setUp(self) -> None:
+        self.adapter = ReplayAdapter(random_slots(date(2021, 12, 13), days=3, per_day=1, seed=6))
+        self.service = VaccinationAppointmentService(replay_connector_type(self.adapter))
+        self.authentication = self.service.authentication(FixtureLoginProvider())
+
+    def tearDown(self) -> None:
+        self.service.pool.close()
+
+    def test_fails_fast_while_upstream_is_degraded(self):
+        with self.service.pool.lease(self.authentication) as connector:
+            connector.circuit_breaker = CircuitBreaker(failures=2)
+            self.adapter.error_rate = 1
+            for _ in range(2):
+                with self.assertRaises(UpstreamUnavailableException):
+                    connector.get_next_appointment(date(2021, 12, 13))
+            calls = self.adapter.calls['appointments/next']
+
+            with self.assertRaises(CircuitOpenException):
+                connector.get_next_appointment(date(2021, 12, 13))
+        self.assertEqual(calls, self.adapter.calls['appointments/next'])
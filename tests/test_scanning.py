@@ -0,0 +1,105 @@
+import unittest
+from datetime import date, datetime
+from threading import Lock
+
+from tests.fixtures import ResponseFixture, ResponseFixtures
+from vaccination.connectors import ImpzentrenBayernConnector
+from vaccination.entities import Appointment
+from vaccination.scanning import DailyScan, CursorScan
+
+NEXT_APPOINTMENT_URL = 'https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/next'
+
+
+class ScanTestCase(unittest.TestCase):
+    def setUp(self) -> None:
+        self.connector = ImpzentrenBayernConnector()
+        self.fixture = ResponseFixtures.fixtures()
+        self.slots = {
+            '2021-12-13': '{"siteId" : "site id", "vaccinationDate" : "2021-12-14", "vaccinationTime" : "09:00"}',
+            '2021-12-14': '{"siteId" : "site id", "vaccinationDate" : "2021-12-14", "vaccinationTime" : "09:00"}',
+            '2021-12-15': '{"siteId" : "other site", "vaccinationDate" : "2021-12-16", "vaccinationTime" : "10:30"}',
+        }
+        self.requested_days = []
+        self.lock = Lock()
+
+        self.connector._session.get = self._get
+
+    def _get(self, url, params=None, **_):
+        if url != NEXT_APPOINTMENT_URL:
+            return self.fixture[url]
+        with self.lock:
+            self.requested_days.append(params['lastDate'])
+        if params['lastDate'] in self.slots:
+            return ResponseFixture(200, self.slots[params['lastDate']])
+        return ResponseFixture(404, '{}')
+
+
+class DailyScanTest(ScanTestCase):
+    def test_parallel_scan_matches_sequential_scan(self):
+        sequential = self.connector.get_appointments_in_range(date(2021, 12, 13), days=4, strategy=DailyScan())
+        parallel = self.connector.get_appointments_in_range(date(2021, 12, 13), days=4,
+                                                            strategy=DailyScan(max_workers=3))
+
+        self.assertEqual({Appointment('site id', datetime(2021, 12, 14, 9, 0)),
+                          Appointment('other site', datetime(2021, 12, 16, 10, 30))}, parallel)
+        self.assertEqual(sequential, parallel)
+
+    def test_parallel_scan_requests_every_day(self):
+        self.connector.get_appointments_in_range(date(2021, 12, 13), days=4, strategy=DailyScan(max_workers=8))
+
+        self.assertEqual(['2021-12-13', '2021-12-14', '2021-12-15', '2021-12-16', '2021-12-17'],
+                         sorted(self.requested_days))
+
+    def test_iter_scan_yields_each_slot_once(self):
+        for workers in (1, 3):
+            found = list(self.connector.iter_appointments_in_range(date(2021, 12, 13), days=4,
+                                                                   strategy=DailyScan(max_workers=workers)))
+
+            self.assertCountEqual([Appointment('site id', datetime(2021, 12, 14, 9, 0)),
+                                   Appointment('other site', datetime(2021, 12, 16, 10, 30))], found)
+
+    def test_iter_scan_stops_with_consumer(self):
+        scan = self.connector.iter_appointments_in_range(date(2021, 12, 13), days=30, strategy=DailyScan())
+
+        next(scan)
+        scan.close()
+        self.assertEqual(['2021-12-13'], self.requested_days)
+
+    def test_rejects_empty_pool(self):
+        with self.assertRaises(AssertionError):
+            DailyScan(max_workers=0)
+
+
+class CursorScanTest(ScanTestCase):
+    def test_finds_same_appointments_as_daily_scan(self):
+        daily = self.connector.get_appointments_in_range(date(2021, 12, 13), days=6, strategy=DailyScan())
+        self.requested_days.clear()
+        cursor = self.connector.get_appointments_in_range(date(2021, 12, 13), days=6, strategy=CursorScan())
+
+        self.assertEqual(daily, cursor)
+
+    def test_jumps_past_returned_slot(self):
+        strategy = CursorScan()
+        self.connector.get_appointments_in_range(date(2021, 12, 13), days=6, strategy=strategy)
+
+        self.assertEqual(['2021-12-13', '2021-12-15', '2021-12-17'], self.requested_days)
+        self.assertEqual(3, strategy.requests)
+        self.assertEqual(4, strategy.requests_saved)
+
+    def test_iter_scan_yields_before_scan_completes(self):
+        scan = self.connector.iter_appointments_in_range(date(2021, 12, 13), days=6, strategy=CursorScan())
+
+        self.assertEqual(Appointment('site id', datetime(2021, 12, 14, 9, 0)), next(scan))
+        self.assertEqual(['2021-12-13'], self.requested_days)
+
+    def test_stops_without_next_appointment(self):
+        self.slots.clear()
+        strategy = CursorScan()
+
+        self.assertEqual(set(), self.connector.get_appointments_in_range(date(2021, 12, 13), days=6,
+                                                                         strategy=strategy))
+        self.assertEqual(1, strategy.requests)
+
+
+if __name__ == '__main__':
+    unittest.main()
@@ -0,0 +1,95 @@
+import os
+import signal
+import subprocess
+import sys
+from tempfile import TemporaryDirectory, TemporaryFile
+from time import sleep, monotonic
+from unittest import TestCase, mock
+from urllib.request import urlopen
+
+from web.server import share_state, bind, SHARED_STATE_FILES, PreforkServer
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+
+class ShareStateTest(TestCase):
+    def test_points_backends_at_shared_directory(self):
+        with TemporaryDirectory() as directory, mock.patch.dict(os.environ, {'RATE_LIMIT_DB': 'mine.db'}):
+            for variable in list(SHARED_STATE_FILES) + ['SESSION_STORE', 'FLASK_SECRET_KEY']:
+                if 'RATE_LIMIT_DB' != variable:
+                    os.environ.pop(variable, None)
+            share_state(directory)
+
+            self.assertEqual('mine.db', os.environ['RATE_LIMIT_DB'])
+            self.assertEqual(os.path.join(directory, 'snapshots.db'), os.environ['SNAPSHOT_DB'])
+            self.assertEqual('sqlite', os.environ['SESSION_STORE'])
+            self.assertTrue(os.environ['FLASK_SECRET_KEY'])
+
+
+class PreforkServerTest(TestCase):
+    def setUp(self) -> None:
+        listening = bind('127.0.0.1', 0)
+        self.port = listening.getsockname()[1]
+        listening.close()
+        self.directory = TemporaryDirectory()
+        self.server = subprocess.Popen([sys.executable, '-m', 'web.server', '--host', '127.0.0.1',
+                                        '--port', str(self.port), '--workers', '2',
+                                        '--state-dir', self.directory.name],
+                                       cwd=ROOT, env={**os.environ, 'PREFETCH_LOGIN_LINKS': '0'},
+                                       stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+
+    def tearDown(self) -> None:
+        if self.server.poll() is None:
+            self.server.kill()
+            self.server.wait()
+        self.directory.cleanup()
+
+    def _get(self, path):
+        deadline = monotonic() + 20
+        while True:
+            try:
+                with urlopen(f'http://127.0.0.1:{self.port}{path}', timeout=5) as response:
+                    return response.status
+            except OSError:
+                if monotonic() > deadline:
+                    raise
+                sleep(.1)
+
+    def test_workers_serve_shared_socket(self):
+        self.assertEqual([200] * 10, [self._get('/') for _ in range(10)])
+        self.assertTrue(os.path.exists(os.path.join(self.directory.name, 'sessions.db')))
+
+        self.server.send_signal(signal.SIGTERM)
+        self.assertEqual(0, self.server.wait(timeout=10))
+
+
+class FailingWorkerTest(TestCase):
+    def setUp(self) -> None:
+        self.listening = bind('127.0.0.1', 0)
+        self.handlers = signal.getsignal(signal.SIGTERM), signal.getsignal(signal.SIGINT)
+
+    def tearDown(self) -> None:
+        signal.signal(signal.SIGTERM, self.handlers[0])
+        signal.signal(signal.SIGINT, self.handlers[1])
+        self.listening.close()
+
+    def test_gives_up_on_workers_failing_at_startup(self):
+        def broken_app():
+            raise OSError('unable to open database file')
+        server = PreforkServer(broken_app, self.listening, workers=1, restart_delay=.05, max_fast_failures=3)
+
+        started = monotonic()
+        # the forked workers print their traceback to a file this process can read back
+        with TemporaryFile('w+') as stderr, mock.patch('sys.stderr', stderr), \
+                self.assertLogs('PreforkServer') as logs:
+            server.serve()
+            stderr.seek(0)
+            printed = stderr.read()
+
+        self.assertTrue(server.failed)
+        self.assertEqual(3, len(logs.output))
+        self.assertIn('exited with [1] right after starting, restarting in [0.05s]', logs.output[0])
+        self.assertIn('restarting in [0.1s]', logs.output[1])
+        self.assertIn('giving up', logs.output[2])
+        self.assertGreaterEqual(monotonic() - started, .15)
+        self.assertEqual(3, printed.count('OSError: unable to open database file'))
@@ -6,6 +6,7 @@ from more_itertools import one
 from tests.fixtures import FixtureLoginProvider, ResponseFixture, ResponseFixtures
 from vaccination.connectors import Authentication, ImpzentrenBayernConnector
 from vaccination.entities import Appointment
+from vaccination.pool import ConnectorPool
 from vaccination.services import VaccinationAppointmentService
 
 
@@ -14,7 +15,7 @@ class ImpzentrenBayernConnectorMock(ImpzentrenBayernConnector):
         super().__init__()
         self.fixtures = ResponseFixtures.fixtures()
         self._get = lambda url, params=None, allowed_returns=None: self.fixtures[url]
-        self._post = lambda url, data=None, json=None: self.fixtures[url]
+        self._post = lambda url, data=None, json=None, **_: self.fixtures[url]
 
 
 class VaccinationAppointmentServiceTest(TestCase):
@@ -27,6 +28,12 @@ class VaccinationAppointmentServiceTest(TestCase):
             Authentication.from_access_token({'token_type': 'Bearer', 'access_token': 'test token', 'refresh_token': 'test refresh token'}),
             self.service.authentication(FixtureLoginProvider()))
 
+    def test_keeps_empty_shared_pool(self):
+        pool = ConnectorPool(ImpzentrenBayernConnectorMock)
+
+        VaccinationAppointmentService(ImpzentrenBayernConnectorMock, pool).authentication(FixtureLoginProvider())
+        self.assertEqual(1, len(pool))
+
     def test_current_appointment(self):
         self.assertEqual(Appointment('site id', datetime(2021, 12, 13, 15, 0, 0)),
                          self.service.current_appointment(self.authentication))
@@ -0,0 +1,97 @@
+import os
+from tempfile import TemporaryDirectory
+from unittest import TestCase
+
+from vaccination.connectors import Authentication
+from vaccination.sessions import MemorySessionStore, SqliteSessionStore, SessionState
+
+
+class SessionStoreContract:
+    def create_store(self, ttl=3600):
+        raise NotImplementedError()
+
+    def setUp(self) -> None:
+        self.store = self.create_store()
+        self.state = SessionState(Authentication('test token', 'test refresh token', 1e10), {'id': 'citizen_id'})
+
+    def tearDown(self) -> None:
+        self.store.close()
+
+    def test_creates_unguessable_ids(self):
+        first, second = self.store.create(self.state), self.store.create(self.state)
+
+        self.assertNotEqual(first, second)
+        self.assertGreaterEqual(len(first), 32)
+
+    def test_keeps_full_state(self):
+        session_id = self.store.create(self.state)
+
+        state = self.store.get(session_id)
+        self.assertEqual(self.state.to_json(), state.to_json())
+        self.assertEqual('test refresh token', state.authentication.refresh_token)
+
+    def test_saves_changes(self):
+        session_id = self.store.create(self.state)
+        self.state.authentication.update({'access_token': 'new token', 'expires_in': 300})
+        self.store.save(session_id, self.state)
+
+        self.assertEqual('new token', self.store.get(session_id).authentication.access_token)
+
+    def test_deletes(self):
+        session_id = self.store.create(self.state)
+        self.store.delete(session_id)
+
+        self.assertIsNone(self.store.get(session_id))
+
+    def test_unknown_session(self):
+        self.assertIsNone(self.store.get('unknown'))
+
+    def test_expires(self):
+        store = self.create_store(ttl=-1)
+        session_id = store.create(self.state)
+
+        self.assertIsNone(store.get(session_id))
+        store.close()
+
+
+class MemorySessionStoreTest(SessionStoreContract, TestCase):
+    def create_store(self, ttl=3600):
+        return MemorySessionStore(maxsize=2, ttl=ttl)
+
+    def test_shares_state_between_requests(self):
+        session_id = self.store.create(self.state)
+
+        self.assertIs(self.store.get(session_id), self.store.get(session_id))
+
+    def test_evicts_least_recently_used(self):
+        oldest = self.store.create(self.state)
+        self.store.create(self.state)
+        self.store.create(self.state)
+
+        self.assertIsNone(self.store.get(oldest))
+        self.assertEqual(2, len(self.store))
+
+
+class SqliteSessionStoreTest(SessionStoreContract, TestCase):
+    def create_store(self, ttl=3600):
+        return SqliteSessionStore(ttl=ttl)
+
+    def test_survives_restart(self):
+        with TemporaryDirectory() as directory:
+            path = os.path.join(directory, 'sessions.db')
+            store = SqliteSessionStore(path)
+            session_id = store.create(self.state)
+            store.close()
+
+            restarted = SqliteSessionStore(path)
+            self.assertEqual(self.state.to_json(), restarted.get(session_id).to_json())
+            restarted.close()
+
+    def test_prunes_expired_sessions(self):
+        expired = SqliteSessionStore(ttl=-1)
+        expired.create(self.state)
+        expired.ttl = 3600
+        expired.create(self.state)
+
+        self.assertEqual(1, expired._connection.execute('SELECT count(*) FROM sessions').fetchone()[0])
+        expired.close()
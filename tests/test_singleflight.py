@@ -0,0 +1,103 @@
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from threading import Event
+from unittest import TestCase
+
+from tests.fixtures import FixtureLoginProvider
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.metrics import Registry, single_flight_families
+from vaccination.services import VaccinationAppointmentService
+from vaccination.singleflight import SingleFlight
+
+NEXT_APPOINTMENT_URL = 'https://impfzentren.bayern/api/v1/citizens/citizen_id/appointments/next'
+
+
+class SingleFlightTest(TestCase):
+    def setUp(self) -> None:
+        self.single_flight = SingleFlight()
+        self.release = Event()
+        self.calls = 0
+
+    def _slow_call(self):
+        self.calls += 1
+        self.release.wait(5)
+        return object()
+
+    def _await_waiters(self, key, count):
+        for _ in range(500):
+            if self.single_flight.waiters().get(key) == count:
+                return
+            self.release.wait(.01)
+        self.fail(f'expected [{count}] waiters')
+
+    def test_shares_result_of_call_in_flight(self):
+        key = ('GET', NEXT_APPOINTMENT_URL, (), 'account')
+        with ThreadPoolExecutor(max_workers=4) as executor:
+            futures = [executor.submit(self.single_flight.do, key, self._slow_call) for _ in range(4)]
+            self._await_waiters(key, 3)
+            self.release.set()
+            results = [future.result() for future in futures]
+
+        self.assertEqual(1, self.calls)
+        self.assertTrue(all(result is results[0] for result in results))
+        self.assertEqual({('GET', 'appointments/next'): 3}, dict(self.single_flight.shared_calls))
+        self.assertEqual({}, self.single_flight.waiters())
+
+    def test_separates_keys(self):
+        self.release.set()
+
+        self.single_flight.do(('GET', NEXT_APPOINTMENT_URL, (), 'first'), self._slow_call)
+        self.single_flight.do(('GET', NEXT_APPOINTMENT_URL, (), 'second'), self._slow_call)
+        self.assertEqual(2, self.calls)
+
+    def test_shares_errors(self):
+        key = ('GET', NEXT_APPOINTMENT_URL, (), 'account')
+
+        def failing_call():
+            self._slow_call()
+            raise ConnectionError()
+
+        with ThreadPoolExecutor(max_workers=2) as executor:
+            futures = [executor.submit(self.single_flight.do, key, failing_call) for _ in range(2)]
+            self._await_waiters(key, 1)
+            self.release.set()
+            for future in futures:
+                self.assertIsInstance(future.exception(), ConnectionError)
+        self.assertEqual(1, self.calls)
+
+    def test_calls_again_after_completion(self):
+        self.release.set()
+        key = ('GET', NEXT_APPOINTMENT_URL, (), 'account')
+
+        self.assertIsNot(self.single_flight.do(key, self._slow_call), self.single_flight.do(key, self._slow_call))
+        self.assertEqual(2, self.calls)
+
+    def test_exposes_waiters_per_endpoint(self):
+        key = ('GET', NEXT_APPOINTMENT_URL, (('lastDate', '2021-12-13'),), 'account')
+        with ThreadPoolExecutor(max_workers=3) as executor:
+            futures = [executor.submit(self.single_flight.do, key, self._slow_call) for _ in range(3)]
+            self._await_waiters(key, 2)
+            rendered = Registry().render([lambda: single_flight_families(self.single_flight)])
+            self.release.set()
+            [future.result() for future in futures]
+
+        self.assertIn('vaccination_upstream_coalesced_waiters{method="GET",endpoint="appointments/next"} 2', rendered)
+        self.assertIn('vaccination_upstream_coalesced_total{method="GET",endpoint="appointments/next"} 2', rendered)
+
+
+class ConnectorCoalescingTest(TestCase):
+    def test_concurrent_identical_reads_share_upstream_call(self):
+        adapter = ReplayAdapter(random_slots(date(2021, 12, 13), days=3, per_day=1, seed=4), latency=.1)
+        service = VaccinationAppointmentService(replay_connector_type(adapter))
+        try:
+            authentication = service.authentication(FixtureLoginProvider())
+            service.next_appointment(authentication, date(2021, 12, 13))
+            calls_before = adapter.calls['appointments/next']
+            with ThreadPoolExecutor(max_workers=8) as executor:
+                results = list(executor.map(lambda _: service.next_appointment(authentication, date(2021, 12, 14)),
+                                            range(8)))
+        finally:
+            service.pool.close()
+
+        self.assertEqual(1, adapter.calls['appointments/next'] - calls_before)
+        self.assertTrue(all(result is results[0] for result in results))
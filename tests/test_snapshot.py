@@ -0,0 +1,130 @@
+import os
+from datetime import datetime, date
+from tempfile import TemporaryDirectory
+from time import sleep
+from unittest import TestCase
+
+from tests.fixtures import FixtureLoginProvider
+from tests.test_service import ImpzentrenBayernConnectorMock
+from vaccination.connectors import InvalidCredentialsException
+from vaccination.entities import Appointment
+from vaccination.services import VaccinationAppointmentService
+from vaccination.snapshot import SnapshotRefresher, SqliteSnapshotStore, SlotSnapshot
+
+
+class SnapshotRefresherTest(TestCase):
+    def setUp(self) -> None:
+        self.service = VaccinationAppointmentService(ImpzentrenBayernConnectorMock)
+        self.authentication = self.service.authentication(FixtureLoginProvider())
+        self.refresher = SnapshotRefresher(self.service, days=2, interval=60)
+
+    def tearDown(self) -> None:
+        self.refresher.stop()
+
+    def test_no_snapshot_before_refresh(self):
+        self.assertIsNone(self.refresher.snapshot)
+
+    def test_refresh_with_authentication(self):
+        snapshot = self.refresher.refresh(self.authentication)
+
+        self.assertEqual(frozenset({Appointment('site id', datetime(2021, 12, 13, 15, 0))}), snapshot.appointments)
+        self.assertIs(snapshot, self.refresher.snapshot)
+        self.assertLess(snapshot.age, 60)
+
+    def test_stream_replaces_snapshot_when_complete(self):
+        snapshots = []
+        stream = self.refresher.stream(self.authentication, snapshots.append)
+
+        self.assertEqual(Appointment('site id', datetime(2021, 12, 13, 15, 0)), next(stream))
+        self.assertIsNone(self.refresher.snapshot)
+        self.assertEqual([], list(stream))
+        self.assertEqual([self.refresher.snapshot], snapshots)
+
+    def test_abandoned_stream_keeps_snapshot(self):
+        snapshot = self.refresher.refresh(self.authentication)
+        stream = self.refresher.stream(self.authentication)
+
+        next(stream)
+        stream.close()
+        self.assertIs(snapshot, self.refresher.snapshot)
+
+    def test_refresh_requires_authentication(self):
+        with self.assertRaises(AssertionError):
+            self.refresher.refresh()
+
+    def test_background_refresh_after_offer(self):
+        refreshed = []
+        refresh = self.refresher.refresh
+        self.refresher.refresh = lambda authentication=None: refreshed.append(authentication) or refresh(authentication)
+
+        self.refresher.offer(self.authentication)
+        for _ in range(100):
+            if self.refresher.snapshot:
+                break
+            sleep(.05)
+        self.refresher.stop()
+
+        self.assertEqual([self.authentication], refreshed)
+        self.assertIsNotNone(self.refresher.snapshot)
+
+    def test_withdraw_forgets_offered_authentication(self):
+        self.refresher.offer(self.authentication)
+        self.refresher.withdraw('another account')
+        self.assertIs(self.authentication, self.refresher._authentication)
+
+        self.refresher.withdraw(self.authentication.account_key)
+        self.assertIsNone(self.refresher._authentication)
+
+    def test_withdraws_authentication_when_refresh_grant_fails(self):
+        def expired(authentication=None):
+            raise InvalidCredentialsException()
+        self.refresher.refresh = expired
+
+        with self.assertLogs('SnapshotRefresher'):
+            self.refresher.offer(self.authentication)
+            for _ in range(100):
+                if self.refresher._authentication is None:
+                    break
+                sleep(.05)
+        self.assertIsNone(self.refresher._authentication)
+
+
+class SqliteSnapshotStoreTest(TestCase):
+    def setUp(self) -> None:
+        self.directory = TemporaryDirectory()
+        path = os.path.join(self.directory.name, 'snapshots.db')
+        self.first, self.second = SqliteSnapshotStore(path), SqliteSnapshotStore(path)
+        self.snapshot = SlotSnapshot(frozenset({Appointment('site id', datetime(2021, 12, 13, 15, 0))}),
+                                     datetime(2021, 12, 1, 10, 0), date(2021, 12, 1), 30)
+
+    def tearDown(self) -> None:
+        self.first.close()
+        self.second.close()
+        self.directory.cleanup()
+
+    def test_shares_snapshot_between_stores(self):
+        self.assertIsNone(self.second.load())
+        self.first.save(self.snapshot)
+
+        shared = self.second.load()
+        self.assertEqual(self.snapshot.appointments, shared.appointments)
+        self.assertEqual(self.snapshot.taken_at, shared.taken_at)
+        self.assertEqual(self.snapshot.etag, shared.etag)
+        self.assertIs(shared, self.second.load())
+
+    def test_only_one_store_claims_refresh(self):
+        self.assertTrue(self.first.claim_refresh(60))
+        self.assertFalse(self.second.claim_refresh(60))
+        self.assertFalse(self.first.claim_refresh(60))
+
+    def test_claim_expires(self):
+        self.assertTrue(self.first.claim_refresh(-1))
+        self.assertTrue(self.second.claim_refresh(60))
+
+    def test_refresher_saves_to_store(self):
+        service = VaccinationAppointmentService(ImpzentrenBayernConnectorMock)
+        refresher = SnapshotRefresher(service, days=2, store=self.first)
+
+        refresher.refresh(service.authentication(FixtureLoginProvider()))
+        self.assertEqual(refresher.snapshot.appointments, SnapshotRefresher(service, store=self.second)
+                         .snapshot.appointments)
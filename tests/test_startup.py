@@ -0,0 +1,37 @@
+import json
+import os
+import subprocess
+import sys
+from unittest import TestCase
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+HEAVY_MODULES = ('bs4', 'dateutil.rrule', 'pytz', 'requests', 'orjson', 'flask', 'flask_classful', 'flask_restx',
+                 'waitress')
+
+
+def loaded_after_import(module):
+    script = f'import sys, {module}; print(__import__("json").dumps(sorted(sys.modules)))'
+    output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True, capture_output=True, text=True)
+    return set(json.loads(output.stdout))
+
+
+class StartupImportsTest(TestCase):
+    def assertDefersHeavyImports(self, module):
+        self.assertEqual([], [heavy for heavy in HEAVY_MODULES if heavy in loaded_after_import(module)])
+
+    def test_cli(self):
+        self.assertDefersHeavyImports('cli')
+
+    def test_connectors(self):
+        self.assertDefersHeavyImports('vaccination.connectors')
+
+    def test_web(self):
+        self.assertDefersHeavyImports('web.server')
+
+    def test_connector_loads_requests_on_first_use(self):
+        script = 'import sys; from vaccination.connectors import ImpzentrenBayernConnector; ' \
+                 'ImpzentrenBayernConnector().close(); print("requests" in sys.modules)'
+        output = subprocess.run([sys.executable, '-c', script], cwd=ROOT, check=True, capture_output=True, text=True)
+
+        self.assertEqual('True', output.stdout.strip())
@@ -0,0 +1,131 @@
+from datetime import datetime
+from unittest import TestCase
+
+from tests.fixtures import ResponseFixture
+from vaccination.booking import BookingResult, NoSlotBookedException
+from vaccination.connectors import Authentication, UpstreamUnavailableException, BookingRefusedException
+from vaccination.entities import Appointment
+from vaccination.watcher import SlotWatcher, SlotEvent, Backoff, AutoBookCallback
+
+FIRST = Appointment('site id', datetime(2021, 12, 13, 15, 0))
+SECOND = Appointment('other site', datetime(2021, 12, 14, 9, 30))
+
+
+class ScriptedService:
+    def __init__(self, *results):
+        self.results = list(results)
+
+    def appointments_in_range(self, authentication, first_day, days, strategy=None):
+        result = self.results.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+
+class ScriptedEngine:
+    def __init__(self, taken=()):
+        self.taken = set(taken)
+        self.refusal = None
+        self.offered = set()
+        self.booked = []
+        self.attempted = []
+
+    def offer(self, appointments):
+        self.offered.update(appointments)
+
+    def withdraw(self, appointments):
+        self.offered.difference_update(appointments)
+
+    def book(self):
+        attempts = sorted(self.offered)
+        for appointment in attempts:
+            self.offered.discard(appointment)
+            self.attempted.append(appointment)
+            if self.refusal is not None:
+                raise BookingRefusedException(appointment, self.refusal)
+            if appointment not in self.taken:
+                self.booked.append(appointment)
+                return BookingResult(appointment, attempts, 0)
+        raise NoSlotBookedException(attempts)
+
+    def close(self):
+        pass
+
+
+class SlotWatcherTest(TestCase):
+    def _watcher(self, *results, **kwargs):
+        self.service = ScriptedService(*results)
+        self.engine = ScriptedEngine()
+        self.events = []
+        return SlotWatcher(self.service, Authentication('test token'), interval=0,
+                           backoff=Backoff(base=0), callbacks=[self.events.append], **kwargs)
+
+    def test_emits_appeared_and_disappeared(self):
+        watcher = self._watcher({FIRST}, {FIRST, SECOND}, {SECOND})
+        watcher.run(max_polls=3)
+
+        self.assertEqual([(SlotEvent.APPEARED, FIRST), (SlotEvent.APPEARED, SECOND), (SlotEvent.DISAPPEARED, FIRST)],
+                         [(event.kind, event.appointment) for event in self.events])
+        self.assertEqual({SECOND}, watcher.slots)
+
+    def test_keeps_polling_after_errors(self):
+        watcher = self._watcher(UpstreamUnavailableException(ResponseFixture(503, '')), {FIRST})
+        watcher.run(max_polls=2)
+
+        self.assertEqual(1, watcher.polls)
+        self.assertEqual(0, watcher.failures)
+        self.assertEqual([FIRST], [event.appointment for event in self.events])
+
+    def test_backs_off_exponentially(self):
+        watcher = self._watcher(jitter=0)
+        watcher.backoff = Backoff(base=5, factor=2, maximum=30)
+
+        delays = []
+        for failures in range(1, 6):
+            watcher.failures = failures
+            delays.append(watcher.next_delay(RuntimeError()))
+        self.assertEqual([5, 10, 20, 30, 30], delays)
+
+    def test_honours_retry_after(self):
+        response = ResponseFixture(429, '')
+        response.headers['Retry-After'] = '120'
+        watcher = self._watcher(jitter=0)
+        watcher.failures = 1
+
+        self.assertEqual(120, watcher.next_delay(UpstreamUnavailableException(response)))
+
+    def test_jitters_interval(self):
+        watcher = self._watcher(jitter=.5)
+        watcher.interval = 10
+
+        for _ in range(20):
+            self.assertTrue(5 <= watcher.next_delay() <= 15)
+
+    def test_auto_books_first_accepted_slot(self):
+        watcher = self._watcher({FIRST, SECOND})
+        auto_book = AutoBookCallback(self.engine, accept=lambda appointment: appointment.site == 'other site')
+        watcher.add_callback(auto_book)
+        watcher.run(max_polls=1)
+
+        self.assertEqual([SECOND], self.engine.booked)
+        self.assertEqual(SECOND, auto_book.booked)
+
+    def test_auto_book_moves_on_when_slot_is_taken(self):
+        watcher = self._watcher({FIRST, SECOND})
+        self.engine.taken = {FIRST}
+        booked = []
+        watcher.add_callback(AutoBookCallback(self.engine, on_booked=booked.append))
+        watcher.run(max_polls=1)
+
+        self.assertEqual([SECOND], booked)
+
+    def test_auto_book_stops_when_booking_is_refused(self):
+        watcher = self._watcher({FIRST, SECOND})
+        self.engine.refusal = ResponseFixture(403, '{"error": "already vaccinated"}')
+        auto_book = AutoBookCallback(self.engine)
+        watcher.add_callback(auto_book)
+        watcher.run(max_polls=1)
+
+        self.assertEqual(1, len(self.engine.attempted))
+        self.assertIsNone(auto_book.booked)
+        self.assertEqual(403, auto_book.refused.response.status_code)
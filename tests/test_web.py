@@ -1,7 +1,14 @@
+from datetime import date
 from unittest import TestCase
 
 from bs4 import BeautifulSoup
 
+from tests.fixtures import FixtureLoginProvider
+from benchmarks.replay import ReplayAdapter, replay_connector_type, random_slots
+from vaccination.pool import ConnectorPool
+from vaccination.services import VaccinationAppointmentService
+from vaccination.sessions import SessionState
+from vaccination.snapshot import SnapshotRefresher
 from web import create_app
 
 
@@ -16,3 +23,68 @@ class TestVaccinationHome(TestCase):
             self.assertEqual(200, response.status_code, response)
             soup=BeautifulSoup(response.data, features='html.parser')
             self.assertEqual('Bavarian Vaccination - Appointment Finder',soup.title.text)
+
+
+class TestVaccinationAppointments(TestCase):
+    def setUp(self) -> None:
+        self.test_app = create_app()
+        self.adapter = ReplayAdapter(random_slots(date.today(), days=5, per_day=1, seed=7))
+        connector_type = replay_connector_type(self.adapter)
+        pool = ConnectorPool(connector_type)
+        self.refresher = SnapshotRefresher(VaccinationAppointmentService(connector_type, pool), days=5)
+        self.test_app.extensions['connector_pool'] = pool
+        self.test_app.extensions['slot_refresher'] = self.refresher
+        self.test_client = self.test_app.test_client()
+        authentication = VaccinationAppointmentService(connector_type, pool).authentication(FixtureLoginProvider())
+        session_id = self.test_app.extensions['session_store'].create(SessionState(authentication))
+        with self.test_client.session_transaction() as session:
+            session['sid'] = session_id
+
+    def tearDown(self) -> None:
+        self.refresher.stop()
+        self.test_app.extensions['connector_pool'].close()
+
+    def test_streams_slots_without_snapshot(self):
+        response = self.test_client.get('/appointments/')
+
+        self.assertTrue(response.is_streamed)
+        soup = BeautifulSoup(response.get_data(), features='html.parser')
+        self.assertEqual(len(self.adapter.slots), len(soup.find_all('input', {'name': 'siteId'})))
+        self.assertIsNotNone(self.refresher.snapshot)
+
+    def test_renders_snapshot_sorted(self):
+        self.test_client.get('/appointments/').get_data()
+        response = self.test_client.get('/appointments/')
+
+        soup = BeautifulSoup(response.get_data(), features='html.parser')
+        self.assertIn('slots as of', soup.text)
+        dates = [row.find('td').text for row in soup.find('tbody').find_all('tr')]
+        self.assertEqual(sorted(dates), dates)
+
+    def _form(self, slot):
+        return {'siteId': slot.site, 'vaccinationDate': slot.date_time.date().isoformat(),
+                'vaccinationTime': slot.date_time.time().isoformat('minutes')}
+
+    def test_offers_rendered_slots_for_booking(self):
+        self.test_client.get('/appointments/').get_data()
+        self.test_client.get('/appointments/').get_data()
+
+        engines = self.test_app.extensions['booking_engines']
+        self.assertEqual(1, len(engines))
+        self.assertEqual(sorted(self.refresher.snapshot.appointments), next(iter(engines._engines.values())).candidates)
+
+    def test_books_visible_slot_when_clicked_one_is_taken(self):
+        self.test_client.get('/appointments/').get_data()
+        self.test_client.get('/appointments/').get_data()
+        clicked, fallback = self.adapter.slots[2], self.adapter.slots[0]
+        self.adapter.slots.remove(clicked)
+        calls = sum(self.adapter.calls.values())
+
+        response = self.test_client.post('/appointments/', data=self._form(clicked))
+
+        self.assertEqual(200, response.status_code, response.data)
+        self.assertEqual(f'booked {fallback}', response.get_data(as_text=True))
+        self.assertEqual(fallback, self.adapter.booked)
+        self.assertEqual(calls + 2, sum(self.adapter.calls.values()))
+        self.assertEqual(0, len(self.test_app.extensions['booking_engines']))
+
@@ -0,0 +1,212 @@
+from __future__ import annotations
+
+import asyncio
+from datetime import date
+from time import perf_counter
+from typing import Type, Set, Dict
+
+import httpx
+
+from vaccination.cache import MISSING, ReadCache
+from vaccination.connectors import ImpzentrenBayernApi, Authentication, AuthenticationRefreshNeededException, \
+    UpstreamUnavailableException
+from vaccination.entities import Appointment, NoAppointment
+from vaccination.login import LoginProvider
+from vaccination.metrics import observe_upstream
+from vaccination.scanning import days_in_range, only_appointments
+
+
+class AsyncImpzentrenBayernConnector(ImpzentrenBayernApi):
+    MAX_CONNECTIONS = 16
+
+    def __init__(self):
+        super().__init__()
+        self._client = httpx.AsyncClient(follow_redirects=True,
+                                         limits=httpx.Limits(max_connections=self.MAX_CONNECTIONS))
+        self._refresh_lock = asyncio.Lock()
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def close(self):
+        await self._client.aclose()
+
+    async def _login_link(self):
+        return self._parse_login_link(await self._get(self.LOGIN_PAGE_URL))
+
+    async def get_access_token(self, access_token):
+        return self._parse_token(await self._post(self.TOKEN_URL, data=self._access_token_data(access_token)))
+
+    async def refresh_token(self, refresh_token):
+        return self._parse_refreshed_token(await self._post(self.TOKEN_URL, data=self._refresh_token_data(refresh_token),
+                                                            allowed_returns=self.REFRESH_RETURNS))
+
+    async def login(self, login_json):
+        response = await self._post(await self._login_link(), data=login_json, follow_redirects=False,
+                                    allowed_returns=self.LOGIN_RETURNS)
+        return self._parse_login(response, login_json)
+
+    async def get_citizen(self):
+        citizen = self.read_cache.citizens.get(self._account_key, MISSING)
+        if citizen is MISSING:
+            citizen = self._parse_citizen(await self._get(self.CITIZENS_URL))
+            self.read_cache.citizens.put(self._account_key, citizen)
+        return citizen
+
+    async def get_next_appointment(self, first_day: date) -> Type[Appointment]:
+        response = await self._get(self._next_appointment_url(await self.get_citizen()),
+                                   params=self._next_appointment_params(first_day),
+                                   allowed_returns=(200, 404))
+        return self._parse_next_appointment(response, first_day)
+
+    async def get_current_appointment(self) -> Type[Appointment]:
+        appointment = self.read_cache.current_appointments.get(self._account_key, MISSING)
+        if appointment is MISSING:
+            appointment = self._parse_current_appointment(
+                await self._get(self._appointments_url(await self.get_citizen())))
+            self.read_cache.current_appointments.put(self._account_key, appointment)
+        return appointment
+
+    async def has_next_appointment(self) -> bool:
+        return not isinstance(await self.get_current_appointment(), NoAppointment)
+
+    async def book_appointment(self, appointment: Appointment):
+        book_data = self._book_json(appointment)
+        response = await self._post(self._appointments_url(await self.get_citizen()), json=book_data,
+                                    allowed_returns=(200,) + self.BOOKING_REFUSED_RETURNS)
+        self._check_booking(response, appointment)
+        self.read_cache.current_appointments.invalidate(self._account_key)
+
+    async def get_appointments_in_range(self, first_day: date, days=1, max_concurrency=1) -> Set[Type[Appointment]]:
+        assert max_concurrency > 0, max_concurrency
+        await self.get_citizen()
+        semaphore = asyncio.Semaphore(max_concurrency)
+
+        async def next_appointment(day: date):
+            async with semaphore:
+                return await self.get_next_appointment(day)
+
+        return only_appointments(await asyncio.gather(*map(next_appointment, days_in_range(first_day, days))))
+
+    def authenticate_session(self, authentication: Authentication):
+        current = self.authentication
+        if current is not None and current is not authentication \
+                and current.account_key == authentication.account_key and authentication.is_older_than(current):
+            authentication.update_from(current)
+        self.authentication = authentication
+        self._client.headers['Authorization'] = f'Bearer {authentication.access_token}'
+
+    async def refresh_authentication(self, stale_access_token=None):
+        async with self._refresh_lock:
+            authentication = self.authentication
+            if stale_access_token is not None and stale_access_token != authentication.access_token:
+                return
+            self.debug('refreshing access token')
+            authentication.update(await self.refresh_token(authentication.refresh_token))
+            self.authenticate_session(authentication)
+
+    async def _with_refresh(self, url, request):
+        authentication = self.authentication
+        if authentication is None or not authentication.can_refresh or not url.startswith(self.VACCINATE_API_URL):
+            return await request()
+        if authentication.expires_soon:
+            await self.refresh_authentication(authentication.access_token)
+        access_token = authentication.access_token
+        try:
+            return await request()
+        except AuthenticationRefreshNeededException:
+            await self.refresh_authentication(access_token)
+            return await request()
+
+    async def _get(self, url, params=None, allowed_returns=(200,)):
+        async def request():
+            await asyncio.sleep(self.rate_limiter.reserve(url))
+            return self._check_get(await self._observed('GET', url, self._client.get(
+                url, params=params, timeout=self._httpx_timeout('GET', url))), allowed_returns)
+        return await self._with_refresh(url, request)
+
+    async def _post(self, url, allowed_returns=(200,), **kwargs):
+        async def request():
+            await asyncio.sleep(self.rate_limiter.reserve(url))
+            return self._check_post(await self._observed('POST', url, self._client.post(
+                url, timeout=self._httpx_timeout('POST', url), **kwargs)), allowed_returns)
+        return await self._with_refresh(url, request)
+
+    def _httpx_timeout(self, method, url):
+        connect, read = self._timeout(method, url)
+        return httpx.Timeout(read, connect=connect)
+
+    @staticmethod
+    async def _observed(method, url, sending):
+        started = perf_counter()
+        status = None
+        try:
+            response = await sending
+            status = response.status_code
+            return response
+        except httpx.TransportError as e:
+            raise UpstreamUnavailableException() from e
+        finally:
+            observe_upstream(method, url, perf_counter() - started, status)
+
+
+class AsyncVaccinationAppointmentService:
+    def __init__(self, connector_type: Type[AsyncImpzentrenBayernConnector]):
+        self.connector_type = connector_type
+        self.read_cache = ReadCache()
+        self._connectors: Dict[str, AsyncImpzentrenBayernConnector] = {}
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *_):
+        await self.close()
+
+    async def authentication(self, login_provider: LoginProvider):
+        connector = self._new_connector()
+        try:
+            access_token = await connector.login(login_provider.get_login_json())
+            authentication = Authentication.from_access_token(await connector.get_access_token(access_token))
+        except Exception:
+            await connector.close()
+            raise
+        connector.authenticate_session(authentication)
+        self._connectors[authentication.account_key] = connector
+        return authentication
+
+    async def current_appointment(self, authentication: Authentication):
+        return await self._connector(authentication).get_current_appointment()
+
+    async def next_appointment(self, authentication: Authentication, first_day: date) -> Type[Appointment]:
+        return await self._connector(authentication).get_next_appointment(first_day)
+
+    async def appointments_in_range(self, authentication: Authentication, first_day: date, days: int,
+                                    max_concurrency=1):
+        return await self._connector(authentication).get_appointments_in_range(first_day=first_day, days=days,
+                                                                               max_concurrency=max_concurrency)
+
+    async def book_appointment(self, authentication: Authentication, appointment: Appointment):
+        await self._connector(authentication).book_appointment(appointment)
+
+    async def has_next_appointment(self, authentication: Authentication):
+        return not isinstance(await self.current_appointment(authentication), NoAppointment)
+
+    async def close(self):
+        connectors = list(self._connectors.values())
+        self._connectors.clear()
+        await asyncio.gather(*(connector.close() for connector in connectors))
+
+    def _connector(self, authentication: Authentication) -> AsyncImpzentrenBayernConnector:
+        connector = self._connectors.get(authentication.account_key)
+        if connector is None:
+            connector = self._connectors[authentication.account_key] = self._new_connector()
+        connector.authenticate_session(authentication)
+        return connector
+
+    def _new_connector(self) -> AsyncImpzentrenBayernConnector:
+        connector = self.connector_type()
+        connector.read_cache = self.read_cache
+        return connector
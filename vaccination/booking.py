@@ -0,0 +1,169 @@
+from __future__ import annotations
+
+from contextlib import ExitStack
+from logging import getLogger
+from threading import RLock
+from time import monotonic, perf_counter
+from typing import Callable, Dict, Iterable, List, Optional
+
+from vaccination.connectors import Authentication, ImpzentrenBayernConnector, PreparedBooking, SlotTakenException
+from vaccination.entities import Appointment
+from vaccination.metrics import BOOKING_LATENCY, BOOKING_ATTEMPTS
+from vaccination.services import VaccinationAppointmentService
+
+
+class NoSlotBookedException(Exception):
+    def __init__(self, attempts: List[Appointment]):
+        self.attempts = attempts
+
+
+class BookingResult:
+    def __init__(self, appointment: Appointment, attempts: List[Appointment], seconds: float):
+        self.appointment = appointment
+        self.attempts = attempts
+        self.seconds = seconds
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.appointment}, attempts={len(self.attempts)}, ' \
+               f'seconds={self.seconds:.3f})'
+
+
+class BookingEngine:
+    def __init__(self, service: VaccinationAppointmentService, authentication: Authentication,
+                 rank: Callable[[Iterable[Appointment]], List[Appointment]] = sorted):
+        self.service = service
+        self.authentication = authentication
+        self.rank = rank
+        self._prepared: Dict[Appointment, PreparedBooking] = {}
+        self._lease: Optional[ExitStack] = None
+        self._connector: Optional[ImpzentrenBayernConnector] = None
+        self._lock = RLock()
+        self.log = getLogger(self.__class__.__name__).info
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    @property
+    def candidates(self) -> List[Appointment]:
+        with self._lock:
+            return self.rank(self._prepared)
+
+    def warm(self) -> ImpzentrenBayernConnector:
+        # holding the lease keeps the pooled session and its open connection from being evicted while idle
+        with self._lock:
+            if self._connector is None:
+                self._lease = ExitStack()
+                self._connector = self._lease.enter_context(self.service.pool.lease(self.authentication))
+            connector = self._connector
+        if self.authentication.can_refresh and self.authentication.expires_soon:
+            connector.refresh_authentication(self.authentication.access_token)
+        connector.citizen
+        return connector
+
+    def offer(self, appointments: Iterable[Appointment]):
+        connector = self.warm()
+        with self._lock:
+            for appointment in appointments:
+                if appointment not in self._prepared:
+                    self._prepared[appointment] = connector.prepare_booking(appointment)
+
+    def withdraw(self, appointments: Iterable[Appointment]):
+        with self._lock:
+            for appointment in appointments:
+                self._prepared.pop(appointment, None)
+
+    def book(self, candidates: Iterable[Appointment] = None, started: float = None) -> BookingResult:
+        started = perf_counter() if started is None else started
+        if candidates is None:
+            candidates = self.candidates
+        else:
+            candidates = self.rank(candidates)
+            self.offer(candidates)
+        return self._book(candidates, started)
+
+    def book_first(self, appointment: Appointment, started: float = None) -> BookingResult:
+        # the picked slot is tried first, every other offered slot is a ranked fallback
+        started = perf_counter() if started is None else started
+        self.offer([appointment])
+        return self._book([appointment] + [candidate for candidate in self.candidates if appointment != candidate],
+                          started)
+
+    def _book(self, candidates: List[Appointment], started: float) -> BookingResult:
+        connector = self.warm()
+        attempts = []
+        for appointment in candidates:
+            with self._lock:
+                booking = self._prepared.get(appointment) or connector.prepare_booking(appointment)
+            attempts.append(appointment)
+            try:
+                connector.book_prepared(booking)
+            except SlotTakenException:
+                BOOKING_ATTEMPTS.inc(outcome='taken')
+                self.withdraw([appointment])
+                continue
+            BOOKING_ATTEMPTS.inc(outcome='booked')
+            self.withdraw([appointment])
+            result = BookingResult(appointment, attempts, perf_counter() - started)
+            BOOKING_LATENCY.observe(result.seconds, outcome='booked')
+            self.log(f'booked [{appointment}] with attempt [{len(attempts)}] after [{result.seconds * 1e3:.0f}ms]')
+            return result
+        BOOKING_LATENCY.observe(perf_counter() - started, outcome='taken')
+        self.debug(f'all [{len(attempts)}] candidates were taken')
+        raise NoSlotBookedException(attempts)
+
+    def close(self):
+        with self._lock:
+            lease, self._lease, self._connector = self._lease, None, None
+            self._prepared.clear()
+        if lease is not None:
+            lease.close()
+
+
+class BookingEngines:
+    def __init__(self, max_idle_seconds: float = 300):
+        self.max_idle_seconds = max_idle_seconds
+        self._engines: Dict[str, BookingEngine] = {}
+        self._last_used: Dict[str, float] = {}
+        self._lock = RLock()
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    def __len__(self):
+        with self._lock:
+            return len(self._engines)
+
+    def engine(self, service: VaccinationAppointmentService, authentication: Authentication) -> BookingEngine:
+        self.evict_idle()
+        account_key = authentication.account_key
+        with self._lock:
+            engine = self._engines.get(account_key)
+            if engine is None:
+                engine = self._engines[account_key] = BookingEngine(service, authentication)
+            self._last_used[account_key] = monotonic()
+            return engine
+
+    def close(self, account_key: str):
+        with self._lock:
+            engine = self._engines.pop(account_key, None)
+            self._last_used.pop(account_key, None)
+        if engine is not None:
+            engine.close()
+
+    def evict_idle(self):
+        # an engine keeps its connector leased, one that nobody books with must give it back
+        now = monotonic()
+        with self._lock:
+            idle = [account_key for account_key, last_used in self._last_used.items()
+                    if now - last_used > self.max_idle_seconds]
+        for account_key in idle:
+            self.debug(f'closing idle booking engine of [{account_key}]')
+            self.close(account_key)
+
+    def close_all(self):
+        with self._lock:
+            account_keys = list(self._engines)
+        for account_key in account_keys:
+            self.close(account_key)
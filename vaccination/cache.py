@@ -0,0 +1,76 @@
+from __future__ import annotations
+
+from collections import OrderedDict
+from threading import RLock
+from time import monotonic
+from typing import Any, Callable, Hashable, Dict
+
+MISSING = object()
+
+
+class TTLCache:
+    def __init__(self, maxsize: int = 1024, ttl: float = 60):
+        assert maxsize > 0, maxsize
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.hits = 0
+        self.misses = 0
+        self._entries: OrderedDict[Hashable, tuple] = OrderedDict()
+        self._lock = RLock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key: Hashable):
+        return self.get(key, MISSING, count=False) is not MISSING
+
+    def get(self, key: Hashable, default=None, count=True):
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is None or entry[0] <= monotonic():
+                if entry is not None:
+                    del self._entries[key]
+                if count:
+                    self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            if count:
+                self.hits += 1
+            return entry[1]
+
+    def put(self, key: Hashable, value: Any):
+        with self._lock:
+            self._entries[key] = (monotonic() + self.ttl, value)
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def get_or_load(self, key: Hashable, loader: Callable[[], Any]):
+        value = self.get(key, MISSING)
+        if value is MISSING:
+            value = loader()
+            self.put(key, value)
+        return value
+
+    def invalidate(self, key: Hashable):
+        with self._lock:
+            self._entries.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+
+
+class ReadCache:
+    def __init__(self, maxsize: int = 1024, citizen_ttl: float = 3600, appointment_ttl: float = 30):
+        self.citizens = TTLCache(maxsize, citizen_ttl)
+        self.current_appointments = TTLCache(maxsize, appointment_ttl)
+
+    @property
+    def caches(self) -> Dict[str, TTLCache]:
+        return {'citizens': self.citizens, 'current_appointments': self.current_appointments}
+
+    def invalidate(self, account_key: Hashable):
+        self.citizens.invalidate(account_key)
+        self.current_appointments.invalidate(account_key)
@@ -1,20 +1,26 @@
 from __future__ import annotations
 
-import json
-from datetime import date, timedelta
-from functools import cached_property
+from base64 import urlsafe_b64decode
+from datetime import date, datetime
+from functools import lru_cache
+from threading import Lock
+from time import time, monotonic, perf_counter
 from logging import getLogger
-from typing import Set, Type
+from typing import Set, Type, Iterator
 from urllib.parse import parse_qs, urlparse
 
-from bs4 import BeautifulSoup
-from dateutil import rrule
 from more_itertools import one
-from pytz import timezone
-from requests import Session
 
+from vaccination.cache import ReadCache
+from vaccination.decoding import decode_json, loads
 from vaccination.entities import Appointment, NoAppointment, HashableMixin
 from vaccination.login import LoginProvider
+from vaccination.metrics import observe_upstream, upstream_endpoint
+from vaccination.parsing import login_form_action, login_feedback, LOGIN_FORM_ID
+from vaccination.ratelimit import RateLimiter
+from vaccination.resilience import Hedging, CircuitBreaker
+from vaccination.scanning import ScanStrategy, DailyScan
+from vaccination.singleflight import SingleFlight
 
 
 class InvalidCredentialsException(Exception):
@@ -26,138 +32,239 @@ class AuthenticationRefreshNeededException(Exception):
         self.response = response
 
 
+class UpstreamUnavailableException(Exception):
+    def __init__(self, response=None):
+        self.response = response
+
+    @property
+    def retry_after(self):
+        if self.response is None:
+            return None
+        try:
+            return float(self.response.headers.get('Retry-After'))
+        except (TypeError, ValueError):
+            return None
+
+
 class LoginError(Exception):
     def __init__(self, error):
         self.error = error
 
 
+class SlotTakenException(Exception):
+    def __init__(self, appointment, response):
+        self.appointment = appointment
+        self.response = response
+
+
+class BookingRefusedException(Exception):
+    def __init__(self, appointment, response):
+        self.appointment = appointment
+        self.response = response
+
+
+class PreparedBooking:
+    def __init__(self, appointment: Appointment, url: str, book_data: dict):
+        self.appointment = appointment
+        self.url = url
+        self.book_data = book_data
+
+
+@lru_cache(maxsize=4096)
+def zone_offset(date_time: datetime) -> str:
+    from pytz import timezone
+    return f'+{timezone("Europe/Berlin").utcoffset(date_time).seconds / 3600:02.0f}:00'
+
+
 class Authentication(HashableMixin):
-    def __init__(self, access_token, refresh_token=None):
+    REFRESH_MARGIN_SECONDS = 30
+
+    def __init__(self, access_token, refresh_token=None, expires_at=None):
         self.access_token = access_token
         self.refresh_token=refresh_token
+        self.expires_at = expires_at
+        self.account_key = self._account_key(access_token)
 
     @classmethod
     def from_session(cls, session_auth):
-        return cls(session_auth)
+        if isinstance(session_auth, str):
+            return cls(session_auth)
+        return cls(**session_auth)
 
     @classmethod
     def from_access_token(cls, access_token):
-        return cls(access_token['access_token'], access_token['refresh_token'])
+        return cls(access_token['access_token'], access_token['refresh_token'], cls._expires_at(access_token))
 
+    def to_session(self):
+        return {'access_token': self.access_token, 'refresh_token': self.refresh_token, 'expires_at': self.expires_at}
 
-class ImpzentrenBayernConnector:
+    def update(self, access_token):
+        self.access_token = access_token['access_token']
+        self.refresh_token = access_token.get('refresh_token', self.refresh_token)
+        self.expires_at = self._expires_at(access_token)
+        self.account_key = self._account_key(self.access_token)
+
+    def update_from(self, authentication: Authentication):
+        self.access_token = authentication.access_token
+        self.refresh_token = authentication.refresh_token
+        self.expires_at = authentication.expires_at
+        self.account_key = authentication.account_key
+
+    @property
+    def can_refresh(self) -> bool:
+        return self.refresh_token is not None
+
+    @property
+    def expires_soon(self) -> bool:
+        return self.expires_at is not None and time() >= self.expires_at - self.REFRESH_MARGIN_SECONDS
+
+    def is_older_than(self, authentication: Authentication) -> bool:
+        return (self.expires_at or 0) < (authentication.expires_at or 0)
+
+    @staticmethod
+    def _account_key(access_token):
+        # the token's subject stays the same across refreshes, the token itself does not
+        try:
+            payload = access_token.split('.')[1]
+            return loads(urlsafe_b64decode(payload + '=' * (-len(payload) % 4)))['sub']
+        except (IndexError, KeyError, TypeError, ValueError):
+            return access_token
+
+    @staticmethod
+    def _expires_at(access_token):
+        return time() + access_token['expires_in'] if 'expires_in' in access_token else None
+
+
+class ImpzentrenBayernApi:
     OPENID_CONNECT_URL = 'https://ciam.impfzentren.bayern/auth/realms/C19V-Citizen/protocol/openid-connect'
     VACCINATE_API_URL = 'https://impfzentren.bayern/api/v1'
     INVALID_CREDENTIALS_TEXT = 'Ungültiger Benutzername oder Passwort.'
+    LOGIN_PAGE_URL = f'{OPENID_CONNECT_URL}/auth?client_id=c19v-frontend&redirect_uri=https%3A%2F%2Fimpfzentren.bayern' \
+                     f'%2Fcitizen%2F&response_mode=fragment&response_type=code&scope=openid'
+    TOKEN_URL = f'{OPENID_CONNECT_URL}/token'
+    CITIZENS_URL = f'{VACCINATE_API_URL}/users/current/citizens'
+    LOGIN_RETURNS = (200, 302, 303, 400, 404)
+    # keycloak answers an expired or revoked refresh token with invalid_grant
+    REFRESH_RETURNS = (200, 400, 401)
+    # the slot is gone, any other refusal is about the booking itself and trying another slot will not help
+    BOOKING_TAKEN_RETURNS = (404, 409, 410)
+    BOOKING_REFUSED_RETURNS = tuple(status for status in range(400, 500) if status not in (401, 429))
+    # (connect, read) seconds, a booking may take the portal a while but a scan step must not stall the scan
+    TIMEOUTS = {'auth': (3.05, 10), 'login': (3.05, 15), 'token': (3.05, 10), 'citizens': (3.05, 5),
+                'appointments': (3.05, 5), 'appointments/next': (3.05, 5), 'booking': (3.05, 20)}
+    DEFAULT_TIMEOUT = (3.05, 10)
+    HEDGED_ENDPOINTS = ('citizens', 'appointments', 'appointments/next')
 
     def __init__(self):
-        self._session = Session()
+        self.authentication = None
+        self.read_cache = ReadCache()
+        self.rate_limiter = RateLimiter.shared()
+        self.timeouts = dict(self.TIMEOUTS)
         self.log = getLogger(self.__class__.__name__).info
         self.debug = getLogger(self.__class__.__name__).debug
 
-    def __enter__(self):
-        return self
+    @property
+    def _account_key(self):
+        return self.authentication.account_key if self.authentication else None
 
-    def __exit__(self, *_):
-        self._session.close()
+    def _timeout(self, method, url):
+        return self.timeouts.get(upstream_endpoint(method, url), self.DEFAULT_TIMEOUT)
 
-    @property
-    def _login_link(self):
-        response = self._get(
-            f'{self.OPENID_CONNECT_URL}/auth?client_id=c19v-frontend&redirect_uri=https%3A%2F%2Fimpfzentren.bayern%2Fcitizen%2F&response_mode=fragment&response_type=code&scope=openid')
-        soup = BeautifulSoup(response.text, features='html.parser')
-        assert 'Anmeldung bei C19V-Citizen' == soup.title.text
-        login_form = soup.find('form', {'id': 'kc-form-login'})
-        assert login_form
-        login_link = login_form.get('action')
+    def _parse_login_link(self, response):
+        login_link = login_form_action(response.text)
         self.debug(f'using login link: {login_link}')
         return login_link
 
-    def get_access_token(self, access_token):
-        response = self._post(f'{self.OPENID_CONNECT_URL}/token',
-                              data={
-                                  'code': access_token,
-                                  'grant_type': 'authorization_code',
-                                  'client_id': 'c19v-frontend',
-                                  'redirect_uri': 'https://impfzentren.bayern/citizen/'
-                              })
-        authentication = json.loads(response.text)
-        assert 'Bearer' == authentication['token_type']
-        return authentication
-
-    def refresh_token(self, refresh_token):
-        response = self._post(f'{self.OPENID_CONNECT_URL}/token',
-                              data={
-                                  'code': refresh_token,
-                                  'grant_type': 'refresh_token',
-                                  'client_id': 'c19v-frontend'
-                              })
-        authentication = json.loads(response.text)
-        assert 'Bearer' == authentication['token_type']
-        return authentication
-
-    def login(self, login_json):
-        response = self._post(self._login_link, data=login_json)
-        soup = BeautifulSoup(response.text, features='html.parser')
-        errors = soup.find_all('div', {'class': 'alert alert-error'})
-        feedback = soup.find('span', {'class': 'kc-feedback-text'})
+    def _parse_login(self, response, login_json):
+        errors, feedback = login_feedback(response.text)
         if errors:
             if feedback:
-                if self.INVALID_CREDENTIALS_TEXT == feedback.text:
+                if self.INVALID_CREDENTIALS_TEXT == feedback:
                     raise InvalidCredentialsException
             raise LoginError(errors)
+        code = self._authorization_code(response)
+        if not code:
+            raise LoginError([f'no authorization code in login response [{response.status_code}]'])
         self.debug(f'successfully logged in [{login_json["username"]}]')
-        return one(parse_qs(urlparse(response.url).fragment)['code'])
+        return one(code)
+
+    @staticmethod
+    def _authorization_code(response):
+        # keycloak redirects to the citizen frontend with the code in the fragment, no need to follow it
+        redirect = response.headers.get('Location') if response.is_redirect else None
+        return parse_qs(urlparse(redirect or str(response.url)).fragment).get('code', [])
+
+    def _is_stale_login(self, response) -> bool:
+        if self._authorization_code(response):
+            return False
+        if response.status_code in (400, 404):
+            return True
+        errors, _ = login_feedback(response.text)
+        return not errors and LOGIN_FORM_ID in response.text
+
+    @staticmethod
+    def _access_token_data(access_token):
+        return {
+            'code': access_token,
+            'grant_type': 'authorization_code',
+            'client_id': 'c19v-frontend',
+            'redirect_uri': 'https://impfzentren.bayern/citizen/'
+        }
 
-    @cached_property
-    def citizen(self):
-        response = self._get(f'{self.VACCINATE_API_URL}/users/current/citizens')
-        citizen_json = one(json.loads(response.text))
+    @staticmethod
+    def _refresh_token_data(refresh_token):
+        return {
+            'refresh_token': refresh_token,
+            'grant_type': 'refresh_token',
+            'client_id': 'c19v-frontend'
+        }
+
+    @staticmethod
+    def _parse_token(response):
+        authentication = decode_json(response)
+        assert 'Bearer' == authentication['token_type']
+        return authentication
+
+    def _parse_refreshed_token(self, response):
+        if 200 != response.status_code:
+            self.debug(f'refresh grant refused with [{response.status_code}]: {response.text}')
+            raise InvalidCredentialsException
+        return self._parse_token(response)
+
+    def _parse_citizen(self, response):
+        citizen_json = one(decode_json(response))
         self.debug(f'using citizen [{citizen_json["id"]}]')
         return citizen_json
 
-    def get_next_appointment(self, first_day: date) -> Type[Appointment]:
-        response = self._get(f'{self.VACCINATE_API_URL}/citizens/{self.citizen["id"]}/appointments/next',
-                             params={'timeOfDay': 'ALL_DAY',
-                                     'lastDate': first_day.strftime("%Y-%m-%d"),
-                                     'lastTime': '00:00'},
-                             allowed_returns=(200, 404))
-        appointment = Appointment.from_json(response.json())
+    def _appointments_url(self, citizen):
+        return f'{self.VACCINATE_API_URL}/citizens/{citizen["id"]}/appointments/'
+
+    def _next_appointment_url(self, citizen):
+        return f'{self.VACCINATE_API_URL}/citizens/{citizen["id"]}/appointments/next'
+
+    @staticmethod
+    def _next_appointment_params(first_day: date):
+        return {'timeOfDay': 'ALL_DAY',
+                'lastDate': first_day.strftime("%Y-%m-%d"),
+                'lastTime': '00:00'}
+
+    def _parse_next_appointment(self, response, first_day: date) -> Type[Appointment]:
+        appointment = Appointment.from_json(decode_json(response))
         self.debug(f'found [{appointment}] for day [{first_day}]')
         return appointment
 
-    def get_current_appointment(self) -> Type[Appointment]:
-        response = self._get(f'{self.VACCINATE_API_URL}/citizens/{self.citizen["id"]}/appointments/')
-        appointment = Appointment.from_future_json(response.json())
+    def _parse_current_appointment(self, response) -> Type[Appointment]:
+        appointment = Appointment.from_future_json(decode_json(response))
         self.debug(f'currently {appointment}')
         return appointment
 
-    def has_next_appointment(self)->bool:
-        return not isinstance(self.get_current_appointment(),NoAppointment)
-
-    def book_appointment(self, appointment: Appointment):
-        book_data = self._book_json(appointment)
-        response = self._post(
-            f'{self.VACCINATE_API_URL}/citizens/{self.citizen["id"]}/appointments/',
-            json=book_data)
-
-    def get_appointments_in_range(self, first_day: date, days=1) -> Set[Type[Appointment]]:
-        now = first_day
-        later = now + timedelta(days=days)
-        return set(filter(lambda app: app.__class__ == Appointment,
-                          map(lambda start_date: self.get_next_appointment(start_date.date()),
-                              rrule.rrule(rrule.DAILY, dtstart=now, until=later))))
-
-    def authenticate_session(self, authentication:Authentication):
-        self._session.headers.update({'Authorization': f"Bearer {authentication.access_token}"})
-
-    def _book_json(self, appointment):
-        homezone = timezone('Europe/Berlin')
+    @staticmethod
+    def _book_json(appointment):
         book_data = {
             "siteId": appointment.site,
             "vaccinationDate": appointment.date_time.date().isoformat(),
             "vaccinationTime": appointment.date_time.time().isoformat('minutes'),
-            "zoneOffset": f'+{homezone.utcoffset(appointment.date_time).seconds / 3600:02.0f}:00',
+            "zoneOffset": zone_offset(appointment.date_time),
             "reminderChannel": {
                 "reminderBySms": True,
                 "reminderByEmail": True
@@ -165,14 +272,217 @@ class ImpzentrenBayernConnector:
         }
         return book_data
 
-    def _get(self, url, params=None, allowed_returns=(200,)):
-        response = self._session.get(url, params=params)
+    @staticmethod
+    def _check_get(response, allowed_returns):
         if response.status_code not in allowed_returns:
             if 401 == response.status_code:
                 raise AuthenticationRefreshNeededException(response)
+            if 429 == response.status_code or 500 <= response.status_code:
+                raise UpstreamUnavailableException(response)
         return response
 
-    def _post(self, url, allowed_returns=(200, ), **kwargs):
-        response = self._session.post(url, **kwargs)
+    @staticmethod
+    def _check_post(response, allowed_returns):
+        if response.status_code not in allowed_returns:
+            if 401 == response.status_code:
+                raise AuthenticationRefreshNeededException(response)
+            if 429 == response.status_code or 500 <= response.status_code:
+                raise UpstreamUnavailableException(response)
         assert response.status_code in allowed_returns, response.text
         return response
+
+    def _check_booking(self, response, appointment):
+        if response.status_code in self.BOOKING_TAKEN_RETURNS:
+            self.debug(f'[{appointment}] is taken [{response.status_code}]: {response.text}')
+            raise SlotTakenException(appointment, response)
+        if 200 != response.status_code:
+            self.log(f'booking [{appointment}] refused with [{response.status_code}]: {response.text}')
+            raise BookingRefusedException(appointment, response)
+        return response
+
+
+class ImpzentrenBayernConnector(ImpzentrenBayernApi):
+    POOL_CONNECTIONS = 2
+    POOL_MAXSIZE = 16
+    LOGIN_LINK_TTL_SECONDS = 240
+
+    def __init__(self):
+        super().__init__()
+        # requests and its certificate bundle are only loaded once a connector is needed
+        from requests import Session
+        self._session = Session()
+        self._refresh_lock = Lock()
+        self._prefetched_login_link = None
+        self.single_flight = SingleFlight.shared()
+        self.hedging = Hedging.shared()
+        self.circuit_breaker = CircuitBreaker.shared()
+        self.mount_adapter(self.POOL_CONNECTIONS, self.POOL_MAXSIZE)
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def close(self):
+        self._session.close()
+
+    def mount_adapter(self, pool_connections: int, pool_maxsize: int):
+        from requests.adapters import HTTPAdapter
+        adapter = HTTPAdapter(pool_connections=pool_connections, pool_maxsize=pool_maxsize)
+        self._session.mount('https://', adapter)
+        self._session.mount('http://', adapter)
+
+    @property
+    def _login_link(self):
+        return self._parse_login_link(self._get(self.LOGIN_PAGE_URL))
+
+    def get_access_token(self, access_token):
+        return self._parse_token(self._post(self.TOKEN_URL, data=self._access_token_data(access_token)))
+
+    def refresh_token(self, refresh_token):
+        return self._parse_refreshed_token(self._post(self.TOKEN_URL, data=self._refresh_token_data(refresh_token),
+                                                      allowed_returns=self.REFRESH_RETURNS))
+
+    @property
+    def has_fresh_login_link(self) -> bool:
+        prefetched = self._prefetched_login_link
+        return prefetched is not None and monotonic() - prefetched[1] < self.LOGIN_LINK_TTL_SECONDS
+
+    def prefetch_login_link(self):
+        self._prefetched_login_link = (self._login_link, monotonic())
+
+    def login(self, login_json):
+        prefetched = self.has_fresh_login_link
+        login_link = self._prefetched_login_link[0] if prefetched else self._login_link
+        self._prefetched_login_link = None
+        response = self._post(login_link, data=login_json, allow_redirects=False, allowed_returns=self.LOGIN_RETURNS)
+        if prefetched and self._is_stale_login(response):
+            self.debug('prefetched login link is stale, fetching a new one')
+            response = self._post(self._login_link, data=login_json, allow_redirects=False,
+                                  allowed_returns=self.LOGIN_RETURNS)
+        return self._parse_login(response, login_json)
+
+    @property
+    def citizen(self):
+        return self.read_cache.citizens.get_or_load(self._account_key, self._get_citizen)
+
+    def _get_citizen(self):
+        return self._coalesced(self.CITIZENS_URL, None, lambda: self._parse_citizen(self._get(self.CITIZENS_URL)))
+
+    def get_next_appointment(self, first_day: date) -> Type[Appointment]:
+        url = self._next_appointment_url(self.citizen)
+        params = self._next_appointment_params(first_day)
+        return self._coalesced(url, params, lambda: self._parse_next_appointment(
+            self._get(url, params=params, allowed_returns=(200, 404)), first_day))
+
+    def get_current_appointment(self) -> Type[Appointment]:
+        return self.read_cache.current_appointments.get_or_load(self._account_key, self._get_current_appointment)
+
+    def _get_current_appointment(self) -> Type[Appointment]:
+        url = self._appointments_url(self.citizen)
+        return self._coalesced(url, None, lambda: self._parse_current_appointment(self._get(url)))
+
+    def _coalesced(self, url, params, load):
+        # concurrent identical reads of one account share a single upstream call and its parsed result
+        key = ('GET', url, tuple(sorted((params or {}).items())), self._account_key)
+        return self.single_flight.do(key, load)
+
+    def has_next_appointment(self)->bool:
+        return not isinstance(self.get_current_appointment(),NoAppointment)
+
+    def book_appointment(self, appointment: Appointment):
+        self.book_prepared(self.prepare_booking(appointment))
+
+    def prepare_booking(self, appointment: Appointment) -> PreparedBooking:
+        return PreparedBooking(appointment, self._appointments_url(self.citizen), self._book_json(appointment))
+
+    def book_prepared(self, booking: PreparedBooking):
+        response = self._post(booking.url, json=booking.book_data,
+                              allowed_returns=(200,) + self.BOOKING_REFUSED_RETURNS)
+        self._check_booking(response, booking.appointment)
+        self.read_cache.current_appointments.invalidate(self._account_key)
+
+    def get_appointments_in_range(self, first_day: date, days=1,
+                                  strategy: ScanStrategy = None) -> Set[Type[Appointment]]:
+        return (strategy or DailyScan()).scan(self, first_day, days)
+
+    def iter_appointments_in_range(self, first_day: date, days=1,
+                                   strategy: ScanStrategy = None) -> Iterator[Appointment]:
+        return (strategy or DailyScan()).iter_scan(self, first_day, days)
+
+    def authenticate_session(self, authentication:Authentication):
+        current = self.authentication
+        if current is not None and current is not authentication \
+                and current.account_key == authentication.account_key and authentication.is_older_than(current):
+            # this connector already refreshed the account, hand the newer tokens to the caller
+            authentication.update_from(current)
+        self.authentication = authentication
+        self._session.headers.update({'Authorization': f"Bearer {authentication.access_token}"})
+
+    def refresh_authentication(self, stale_access_token=None):
+        with self._refresh_lock:
+            authentication = self.authentication
+            if stale_access_token is not None and stale_access_token != authentication.access_token:
+                return
+            self.debug('refreshing access token')
+            authentication.update(self.refresh_token(authentication.refresh_token))
+            self.authenticate_session(authentication)
+
+    def _with_refresh(self, url, request):
+        authentication = self.authentication
+        if authentication is None or not authentication.can_refresh or not url.startswith(self.VACCINATE_API_URL):
+            return request()
+        if authentication.expires_soon:
+            self.refresh_authentication(authentication.access_token)
+        access_token = authentication.access_token
+        try:
+            return request()
+        except AuthenticationRefreshNeededException:
+            self.refresh_authentication(access_token)
+            return request()
+
+    def _get(self, url, params=None, allowed_returns=(200,)):
+        endpoint = upstream_endpoint('GET', url)
+        timeout = self._timeout('GET', url)
+
+        def send():
+            # checked per attempt, an attempt answered with 5xx must not win over one still in flight
+            return self._check_get(self._observed('GET', url, lambda: self._session.get(url, params=params,
+                                                                                        timeout=timeout)),
+                                   allowed_returns)
+
+        def request():
+            self.rate_limiter.acquire(url)
+            if endpoint in self.HEDGED_ENDPOINTS:
+                # reads are idempotent, a duplicate after the usual latency cuts off the slow tail
+                return self.hedging.call(endpoint, send, before_hedge=lambda: self.rate_limiter.acquire(url))
+            return send()
+        return self._with_refresh(url, self._guarded(url, request))
+
+    def _post(self, url, allowed_returns=(200, ), **kwargs):
+        timeout = self._timeout('POST', url)
+
+        def request():
+            self.rate_limiter.acquire(url)
+            return self._check_post(self._observed('POST', url,
+                                                   lambda: self._session.post(url, timeout=timeout, **kwargs)),
+                                    allowed_returns)
+        return self._with_refresh(url, self._guarded(url, request))
+
+    def _guarded(self, url, request):
+        return lambda: self.circuit_breaker.call(url, request, failures=(UpstreamUnavailableException,))
+
+    @staticmethod
+    def _observed(method, url, send):
+        started = perf_counter()
+        status = None
+        try:
+            response = send()
+            status = response.status_code
+            return response
+        except OSError as e:
+            # requests' timeouts and connection errors, the upstream did not answer in time
+            raise UpstreamUnavailableException() from e
+        finally:
+            observe_upstream(method, url, perf_counter() - started, status)
@@ -0,0 +1,35 @@
+from __future__ import annotations
+
+import json
+from typing import Any, Callable, Optional, Tuple, Union
+
+Body = Union[bytes, bytearray, memoryview, str]
+Backend = Tuple[str, Callable[[Body], Any]]
+
+_backend: Optional[Backend] = None
+
+
+def _load_backend() -> Backend:
+    try:
+        from orjson import loads
+    except ImportError:
+        # the standard library parses bytes too, it detects the utf encoding itself
+        return 'json', json.loads
+    return 'orjson', loads
+
+
+def backend() -> Backend:
+    # resolved on first use, importing orjson costs more than the startup of a cli run can spare
+    global _backend
+    if _backend is None:
+        _backend = _load_backend()
+    return _backend
+
+
+def loads(body: Body) -> Any:
+    return backend()[1](body)
+
+
+def decode_json(response) -> Any:
+    # straight from the body, no charset guessing and no intermediate str
+    return loads(response.content)
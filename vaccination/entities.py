@@ -1,9 +1,16 @@
 from __future__ import annotations
 
 from datetime import datetime
+from functools import total_ordering, lru_cache
 
 from more_itertools import only
 
+
+@lru_cache(maxsize=8192)
+def slot_date_time(slot_date: str, slot_time: str) -> datetime:
+    # a scan sees the same few days and times over and over, parse each pair once
+    return datetime.fromisoformat(f'{slot_date} {slot_time}')
+
 class HashableMixin:
     def __repr__(self):
         key_values = ','.join(map(lambda item: f'{item[0]}->{item[1]}', self.__dict__.items()))
@@ -18,7 +25,10 @@ class HashableMixin:
     def __hash__(self):
         return hash(tuple(map(lambda item: (item[0], item[1]), self.__dict__.items())))
 
-class Appointment(HashableMixin):
+
+@total_ordering
+class Appointment:
+    __slots__ = ('site', 'date_time', '_hash')
 
     @classmethod
     def no_appointment(cls):
@@ -29,27 +39,65 @@ class Appointment(HashableMixin):
         if 'siteId' not in _json:
             return cls.no_appointment()
         else:
-            return cls(_json['siteId'],
-                       datetime.fromisoformat(f'{_json["vaccinationDate"]} {_json["vaccinationTime"]}'))
+            return cls(_json['siteId'], slot_date_time(_json['vaccinationDate'], _json['vaccinationTime']))
 
     def __init__(self, site: str, date_time: datetime):
-        self.date_time = date_time
-        self.site = site
-
+        object.__setattr__(self, 'site', site)
+        object.__setattr__(self, 'date_time', date_time)
+        object.__setattr__(self, '_hash', hash((site, date_time)))
 
     @classmethod
     def from_future_json(cls, json_appointment):
         assert 'futureAppointments' in json_appointment
         slot_json = only(json_appointment['futureAppointments'], {}).get('slotId')
         if slot_json:
-            return cls(slot_json['siteId'],datetime.fromisoformat(f'{slot_json["date"]} {slot_json["time"]}'))
+            return cls(slot_json['siteId'], slot_date_time(slot_json['date'], slot_json['time']))
         else:
             return cls.no_appointment()
 
+    def __setattr__(self, name, value):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __delattr__(self, name):
+        raise AttributeError(f'{self.__class__.__name__} is immutable')
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if type(other) is type(self):
+            return self._hash == other._hash and self.date_time == other.date_time and self.site == other.site
+        return False
+
+    def __lt__(self, other):
+        if not isinstance(other, Appointment):
+            return NotImplemented
+        return (self.date_time, self.site) < (other.date_time, other.site)
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}(date_time->{self.date_time},site->{self.site})'
+
+    def __reduce__(self):
+        return self.__class__, (self.site, self.date_time)
+
 
 class NoAppointment(Appointment):
+    __slots__ = ()
+    _instance = None
+
+    def __new__(cls):
+        # there is only one way of having no appointment
+        if cls._instance is None:
+            instance = super().__new__(cls)
+            Appointment.__init__(instance, 'None', datetime(1970, 1, 1, 0, 0, 0))
+            cls._instance = instance
+        return cls._instance
+
     def __init__(self):
-        super().__init__('None', datetime(1970, 1, 1, 0, 0, 0))
+        pass
 
     def __repr__(self):
         return f'{self.__class__.__name__}()'
+
+    def __reduce__(self):
+        return self.__class__, ()
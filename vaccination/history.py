@@ -0,0 +1,127 @@
+from __future__ import annotations
+
+import sqlite3
+from datetime import datetime
+from logging import getLogger
+from threading import Lock
+from typing import Iterable, Iterator, List, Optional, Type
+
+from vaccination.entities import Appointment
+
+
+class SlotRecord:
+    def __init__(self, site: str, date_time: datetime, first_seen: datetime, last_seen: datetime):
+        self.site = site
+        self.date_time = date_time
+        self.first_seen = first_seen
+        self.last_seen = last_seen
+
+    @property
+    def appointment(self) -> Appointment:
+        return Appointment(self.site, self.date_time)
+
+    @property
+    def lifetime(self) -> float:
+        return (self.last_seen - self.first_seen).total_seconds()
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.site}->{self.date_time}, ' \
+               f'seen {self.first_seen}..{self.last_seen})'
+
+
+class SlotHistory:
+    BATCH_SIZE = 32
+
+    def __init__(self, path: str = ':memory:'):
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = Lock()
+        self.debug = getLogger(self.__class__.__name__).debug
+        with self._lock:
+            if ':memory:' != path:
+                # readers in other processes do not block the scans writing
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS slots '
+                                     '(site TEXT NOT NULL, date_time TEXT NOT NULL, '
+                                     'first_seen TEXT NOT NULL, last_seen TEXT NOT NULL, '
+                                     'PRIMARY KEY (site, date_time))')
+            # the primary key serves lookups by site, this one lookups by date across sites
+            self._connection.execute('CREATE INDEX IF NOT EXISTS slots_by_date_time ON slots (date_time)')
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def record(self, appointments: Iterable[Type[Appointment]], observed_at: datetime = None) -> int:
+        observed = (observed_at or datetime.now()).isoformat()
+        rows = [(appointment.site, appointment.date_time.isoformat(), observed, observed)
+                for appointment in appointments if appointment.__class__ == Appointment]
+        if not rows:
+            return 0
+        with self._lock:
+            self._connection.execute('BEGIN IMMEDIATE')
+            try:
+                self._connection.executemany('INSERT INTO slots VALUES (?, ?, ?, ?) '
+                                             'ON CONFLICT (site, date_time) DO UPDATE SET last_seen = '
+                                             'max(last_seen, excluded.last_seen)', rows)
+                self._connection.execute('COMMIT')
+            except Exception:
+                self._connection.execute('ROLLBACK')
+                raise
+        self.debug(f'recorded [{len(rows)}] slots')
+        return len(rows)
+
+    def recording(self, appointments: Iterable[Type[Appointment]], batch_size: int = BATCH_SIZE) \
+            -> Iterator[Type[Appointment]]:
+        batch = []
+        try:
+            for appointment in appointments:
+                batch.append(appointment)
+                if len(batch) >= batch_size:
+                    self.record(batch)
+                    batch = []
+                yield appointment
+        finally:
+            # whatever was found before the scan ended or failed is still worth keeping
+            self.record(batch)
+
+    def slots(self, site: str = None, start: datetime = None, end: datetime = None,
+              seen_since: datetime = None) -> List[SlotRecord]:
+        where, parameters = self._where(site, start, end, seen_since)
+        with self._lock:
+            rows = self._connection.execute(f'SELECT site, date_time, first_seen, last_seen FROM slots{where} '
+                                            'ORDER BY date_time, site', parameters).fetchall()
+        return [SlotRecord(site, datetime.fromisoformat(date_time), datetime.fromisoformat(first_seen),
+                           datetime.fromisoformat(last_seen)) for site, date_time, first_seen, last_seen in rows]
+
+    def mean_lifetime(self, site: str = None, start: datetime = None, end: datetime = None) -> Optional[float]:
+        where, parameters = self._where(site, start, end)
+        with self._lock:
+            mean_days, = self._connection.execute('SELECT avg(julianday(last_seen) - julianday(first_seen)) '
+                                                  f'FROM slots{where}', parameters).fetchone()
+        return None if mean_days is None else mean_days * 86400
+
+    def sites(self) -> List[str]:
+        with self._lock:
+            return [site for site, in self._connection.execute('SELECT DISTINCT site FROM slots ORDER BY site')]
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT count(*) FROM slots').fetchone()[0]
+
+    @staticmethod
+    def _where(site: str = None, start: datetime = None, end: datetime = None, seen_since: datetime = None):
+        conditions, parameters = [], []
+        if site is not None:
+            conditions.append('site = ?')
+            parameters.append(site)
+        if start is not None:
+            conditions.append('date_time >= ?')
+            parameters.append(start.isoformat())
+        if end is not None:
+            conditions.append('date_time < ?')
+            parameters.append(end.isoformat())
+        if seen_since is not None:
+            conditions.append('last_seen >= ?')
+            parameters.append(seen_since.isoformat())
+        return (' WHERE ' + ' AND '.join(conditions) if conditions else ''), parameters
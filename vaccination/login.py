@@ -30,4 +30,26 @@ class UsernamePasswordLoginProvider(LoginProvider):
 
     def provide(self, username, password):
         self.password = password
-        self.username = username
\ No newline at end of file
+        self.username = username
+
+
+class StaticLoginProvider(LoginProvider):
+    def __init__(self, login_json):
+        self.login_json = login_json
+
+    def get_login_json(self):
+        return self.login_json
+
+
+class AccountsFileLoginProvider:
+    def __init__(self, accounts_json):
+        self.accounts_json = accounts_json
+
+    def login_providers(self):
+        with open(self.accounts_json, 'r') as accounts:
+            content = accounts.read().strip()
+        if content.startswith('['):
+            logins = json.loads(content)
+        else:
+            logins = [json.loads(line) for line in content.splitlines() if line.strip()]
+        return [StaticLoginProvider(login_json) for login_json in logins]
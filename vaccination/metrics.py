@@ -0,0 +1,234 @@
+from __future__ import annotations
+
+from bisect import bisect_left
+from threading import Lock
+from typing import Tuple, Dict, List, Callable, Iterable, Optional
+from urllib.parse import urlparse
+
+Sample = Tuple[Dict[str, str], float]
+Collector = Callable[[], Iterable['Family']]
+
+DEFAULT_BUCKETS = (.005, .01, .025, .05, .1, .25, .5, 1, 2.5, 5, 10)
+
+
+def endpoint_name(url: str) -> str:
+    path = urlparse(url).path
+    if path.endswith('/openid-connect/auth'):
+        return 'auth'
+    if path.endswith('/openid-connect/token'):
+        return 'token'
+    if '/login-actions/' in path:
+        return 'login'
+    if path.endswith('/users/current/citizens'):
+        return 'citizens'
+    if path.endswith('/appointments/next'):
+        return 'appointments/next'
+    if path.endswith('/appointments/'):
+        return 'appointments'
+    return 'other'
+
+
+def upstream_endpoint(method: str, url: str) -> str:
+    endpoint = endpoint_name(url)
+    if 'POST' == method and 'appointments' == endpoint:
+        return 'booking'
+    return endpoint
+
+
+def _format_labels(labels: Dict[str, str]) -> str:
+    if not labels:
+        return ''
+    return '{' + ','.join(f'{key}="{_escape(value)}"' for key, value in labels.items()) + '}'
+
+
+def _escape(value) -> str:
+    return str(value).replace('\\', '\\\\').replace('\n', '\\n').replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Family:
+    def __init__(self, name: str, kind: str, documentation: str, samples: List[Tuple[str, Dict[str, str], float]]):
+        self.name = name
+        self.kind = kind
+        self.documentation = documentation
+        self.samples = samples
+
+    def render(self) -> List[str]:
+        lines = [f'# HELP {self.name} {self.documentation}', f'# TYPE {self.name} {self.kind}']
+        lines.extend(f'{name}{_format_labels(labels)} {_format_value(value)}' for name, labels, value in self.samples)
+        return lines
+
+
+class Counter:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = Lock()
+
+    def inc(self, amount: float = 1, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def value(self, **labels) -> float:
+        return self._values.get(tuple(str(labels[label]) for label in self.labels), 0)
+
+    def collect(self) -> Family:
+        with self._lock:
+            values = dict(self._values)
+        return Family(self.name, 'counter', self.documentation,
+                      [(self.name, dict(zip(self.labels, key)), value) for key, value in sorted(values.items())])
+
+
+class Histogram:
+    def __init__(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        self.name = name
+        self.documentation = documentation
+        self.labels = labels
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}
+        self._lock = Lock()
+
+    def observe(self, value: float, **labels):
+        key = tuple(str(labels[label]) for label in self.labels)
+        index = bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                # per bucket counts, then sum and count
+                series = self._series[key] = [0] * len(self.buckets) + [0., 0]
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def count(self, **labels) -> int:
+        series = self._series.get(tuple(str(labels[label]) for label in self.labels))
+        return series[-1] if series else 0
+
+    def collect(self) -> Family:
+        with self._lock:
+            all_series = {key: list(series) for key, series in self._series.items()}
+        samples = []
+        for key, series in sorted(all_series.items()):
+            labels = dict(zip(self.labels, key))
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, series):
+                cumulative += bucket_count
+                samples.append((f'{self.name}_bucket', {**labels, 'le': _format_value(float(bound))}, cumulative))
+            samples.append((f'{self.name}_bucket', {**labels, 'le': '+Inf'}, series[-1]))
+            samples.append((f'{self.name}_sum', labels, series[-2]))
+            samples.append((f'{self.name}_count', labels, series[-1]))
+        return Family(self.name, 'histogram', self.documentation, samples)
+
+
+class Registry:
+    def __init__(self):
+        self._metrics: Dict[str, object] = {}
+        self._lock = Lock()
+
+    def counter(self, name: str, documentation: str, labels: Tuple[str, ...] = ()) -> Counter:
+        return self._register(name, lambda: Counter(name, documentation, labels))
+
+    def histogram(self, name: str, documentation: str, labels: Tuple[str, ...] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, documentation, labels, buckets))
+
+    def render(self, collectors: Iterable[Collector] = ()) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        families = [metric.collect() for metric in metrics]
+        for collector in collectors:
+            families.extend(collector())
+        return '\n'.join(line for family in families for line in family.render()) + '\n'
+
+    def _register(self, name, factory):
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = factory()
+            return metric
+
+
+def gauge(name: str, documentation: str, samples: Iterable[Sample]) -> Family:
+    return Family(name, 'gauge', documentation, [(name, labels, value) for labels, value in samples])
+
+
+def counter(name: str, documentation: str, samples: Iterable[Sample]) -> Family:
+    return Family(name, 'counter', documentation, [(name, labels, value) for labels, value in samples])
+
+
+REGISTRY = Registry()
+UPSTREAM_LATENCY = REGISTRY.histogram('vaccination_upstream_request_seconds',
+                                      'Latency of requests to the vaccination portal', ('endpoint', 'method'))
+UPSTREAM_RESPONSES = REGISTRY.counter('vaccination_upstream_responses_total',
+                                      'Responses from the vaccination portal by status code',
+                                      ('endpoint', 'method', 'status'))
+BOOKING_LATENCY = REGISTRY.histogram('vaccination_booking_seconds',
+                                     'Time from asking for a booking until the portal confirmed or refused it',
+                                     ('outcome',))
+BOOKING_ATTEMPTS = REGISTRY.counter('vaccination_booking_attempts_total', 'Slots tried while booking',
+                                    ('outcome',))
+
+
+def observe_upstream(method: str, url: str, seconds: float, status: Optional[int]):
+    endpoint = upstream_endpoint(method, url)
+    UPSTREAM_LATENCY.observe(seconds, endpoint=endpoint, method=method)
+    UPSTREAM_RESPONSES.inc(endpoint=endpoint, method=method, status=status if status is not None else 'error')
+
+
+def cache_families(caches: Dict[str, object]) -> List[Family]:
+    hits = [({'cache': name}, cache.hits) for name, cache in caches.items()]
+    misses = [({'cache': name}, cache.misses) for name, cache in caches.items()]
+    ratios = [({'cache': name}, cache.hits / (cache.hits + cache.misses) if cache.hits + cache.misses else 0.)
+              for name, cache in caches.items()]
+    return [counter('vaccination_cache_hits_total', 'Read cache hits', hits),
+            counter('vaccination_cache_misses_total', 'Read cache misses', misses),
+            gauge('vaccination_cache_hit_ratio', 'Share of read cache lookups answered from the cache', ratios),
+            gauge('vaccination_cache_entries', 'Entries held in the read cache',
+                  [({'cache': name}, len(cache)) for name, cache in caches.items()])]
+
+
+def rate_limiter_families(stats: Dict[str, Dict[str, float]]) -> List[Family]:
+    def samples(key):
+        return [({'host': host}, host_stats[key]) for host, host_stats in sorted(stats.items())]
+    return [counter('vaccination_rate_limit_requests_total', 'Requests passed through the rate limiter',
+                    samples('requests')),
+            counter('vaccination_rate_limit_queued_total', 'Requests that had to wait for a token', samples('queued')),
+            counter('vaccination_rate_limit_wait_seconds_total', 'Time spent waiting for tokens',
+                    samples('wait_seconds')),
+            gauge('vaccination_rate_limit_max_wait_seconds', 'Longest wait for a token', samples('max_wait_seconds')),
+            gauge('vaccination_rate_limit_available_tokens', 'Tokens currently available', samples('available'))]
+
+
+def single_flight_families(single_flight) -> List[Family]:
+    waiters: Dict[tuple, int] = {}
+    for key, count in single_flight.waiters().items():
+        group = single_flight.group(key)
+        waiters[group] = waiters.get(group, 0) + count
+    return [gauge('vaccination_upstream_coalesced_waiters', 'Callers waiting for an identical request in flight',
+                  [({'method': method, 'endpoint': endpoint}, count)
+                   for (method, endpoint), count in sorted(waiters.items())]),
+            counter('vaccination_upstream_coalesced_total', 'Reads answered by an identical request already in flight',
+                    [({'method': method, 'endpoint': endpoint}, count)
+                     for (method, endpoint), count in sorted(single_flight.shared_calls.items())])]
+
+
+def resilience_families(hedging, circuit_breaker) -> List[Family]:
+    states = circuit_breaker.states()
+    return [counter('vaccination_upstream_hedged_total', 'Duplicate reads sent after the usual latency passed',
+                    [({'endpoint': endpoint}, count) for endpoint, count in sorted(hedging.hedged.items())]),
+            counter('vaccination_upstream_hedges_won_total', 'Duplicate reads that answered before the original',
+                    [({'endpoint': endpoint}, count) for endpoint, count in sorted(hedging.hedges_won.items())]),
+            gauge('vaccination_upstream_circuit_open', 'Whether calls to the host currently fail fast',
+                  [({'host': host}, float('closed' != state['state'])) for host, state in sorted(states.items())]),
+            counter('vaccination_upstream_circuit_rejected_total', 'Calls failed fast by an open circuit',
+                    [({'host': host}, state['rejected']) for host, state in sorted(states.items())])]
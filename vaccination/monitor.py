@@ -0,0 +1,90 @@
+from __future__ import annotations
+
+from concurrent.futures import ThreadPoolExecutor
+from datetime import date
+from logging import getLogger
+from typing import List, Set, Type, Callable, Tuple, Optional
+
+from vaccination.connectors import Authentication
+from vaccination.entities import Appointment, NoAppointment
+from vaccination.login import LoginProvider
+from vaccination.scanning import ScanStrategy, DailyScan
+from vaccination.services import VaccinationAppointmentService
+
+
+class AccountReport:
+    def __init__(self, username: str, authentication: Authentication = None,
+                 current_appointment: Type[Appointment] = None, error: Exception = None):
+        self.username = username
+        self.authentication = authentication
+        self.current_appointment = current_appointment
+        self.error = error
+
+    @property
+    def needs_appointment(self) -> bool:
+        return self.authentication is not None and isinstance(self.current_appointment, NoAppointment)
+
+    @property
+    def status(self) -> str:
+        if self.error is not None:
+            return f'error: {self.error.__class__.__name__}'
+        if self.needs_appointment:
+            return 'looking'
+        return f'booked {self.current_appointment.site} at {self.current_appointment.date_time}'
+
+
+class BatchMonitor:
+    def __init__(self, service: VaccinationAppointmentService, max_workers: int = 8):
+        assert max_workers > 0, max_workers
+        self.service = service
+        self.max_workers = max_workers
+        self.log = getLogger(self.__class__.__name__).info
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    def check(self, login_providers: List[LoginProvider], first_day: date, days: int,
+              strategy_factory: Callable[[], ScanStrategy] = DailyScan) -> Tuple[List[AccountReport], Optional[Set]]:
+        with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix=self.__class__.__name__) as executor:
+            reports = list(executor.map(self._check_account, login_providers))
+        seekers = [report for report in reports if report.needs_appointment]
+        self.log(f'checked [{len(reports)}] accounts, [{len(seekers)}] looking for an appointment')
+        if not seekers:
+            return reports, set()
+        return reports, self._scan(seekers, first_day, days, strategy_factory)
+
+    def _check_account(self, login_provider: LoginProvider) -> AccountReport:
+        report = AccountReport(login_provider.get_login_json().get('username'))
+        try:
+            report.authentication = self.service.authentication(login_provider)
+            report.current_appointment = self.service.current_appointment(report.authentication)
+        except Exception as e:
+            self.debug(f'failed to check [{report.username}]: {e!r}')
+            report.error = e
+        return report
+
+    def _scan(self, seekers: List[AccountReport], first_day: date, days: int,
+              strategy_factory: Callable[[], ScanStrategy]) -> Optional[Set[Type[Appointment]]]:
+        # free slots are the same for every account, so one account scans on behalf of all
+        for report in seekers:
+            try:
+                return self.service.appointments_in_range(report.authentication, first_day, days,
+                                                          strategy=strategy_factory())
+            except Exception as e:
+                self.debug(f'scan as [{report.username}] failed: {e!r}')
+                report.error = e
+        # every account's error is in its report, the summary still gets printed
+        self.log(f'scan failed for all [{len(seekers)}] accounts looking for an appointment')
+        return None
+
+
+def summary_table(reports: List[AccountReport], appointments: Optional[Set[Type[Appointment]]]) -> str:
+    rows = [('account', 'status')] + [(report.username or '-', report.status) for report in reports]
+    width = max(len(account) for account, _ in rows)
+    lines = [f'{account:<{width}}  {status}' for account, status in rows]
+    lines.insert(1, f'{"-" * width}  {"-" * 6}')
+    lines.append('')
+    if appointments is None:
+        lines.append('scan failed, no free slots known')
+        return '\n'.join(lines)
+    lines.append(f'[{len(appointments)}] free slots')
+    lines.extend(f'{appointment.date_time}  {appointment.site}' for appointment in sorted(appointments))
+    return '\n'.join(lines)
@@ -0,0 +1,115 @@
+from __future__ import annotations
+
+import re
+from html import escape, unescape
+from typing import Optional, List, Tuple
+
+LOGIN_PAGE_TITLE = 'Anmeldung bei C19V-Citizen'
+LOGIN_FORM_ID = 'kc-form-login'
+ERROR_CLASS = 'alert alert-error'
+FEEDBACK_CLASS = 'kc-feedback-text'
+
+_TITLE = re.compile(r'<title\b[^>]*>([^<]*)', re.IGNORECASE)
+_FORM = re.compile(r'<form\b([^>]*)>', re.IGNORECASE)
+_DIV = re.compile(r'<div\b([^>]*)>', re.IGNORECASE)
+_SPAN = re.compile(r'<span\b([^>]*)>([^<]*)', re.IGNORECASE)
+_TAG = re.compile(r'<(/?)([a-zA-Z][^\s/>]*)([^>]*)>')
+# markup soup would render differently from the source (void elements, comments, raw text), left to the fallback
+_UNHANDLED = re.compile(r'<!|/>|<(?:area|base|br|col|embed|hr|img|input|link|meta|param|source|track|wbr|script|style)\b',
+                        re.IGNORECASE)
+_ATTRIBUTE = re.compile(r'([^\s=/>]+)\s*=\s*(?:"([^"]*)"|\'([^\']*)\'|([^\s>]+))')
+
+
+def _attributes(tag: str) -> dict:
+    return {match.group(1).lower(): unescape(match.group(2) or match.group(3) or match.group(4) or '')
+            for match in _ATTRIBUTE.finditer(tag)}
+
+
+def login_form_action(html: str) -> str:
+    action = _fast_login_form_action(html)
+    if action is None:
+        action = _soup_login_form_action(html)
+    return action
+
+
+def login_feedback(html: str) -> Tuple[List[str], Optional[str]]:
+    if 'alert-error' not in html:
+        return [], None
+    feedback = _fast_login_feedback(html)
+    if feedback is None:
+        feedback = _soup_login_feedback(html)
+    return feedback
+
+
+def _fast_login_form_action(html: str) -> Optional[str]:
+    title = _TITLE.search(html)
+    if title is None or LOGIN_PAGE_TITLE != unescape(title.group(1)):
+        return None
+    for form in _FORM.finditer(html):
+        attributes = _attributes(form.group(1))
+        if LOGIN_FORM_ID == attributes.get('id') and 'action' in attributes:
+            return attributes['action']
+    return None
+
+
+def _soup(html: str):
+    # importing bs4 takes longer than parsing a login page, only the fallback pays for it
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(html, features='html.parser')
+
+
+def _soup_login_form_action(html: str) -> str:
+    soup = _soup(html)
+    assert LOGIN_PAGE_TITLE == soup.title.text
+    login_form = soup.find('form', {'id': LOGIN_FORM_ID})
+    assert login_form
+    return login_form.get('action')
+
+
+def _fast_login_feedback(html: str) -> Optional[Tuple[List[str], Optional[str]]]:
+    errors = [_element_markup(html, div.start()) for div in _DIV.finditer(html)
+              if ERROR_CLASS == _attributes(div.group(1)).get('class')]
+    if not errors or None in errors:
+        return None
+    feedback = next((unescape(span.group(2)) for span in _SPAN.finditer(html)
+                     if FEEDBACK_CLASS == _attributes(span.group(1)).get('class')), None)
+    return errors, feedback
+
+
+def _element_markup(html: str, start: int) -> Optional[str]:
+    # the element as soup would render it, through its closing tag
+    markup, open_tags, end = [], [], start
+    for tag in _TAG.finditer(html, start):
+        markup.append(escape(unescape(html[end:tag.start()]), quote=False))
+        end = tag.end()
+        closing, name, attributes = tag.group(1), tag.group(2).lower(), tag.group(3)
+        if closing:
+            if not open_tags or name != open_tags.pop():
+                return None
+            markup.append(f'</{name}>')
+            if not open_tags:
+                break
+        else:
+            if _ATTRIBUTE.sub('', attributes).strip():
+                return None
+            open_tags.append(name)
+            markup.append(f'<{name}{"".join(_attribute(*item) for item in _attributes(attributes).items())}>')
+    if open_tags or _UNHANDLED.search(html, start, end):
+        return None
+    return ''.join(markup)
+
+
+def _attribute(name: str, value: str) -> str:
+    value = escape(value, quote=False)
+    if '"' not in value:
+        return f' {name}="{value}"'
+    if "'" not in value:
+        return f" {name}='{value}'"
+    return f' {name}="{value.replace(chr(34), "&quot;")}"'
+
+
+def _soup_login_feedback(html: str) -> Tuple[List[str], Optional[str]]:
+    soup = _soup(html)
+    errors = soup.find_all('div', {'class': ERROR_CLASS})
+    feedback = soup.find('span', {'class': FEEDBACK_CLASS})
+    return [str(error) for error in errors], feedback.text if feedback else None
@@ -0,0 +1,142 @@
+from __future__ import annotations
+
+from contextlib import contextmanager
+from logging import getLogger
+from threading import RLock, Thread
+from time import monotonic
+from typing import Type, Dict, Iterator, Optional
+
+from vaccination.cache import ReadCache
+from vaccination.connectors import ImpzentrenBayernConnector, Authentication
+
+
+class PooledConnector:
+    def __init__(self, connector: ImpzentrenBayernConnector):
+        self.connector = connector
+        self.leases = 0
+        self.last_used = monotonic()
+
+    def is_idle(self, now: float, max_idle_seconds: float) -> bool:
+        return not self.leases and now - self.last_used > max_idle_seconds
+
+
+class ConnectorPool:
+    def __init__(self, connector_type: Type[ImpzentrenBayernConnector], max_idle_seconds: float = 300,
+                 pool_connections: int = ImpzentrenBayernConnector.POOL_CONNECTIONS,
+                 pool_maxsize: int = ImpzentrenBayernConnector.POOL_MAXSIZE, read_cache: ReadCache = None,
+                 prefetch_logins: bool = False):
+        self.connector_type = connector_type
+        self.prefetch_logins = prefetch_logins
+        self.read_cache = read_cache or ReadCache()
+        self.max_idle_seconds = max_idle_seconds
+        self.pool_connections = pool_connections
+        self.pool_maxsize = pool_maxsize
+        self._connectors: Dict[str, PooledConnector] = {}
+        self._login_spare: Optional[ImpzentrenBayernConnector] = None
+        self._prefetching = False
+        self._lock = RLock()
+        self.log = getLogger(self.__class__.__name__).info
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *_):
+        self.close()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._connectors)
+
+    def connector(self) -> ImpzentrenBayernConnector:
+        connector = self.connector_type()
+        connector.mount_adapter(self.pool_connections, self.pool_maxsize)
+        connector.read_cache = self.read_cache
+        return connector
+
+    def login_connector(self) -> ImpzentrenBayernConnector:
+        with self._lock:
+            spare, self._login_spare = self._login_spare, None
+        if spare is None or not spare.has_fresh_login_link:
+            if spare is not None:
+                spare.close()
+            spare = self.connector()
+        self.prefetch_login()
+        return spare
+
+    def prefetch_login(self):
+        # a spare connector that already holds the login form saves the first round trip of the next login
+        if not self.prefetch_logins:
+            return
+        with self._lock:
+            if self._prefetching or (self._login_spare is not None and self._login_spare.has_fresh_login_link):
+                return
+            self._prefetching = True
+        Thread(target=self._prefetch_login, name=f'{self.__class__.__name__}-prefetch', daemon=True).start()
+
+    def _prefetch_login(self):
+        connector = self.connector()
+        try:
+            connector.prefetch_login_link()
+        except Exception as e:
+            self.debug(f'prefetching login link failed: {e!r}')
+            connector.close()
+            connector = None
+        with self._lock:
+            self._prefetching = False
+            replaced, self._login_spare = self._login_spare, connector or self._login_spare
+        if replaced is not None and connector is not None:
+            replaced.close()
+
+    @contextmanager
+    def lease(self, authentication: Authentication) -> Iterator[ImpzentrenBayernConnector]:
+        pooled = self._checkout(authentication)
+        try:
+            yield pooled.connector
+        finally:
+            with self._lock:
+                pooled.leases -= 1
+                pooled.last_used = monotonic()
+
+    def adopt(self, authentication: Authentication, connector: ImpzentrenBayernConnector):
+        connector.authenticate_session(authentication)
+        with self._lock:
+            replaced = self._connectors.get(authentication.account_key)
+            self._connectors[authentication.account_key] = PooledConnector(connector)
+        if replaced and replaced.connector is not connector:
+            replaced.connector.close()
+
+    def evict_idle(self):
+        now = monotonic()
+        with self._lock:
+            idle = {key: pooled for key, pooled in self._connectors.items()
+                    if pooled.is_idle(now, self.max_idle_seconds)}
+            for key in idle:
+                del self._connectors[key]
+        for pooled in idle.values():
+            pooled.connector.close()
+        if idle:
+            self.debug(f'evicted [{len(idle)}] idle connectors')
+
+    def close(self):
+        with self._lock:
+            connectors = [pooled.connector for pooled in self._connectors.values()]
+            self._connectors.clear()
+            if self._login_spare is not None:
+                connectors.append(self._login_spare)
+                self._login_spare = None
+        for connector in connectors:
+            connector.close()
+        self.debug(f'closed [{len(connectors)}] connectors')
+
+    def _checkout(self, authentication: Authentication) -> PooledConnector:
+        self.evict_idle()
+        with self._lock:
+            pooled = self._connectors.get(authentication.account_key)
+            if pooled is None:
+                pooled = PooledConnector(self.connector())
+                self._connectors[authentication.account_key] = pooled
+            pooled.connector.authenticate_session(authentication)
+            pooled.leases += 1
+            pooled.last_used = monotonic()
+            return pooled
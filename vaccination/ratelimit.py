@@ -0,0 +1,168 @@
+from __future__ import annotations
+
+import os
+import sqlite3
+from contextlib import closing
+from logging import getLogger
+from threading import Lock
+from time import monotonic, sleep, time
+from typing import Dict, Tuple, Optional
+from urllib.parse import urlparse
+
+
+class TokenBucket:
+    def __init__(self, rate: float, capacity: float):
+        assert rate > 0 and capacity >= 1, (rate, capacity)
+        self.rate = rate
+        self.capacity = capacity
+        self._tokens = capacity
+        self._updated_at = monotonic()
+        self._lock = Lock()
+
+    @property
+    def available(self) -> float:
+        with self._lock:
+            return self._refill(monotonic())
+
+    def reserve(self, tokens: float = 1) -> float:
+        # tokens may go negative: the deficit is the queue in front of the caller
+        with self._lock:
+            available = self._refill(monotonic()) - tokens
+            self._tokens = available
+            return max(0., -available / self.rate)
+
+    def _refill(self, now: float) -> float:
+        self._tokens = min(self.capacity, self._tokens + (now - self._updated_at) * self.rate)
+        self._updated_at = now
+        return self._tokens
+
+
+class SqliteTokenBucket(TokenBucket):
+    def __init__(self, path: str, name: str, rate: float, capacity: float):
+        super().__init__(rate, capacity)
+        self.path = path
+        self.name = name
+        with closing(self._connect()) as connection:
+            connection.execute('CREATE TABLE IF NOT EXISTS token_buckets '
+                               '(name TEXT PRIMARY KEY, tokens REAL NOT NULL, updated_at REAL NOT NULL)')
+            connection.execute('INSERT OR IGNORE INTO token_buckets VALUES (?, ?, ?)', (name, capacity, time()))
+
+    @property
+    def available(self) -> float:
+        return self._transact(0)
+
+    def reserve(self, tokens: float = 1) -> float:
+        return max(0., -self._transact(tokens) / self.rate)
+
+    def _transact(self, tokens: float) -> float:
+        with self._lock, closing(self._connect()) as connection:
+            connection.execute('BEGIN IMMEDIATE')
+            try:
+                stored, updated_at = connection.execute(
+                    'SELECT tokens, updated_at FROM token_buckets WHERE name = ?', (self.name,)).fetchone()
+                now = time()
+                available = min(self.capacity, stored + max(0., now - updated_at) * self.rate) - tokens
+                connection.execute('UPDATE token_buckets SET tokens = ?, updated_at = ? WHERE name = ?',
+                                   (available, now, self.name))
+                connection.execute('COMMIT')
+            except Exception:
+                connection.execute('ROLLBACK')
+                raise
+            return available
+
+    def _connect(self):
+        return sqlite3.connect(self.path, timeout=30, isolation_level=None)
+
+
+class HostBudget:
+    def __init__(self, bucket: TokenBucket):
+        self.bucket = bucket
+        self.requests = 0
+        self.queued = 0
+        self.wait_seconds = 0.
+        self.max_wait_seconds = 0.
+        self._lock = Lock()
+
+    def record(self, wait: float):
+        with self._lock:
+            self.requests += 1
+            if wait > 0:
+                self.queued += 1
+                self.wait_seconds += wait
+                self.max_wait_seconds = max(self.max_wait_seconds, wait)
+
+
+class RateLimiter:
+    DEFAULT_RATE = 10
+    DEFAULT_CAPACITY = 20
+    _shared: Optional[RateLimiter] = None
+    _shared_lock = Lock()
+
+    def __init__(self, rate: float = DEFAULT_RATE, capacity: float = DEFAULT_CAPACITY,
+                 budgets: Dict[str, Tuple[float, float]] = None, path: str = None):
+        self.rate = rate
+        self.capacity = capacity
+        self.budgets = budgets or {}
+        self.path = path
+        self._hosts: Dict[str, HostBudget] = {}
+        self._lock = Lock()
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    @classmethod
+    def shared(cls) -> RateLimiter:
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_env()
+            return cls._shared
+
+    @classmethod
+    def use_shared(cls, rate_limiter: RateLimiter):
+        with cls._shared_lock:
+            cls._shared = rate_limiter
+
+    @classmethod
+    def from_env(cls) -> RateLimiter:
+        budgets = {}
+        # e.g. RATE_LIMIT_BUDGETS="impfzentren.bayern=5/10,ciam.impfzentren.bayern=2/4"
+        for budget in filter(None, os.getenv('RATE_LIMIT_BUDGETS', '').split(',')):
+            host, limits = budget.split('=')
+            rate, capacity = limits.split('/')
+            budgets[host.strip()] = (float(rate), float(capacity))
+        return cls(rate=float(os.getenv('RATE_LIMIT_PER_SECOND', cls.DEFAULT_RATE)),
+                   capacity=float(os.getenv('RATE_LIMIT_BURST', cls.DEFAULT_CAPACITY)),
+                   budgets=budgets, path=os.getenv('RATE_LIMIT_DB'))
+
+    def reserve(self, url: str) -> float:
+        budget = self._budget(urlparse(url).hostname or '')
+        wait = budget.bucket.reserve()
+        budget.record(wait)
+        if wait > 0:
+            self.debug(f'queueing request to [{url}] for [{wait:.3f}s]')
+        return wait
+
+    def acquire(self, url: str) -> float:
+        wait = self.reserve(url)
+        if wait > 0:
+            sleep(wait)
+        return wait
+
+    def stats(self) -> Dict[str, Dict[str, float]]:
+        with self._lock:
+            hosts = dict(self._hosts)
+        return {host: {'requests': budget.requests,
+                       'queued': budget.queued,
+                       'wait_seconds': budget.wait_seconds,
+                       'max_wait_seconds': budget.max_wait_seconds,
+                       'available': budget.bucket.available,
+                       'capacity': budget.bucket.capacity}
+                for host, budget in hosts.items()}
+
+    def _budget(self, host: str) -> HostBudget:
+        with self._lock:
+            budget = self._hosts.get(host)
+            if budget is None:
+                rate, capacity = self.budgets.get(host, (self.rate, self.capacity))
+                bucket = SqliteTokenBucket(self.path, host, rate, capacity) if self.path \
+                    else TokenBucket(rate, capacity)
+                budget = self._hosts[host] = HostBudget(bucket)
+            return budget
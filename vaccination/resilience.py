@@ -0,0 +1,267 @@
+from __future__ import annotations
+
+import os
+from collections import Counter, deque
+from concurrent.futures import Future, ThreadPoolExecutor, FIRST_COMPLETED, wait
+from logging import getLogger
+from threading import Event, Lock, Semaphore, Thread
+from time import monotonic, perf_counter
+from typing import Callable, Deque, Dict, Optional, Tuple, Type, TypeVar
+from urllib.parse import urlparse
+
+T = TypeVar('T')
+
+
+class CircuitOpenException(Exception):
+    def __init__(self, host: str, retry_after: float):
+        self.host = host
+        self.retry_after = retry_after
+
+
+class LatencyWindow:
+    def __init__(self, size: int = 256):
+        self._latencies: Deque[float] = deque(maxlen=size)
+        self._lock = Lock()
+
+    def __len__(self):
+        with self._lock:
+            return len(self._latencies)
+
+    def add(self, seconds: float):
+        with self._lock:
+            self._latencies.append(seconds)
+
+    def quantile(self, quantile: float) -> Optional[float]:
+        with self._lock:
+            latencies = sorted(self._latencies)
+        if not latencies:
+            return None
+        return latencies[min(len(latencies) - 1, int(quantile * len(latencies)))]
+
+
+class Hedging:
+    DEFAULT_QUANTILE = .95
+    _shared: Optional[Hedging] = None
+    _shared_lock = Lock()
+
+    def __init__(self, quantile: float = DEFAULT_QUANTILE, min_delay: float = .05, max_delay: float = 2,
+                 min_samples: int = 20, max_workers: int = 32):
+        assert 0 < quantile < 1, quantile
+        self.quantile = quantile
+        self.min_delay = min_delay
+        self.max_delay = max_delay
+        self.min_samples = min_samples
+        self.max_workers = max_workers
+        self.hedged = Counter()
+        self.hedges_won = Counter()
+        self._windows: Dict[str, LatencyWindow] = {}
+        self._executor: Optional[ThreadPoolExecutor] = None
+        self._workers = Semaphore(max_workers)
+        self._lock = Lock()
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    @classmethod
+    def shared(cls) -> Hedging:
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_env()
+            return cls._shared
+
+    @classmethod
+    def use_shared(cls, hedging: Hedging):
+        with cls._shared_lock:
+            cls._shared = hedging
+
+    @classmethod
+    def from_env(cls) -> Hedging:
+        return cls(quantile=float(os.getenv('HEDGE_QUANTILE', cls.DEFAULT_QUANTILE)),
+                   min_delay=float(os.getenv('HEDGE_MIN_DELAY_SECONDS', .05)),
+                   max_delay=float(os.getenv('HEDGE_MAX_DELAY_SECONDS', 2)))
+
+    def delay(self, endpoint: str) -> Optional[float]:
+        window = self._window(endpoint)
+        if len(window) < self.min_samples:
+            return None
+        return min(self.max_delay, max(self.min_delay, window.quantile(self.quantile)))
+
+    def call(self, endpoint: str, send: Callable[[], T], before_hedge: Callable[[], object] = None) -> T:
+        delay = self.delay(endpoint)
+        if delay is None:
+            return self._timed(endpoint, send)
+        # the primary gets a thread of its own, it never queues and the delay runs from the moment it is sent
+        primary, sent = Future(), Event()
+        Thread(target=self._attempt, args=(primary, endpoint, send, sent.set), daemon=True,
+               name=f'{self.__class__.__name__}-primary').start()
+        sent.wait()
+        attempts = [primary]
+        if not wait(attempts, timeout=delay).done:
+            hedge = self._submit_hedge(endpoint, send, before_hedge)
+            if hedge is not None:
+                attempts.append(hedge)
+        # the first successful answer wins, the loser is idempotent and finishes in the background
+        pending = set(attempts)
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            finished = next((attempt for attempt in attempts if attempt in done and attempt.exception() is None),
+                            None)
+            if finished is not None:
+                if finished is not primary:
+                    with self._lock:
+                        self.hedges_won[endpoint] += 1
+                return finished.result()
+        return primary.result()
+
+    def close(self):
+        with self._lock:
+            executor, self._executor = self._executor, None
+        if executor is not None:
+            executor.shutdown(wait=False, cancel_futures=True)
+
+    def _submit_hedge(self, endpoint: str, send: Callable[[], T], before: Callable[[], object] = None):
+        # a hedge that would have to queue behind other hedges is no faster than the primary, so skip it
+        if not self._workers.acquire(blocking=False):
+            self.debug(f'[{endpoint}] no free worker, not hedging')
+            return None
+        with self._lock:
+            if self._executor is None:
+                self._executor = ThreadPoolExecutor(max_workers=self.max_workers,
+                                                    thread_name_prefix=self.__class__.__name__)
+            executor = self._executor
+        try:
+            hedge = executor.submit(self._timed, endpoint, send, before)
+        except RuntimeError:
+            # closed while the primary was in flight
+            self._workers.release()
+            return None
+        hedge.add_done_callback(lambda _: self._workers.release())
+        self.debug(f'[{endpoint}] slower than usual, hedging')
+        with self._lock:
+            self.hedged[endpoint] += 1
+        return hedge
+
+    def _attempt(self, future: Future, endpoint: str, send: Callable[[], T], started: Callable[[], object]):
+        try:
+            future.set_result(self._timed(endpoint, send, started=started))
+        except BaseException as e:
+            future.set_exception(e)
+        finally:
+            # an attempt failing before it was sent must not leave the caller waiting
+            started()
+
+    def _timed(self, endpoint: str, send: Callable[[], T], before: Callable[[], object] = None,
+               started: Callable[[], object] = None) -> T:
+        if before is not None:
+            before()
+        if started is not None:
+            started()
+        sent = perf_counter()
+        result = send()
+        self._window(endpoint).add(perf_counter() - sent)
+        return result
+
+    def _window(self, endpoint: str) -> LatencyWindow:
+        with self._lock:
+            window = self._windows.get(endpoint)
+            if window is None:
+                window = self._windows[endpoint] = LatencyWindow()
+            return window
+
+
+class Circuit:
+    CLOSED = 'closed'
+    OPEN = 'open'
+    HALF_OPEN = 'half-open'
+
+    def __init__(self):
+        self.state = self.CLOSED
+        self.failures = 0
+        self.opened_at = 0.
+        self.rejected = 0
+
+
+class CircuitBreaker:
+    DEFAULT_FAILURES = 5
+    DEFAULT_RESET_SECONDS = 30
+    _shared: Optional[CircuitBreaker] = None
+    _shared_lock = Lock()
+
+    def __init__(self, failures: int = DEFAULT_FAILURES, reset_seconds: float = DEFAULT_RESET_SECONDS,
+                 clock: Callable[[], float] = monotonic):
+        assert failures > 0, failures
+        self.failures = failures
+        self.reset_seconds = reset_seconds
+        self.clock = clock
+        self._circuits: Dict[str, Circuit] = {}
+        self._lock = Lock()
+        self.log = getLogger(self.__class__.__name__).info
+
+    @classmethod
+    def shared(cls) -> CircuitBreaker:
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls.from_env()
+            return cls._shared
+
+    @classmethod
+    def use_shared(cls, circuit_breaker: CircuitBreaker):
+        with cls._shared_lock:
+            cls._shared = circuit_breaker
+
+    @classmethod
+    def from_env(cls) -> CircuitBreaker:
+        return cls(failures=int(os.getenv('CIRCUIT_FAILURES', cls.DEFAULT_FAILURES)),
+                   reset_seconds=float(os.getenv('CIRCUIT_RESET_SECONDS', cls.DEFAULT_RESET_SECONDS)))
+
+    def call(self, url: str, function: Callable[[], T], failures: Tuple[Type[BaseException], ...]) -> T:
+        host = urlparse(url).hostname or ''
+        self._before(host)
+        try:
+            result = function()
+        except failures:
+            self._failed(host)
+            raise
+        except Exception:
+            # any other answer means the upstream is responding
+            self._succeeded(host)
+            raise
+        self._succeeded(host)
+        return result
+
+    def states(self) -> Dict[str, Dict[str, object]]:
+        with self._lock:
+            return {host: {'state': circuit.state, 'failures': circuit.failures, 'rejected': circuit.rejected}
+                    for host, circuit in self._circuits.items()}
+
+    def _before(self, host: str):
+        with self._lock:
+            circuit = self._circuits.setdefault(host, Circuit())
+            if Circuit.CLOSED == circuit.state:
+                return
+            remaining = max(0., circuit.opened_at + self.reset_seconds - self.clock())
+            if Circuit.OPEN == circuit.state and not remaining:
+                # a single trial request decides whether the circuit closes again
+                circuit.state = Circuit.HALF_OPEN
+                return
+            circuit.rejected += 1
+        raise CircuitOpenException(host, remaining)
+
+    def _failed(self, host: str):
+        with self._lock:
+            circuit = self._circuits[host]
+            circuit.failures += 1
+            if Circuit.HALF_OPEN == circuit.state or circuit.failures >= self.failures:
+                opened = Circuit.OPEN != circuit.state
+                circuit.state = Circuit.OPEN
+                circuit.opened_at = self.clock()
+            else:
+                opened = False
+        if opened:
+            self.log(f'[{host}] failed [{circuit.failures}] times, failing fast for [{self.reset_seconds}s]')
+
+    def _succeeded(self, host: str):
+        with self._lock:
+            circuit = self._circuits[host]
+            if Circuit.CLOSED != circuit.state:
+                self.log(f'[{host}] recovered, closing circuit')
+            circuit.state = Circuit.CLOSED
+            circuit.failures = 0
@@ -0,0 +1,92 @@
+from __future__ import annotations
+
+from abc import ABC, abstractmethod
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import date, timedelta
+from logging import getLogger
+from typing import Set, Type, List, Iterable, Iterator, TYPE_CHECKING
+
+from vaccination.entities import Appointment
+
+if TYPE_CHECKING:
+    from vaccination.connectors import ImpzentrenBayernConnector
+
+
+def days_in_range(first_day: date, days: int) -> List[date]:
+    from dateutil import rrule
+    return [start_date.date() for start_date in
+            rrule.rrule(rrule.DAILY, dtstart=first_day, until=first_day + timedelta(days=days))]
+
+
+def only_appointments(appointments) -> Set[Type[Appointment]]:
+    return set(filter(lambda app: app.__class__ == Appointment, appointments))
+
+
+def unique_appointments(appointments: Iterable) -> Iterator[Appointment]:
+    seen = set()
+    for appointment in appointments:
+        if appointment.__class__ == Appointment and appointment not in seen:
+            seen.add(appointment)
+            yield appointment
+
+
+class ScanStrategy(ABC):
+    def __init__(self):
+        self.log = getLogger(self.__class__.__name__).info
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    def scan(self, connector: ImpzentrenBayernConnector, first_day: date, days: int) -> Set[Type[Appointment]]:
+        return set(self.iter_scan(connector, first_day, days))
+
+    @abstractmethod
+    def iter_scan(self, connector: ImpzentrenBayernConnector, first_day: date, days: int) -> Iterator[Appointment]:
+        pass
+
+class DailyScan(ScanStrategy):
+    def __init__(self, max_workers: int = 1):
+        super().__init__()
+        assert max_workers > 0, max_workers
+        self.max_workers = max_workers
+
+    def iter_scan(self, connector: ImpzentrenBayernConnector, first_day: date, days: int) -> Iterator[Appointment]:
+        scan_days = days_in_range(first_day, days)
+        workers = min(self.max_workers, len(scan_days))
+        if workers <= 1:
+            yield from unique_appointments(map(connector.get_next_appointment, scan_days))
+            return
+        # resolve the citizen once, otherwise every worker would look it up concurrently
+        connector.citizen
+        self.debug(f'scanning [{len(scan_days)}] days with [{workers}] workers')
+        executor = ThreadPoolExecutor(max_workers=workers, thread_name_prefix=self.__class__.__name__)
+        try:
+            futures = [executor.submit(connector.get_next_appointment, day) for day in scan_days]
+            yield from unique_appointments(future.result() for future in as_completed(futures))
+        finally:
+            # a consumer that stops early only waits for the days already in flight
+            executor.shutdown(cancel_futures=True)
+
+
+class CursorScan(ScanStrategy):
+    def __init__(self):
+        super().__init__()
+        self.requests = 0
+        self.requests_saved = 0
+
+    def iter_scan(self, connector: ImpzentrenBayernConnector, first_day: date, days: int) -> Iterator[Appointment]:
+        scan_days = days_in_range(first_day, days)
+        self.requests = 0
+        cursor = scan_days[0]
+        while cursor <= scan_days[-1]:
+            appointment = connector.get_next_appointment(cursor)
+            self.requests += 1
+            if appointment.__class__ != Appointment:
+                break
+            yield appointment
+            # every day up to the slot's date would answer with this very slot. jumping to the day after at 00:00
+            # rather than to date_time itself keeps the results identical to the daily walk, which never asks for
+            # a later slot on the same day either
+            cursor = max(cursor, appointment.date_time.date()) + timedelta(days=1)
+        self.requests_saved = len(scan_days) - self.requests
+        self.log(f'scanned [{len(scan_days)}] days with [{self.requests}] requests, '
+                 f'saved [{self.requests_saved}]')
+
@@ -1,44 +1,59 @@
 from datetime import datetime, date
-from typing import Type
+from typing import Type, Iterator
 
 from vaccination.connectors import ImpzentrenBayernConnector, Authentication
 from vaccination.entities import Appointment, NoAppointment
+from vaccination.history import SlotHistory
 from vaccination.login import LoginProvider
+from vaccination.pool import ConnectorPool
+from vaccination.scanning import ScanStrategy
 
 
 class VaccinationAppointmentService:
-    def __init__(self, connector_type: Type[ImpzentrenBayernConnector]):
+    def __init__(self, connector_type: Type[ImpzentrenBayernConnector], pool: ConnectorPool = None,
+                 history: SlotHistory = None):
         self.connector_type = connector_type
+        self.pool = pool if pool is not None else ConnectorPool(connector_type)
+        self.history = history
 
     def authentication(self, login_provider: LoginProvider):
-        with self._with_service() as connector:
+        connector = self.pool.login_connector()
+        try:
             access_token = connector.login(login_provider.get_login_json())
-            return Authentication.from_access_token(connector.get_access_token(access_token))
+            authentication = Authentication.from_access_token(connector.get_access_token(access_token))
+        except Exception:
+            connector.close()
+            raise
+        # keep the warm session around for the calls that follow the login
+        self.pool.adopt(authentication, connector)
+        return authentication
 
     def current_appointment(self, authentication: Authentication):
-        with self._with_service_as_authenticated(authentication) as connector:
+        with self.pool.lease(authentication) as connector:
             return connector.get_current_appointment()
 
     def next_appointment(self, authentication: Authentication, first_day: date) -> Type[Appointment]:
-        with self._with_service_as_authenticated(authentication) as connector:
+        with self.pool.lease(authentication) as connector:
             return connector.get_next_appointment(first_day)
 
-    def appointments_in_range(self, authentication: Authentication, first_day: date, days: int):
-        with self._with_service_as_authenticated(authentication) as connector:
-            return connector.get_appointments_in_range(first_day=first_day, days=days)
+    def appointments_in_range(self, authentication: Authentication, first_day: date, days: int,
+                              strategy: ScanStrategy = None):
+        if self.history is not None:
+            return set(self.iter_appointments_in_range(authentication, first_day, days, strategy))
+        with self.pool.lease(authentication) as connector:
+            return connector.get_appointments_in_range(first_day=first_day, days=days, strategy=strategy)
+
+    def iter_appointments_in_range(self, authentication: Authentication, first_day: date, days: int,
+                                   strategy: ScanStrategy = None) -> Iterator[Appointment]:
+        with self.pool.lease(authentication) as connector:
+            appointments = connector.iter_appointments_in_range(first_day=first_day, days=days, strategy=strategy)
+            if self.history is not None:
+                appointments = self.history.recording(appointments)
+            yield from appointments
 
     def book_appointment(self, authentication: Authentication, appointment: Appointment):
-        with self._with_service_as_authenticated(authentication) as connector:
+        with self.pool.lease(authentication) as connector:
             connector.book_appointment(appointment)
 
     def has_next_appointment(self, authentication: Authentication):
         return not isinstance(self.current_appointment(authentication), NoAppointment)
-
-    def _with_service_as_authenticated(self, authentication: Authentication) -> ImpzentrenBayernConnector:
-        with self._with_service() as connector:
-            connector.authenticate_session(authentication)
-            return connector
-
-    def _with_service(self) -> ImpzentrenBayernConnector:
-        with self.connector_type() as connector:
-            return connector
@@ -0,0 +1,117 @@
+from __future__ import annotations
+
+import json
+import secrets
+import sqlite3
+from abc import ABC, abstractmethod
+from threading import Lock
+from time import time
+from typing import Optional
+
+from vaccination.cache import TTLCache
+from vaccination.connectors import Authentication
+
+
+class SessionState:
+    def __init__(self, authentication: Authentication, citizen: dict = None):
+        # the citizen json as the portal returns it, so a restarted worker need not ask for it again
+        self.authentication = authentication
+        self.citizen = citizen
+
+    def to_json(self) -> dict:
+        return {'authentication': self.authentication.to_session(), 'citizen': self.citizen}
+
+    @classmethod
+    def from_json(cls, state_json: dict) -> SessionState:
+        return cls(Authentication.from_session(state_json['authentication']), state_json.get('citizen'))
+
+
+class SessionStore(ABC):
+    def __init__(self, ttl: float):
+        self.ttl = ttl
+
+    def create(self, state: SessionState) -> str:
+        session_id = secrets.token_urlsafe(32)
+        self.save(session_id, state)
+        return session_id
+
+    @abstractmethod
+    def get(self, session_id: str) -> Optional[SessionState]:
+        pass
+
+    @abstractmethod
+    def save(self, session_id: str, state: SessionState):
+        pass
+
+    @abstractmethod
+    def delete(self, session_id: str):
+        pass
+
+    def close(self):
+        pass
+
+
+class MemorySessionStore(SessionStore):
+    def __init__(self, maxsize: int = 1024, ttl: float = 3600):
+        super().__init__(ttl)
+        self._sessions = TTLCache(maxsize, ttl)
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        state = self._sessions.get(session_id)
+        if state is not None:
+            # sessions expire after being idle, not after being created
+            self._sessions.put(session_id, state)
+        return state
+
+    def save(self, session_id: str, state: SessionState):
+        self._sessions.put(session_id, state)
+
+    def delete(self, session_id: str):
+        self._sessions.invalidate(session_id)
+
+    def __len__(self):
+        return len(self._sessions)
+
+
+class SqliteSessionStore(SessionStore):
+    def __init__(self, path: str = ':memory:', ttl: float = 3600):
+        super().__init__(ttl)
+        self.path = path
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = Lock()
+        with self._lock:
+            if ':memory:' != path:
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS sessions '
+                                     '(id TEXT PRIMARY KEY, state TEXT NOT NULL, expires_at REAL NOT NULL)')
+            self._connection.execute('CREATE INDEX IF NOT EXISTS sessions_by_expiry ON sessions (expires_at)')
+
+    def get(self, session_id: str) -> Optional[SessionState]:
+        now = time()
+        with self._lock:
+            row = self._connection.execute('SELECT state FROM sessions WHERE id = ? AND expires_at > ?',
+                                           (session_id, now)).fetchone()
+            if row is None:
+                return None
+            self._connection.execute('UPDATE sessions SET expires_at = ? WHERE id = ?', (now + self.ttl, session_id))
+        return SessionState.from_json(json.loads(row[0]))
+
+    def save(self, session_id: str, state: SessionState):
+        now = time()
+        with self._lock:
+            self._connection.execute('DELETE FROM sessions WHERE expires_at <= ?', (now,))
+            self._connection.execute('INSERT OR REPLACE INTO sessions VALUES (?, ?, ?)',
+                                     (session_id, json.dumps(state.to_json()), now + self.ttl))
+
+    def delete(self, session_id: str):
+        with self._lock:
+            self._connection.execute('DELETE FROM sessions WHERE id = ?', (session_id,))
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+    def __len__(self):
+        with self._lock:
+            return self._connection.execute('SELECT count(*) FROM sessions WHERE expires_at > ?',
+                                            (time(),)).fetchone()[0]
@@ -0,0 +1,72 @@
+from __future__ import annotations
+
+from collections import Counter
+from threading import Lock, Event
+from typing import Any, Callable, Dict, Hashable, Optional
+
+from vaccination.metrics import endpoint_name
+
+
+class _Call:
+    def __init__(self):
+        self.done = Event()
+        self.waiters = 0
+        self.result = None
+        self.error: Optional[BaseException] = None
+
+
+def upstream_group(key: tuple) -> tuple:
+    method, url = key[:2]
+    return method, endpoint_name(url)
+
+
+class SingleFlight:
+    _shared: Optional[SingleFlight] = None
+    _shared_lock = Lock()
+
+    def __init__(self, group: Callable[[Hashable], Hashable] = upstream_group):
+        self.group = group
+        self.shared_calls = Counter()
+        self._calls: Dict[Hashable, _Call] = {}
+        self._lock = Lock()
+
+    @classmethod
+    def shared(cls) -> SingleFlight:
+        with cls._shared_lock:
+            if cls._shared is None:
+                cls._shared = cls()
+            return cls._shared
+
+    def do(self, key: Hashable, function: Callable[[], Any]):
+        with self._lock:
+            call = self._calls.get(key)
+            leader = call is None
+            if leader:
+                call = self._calls[key] = _Call()
+            else:
+                call.waiters += 1
+                self.shared_calls[self.group(key)] += 1
+        return self._lead(key, call, function) if leader else self._wait(call)
+
+    def waiters(self) -> Dict[Hashable, int]:
+        with self._lock:
+            return {key: call.waiters for key, call in self._calls.items()}
+
+    def _lead(self, key: Hashable, call: _Call, function: Callable[[], Any]):
+        try:
+            call.result = function()
+            return call.result
+        except BaseException as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                del self._calls[key]
+            call.done.set()
+
+    @staticmethod
+    def _wait(call: _Call):
+        call.done.wait()
+        if call.error is not None:
+            raise call.error
+        return call.result
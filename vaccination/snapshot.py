@@ -0,0 +1,194 @@
+from __future__ import annotations
+
+import json
+import sqlite3
+from hashlib import sha1
+from datetime import datetime, date
+from logging import getLogger
+from threading import Thread, Event, Lock
+from time import time
+from typing import FrozenSet, Type, Callable, Optional, Iterator
+
+from vaccination.connectors import Authentication, InvalidCredentialsException
+from vaccination.entities import Appointment
+from vaccination.scanning import ScanStrategy, DailyScan
+from vaccination.services import VaccinationAppointmentService
+
+
+class SlotSnapshot:
+    def __init__(self, appointments: FrozenSet[Type[Appointment]], taken_at: datetime, first_day: date, days: int):
+        self.appointments = appointments
+        self.taken_at = taken_at
+        self.first_day = first_day
+        self.days = days
+        self._etag: Optional[str] = None
+
+    @property
+    def etag(self) -> str:
+        # derived from the slots alone, a rescan that finds the same slots keeps the tag
+        if self._etag is None:
+            content = '\n'.join(f'{appointment.site}|{appointment.date_time.isoformat()}'
+                                 for appointment in sorted(self.appointments))
+            self._etag = sha1(f'{self.first_day.isoformat()}|{self.days}\n{content}'.encode('utf-8')).hexdigest()
+        return self._etag
+
+    @property
+    def age(self) -> float:
+        return (datetime.now() - self.taken_at).total_seconds()
+
+
+class SnapshotStore:
+    def __init__(self):
+        self._snapshot: Optional[SlotSnapshot] = None
+
+    def load(self) -> Optional[SlotSnapshot]:
+        return self._snapshot
+
+    def save(self, snapshot: SlotSnapshot):
+        self._snapshot = snapshot
+
+    def claim_refresh(self, seconds: float) -> bool:
+        return True
+
+    def close(self):
+        pass
+
+
+class SqliteSnapshotStore(SnapshotStore):
+    def __init__(self, path: str, name: str = 'slots'):
+        super().__init__()
+        self.path = path
+        self.name = name
+        self._connection = sqlite3.connect(path, timeout=30, isolation_level=None, check_same_thread=False)
+        self._lock = Lock()
+        with self._lock:
+            if ':memory:' != path:
+                self._connection.execute('PRAGMA journal_mode=WAL')
+            self._connection.execute('CREATE TABLE IF NOT EXISTS snapshots '
+                                     '(name TEXT PRIMARY KEY, taken_at TEXT, first_day TEXT, days INTEGER, '
+                                     'appointments TEXT, refresh_claimed_until REAL NOT NULL DEFAULT 0)')
+            self._connection.execute('INSERT OR IGNORE INTO snapshots (name) VALUES (?)', (name,))
+
+    def load(self) -> Optional[SlotSnapshot]:
+        with self._lock:
+            taken_at, first_day, days = self._connection.execute(
+                'SELECT taken_at, first_day, days FROM snapshots WHERE name = ?', (self.name,)).fetchone()
+            if taken_at is None:
+                return None
+            cached = self._snapshot
+            if cached is not None and cached.taken_at.isoformat() == taken_at:
+                # unchanged since the last load, skip parsing the slots again
+                return cached
+            appointments, = self._connection.execute('SELECT appointments FROM snapshots WHERE name = ?',
+                                                     (self.name,)).fetchone()
+        snapshot = SlotSnapshot(frozenset(Appointment(site, datetime.fromisoformat(date_time))
+                                          for site, date_time in json.loads(appointments)),
+                                datetime.fromisoformat(taken_at), date.fromisoformat(first_day), days)
+        self._snapshot = snapshot
+        return snapshot
+
+    def save(self, snapshot: SlotSnapshot):
+        appointments = json.dumps([(appointment.site, appointment.date_time.isoformat())
+                                   for appointment in sorted(snapshot.appointments)])
+        with self._lock:
+            self._connection.execute('UPDATE snapshots SET taken_at = ?, first_day = ?, days = ?, appointments = ? '
+                                     'WHERE name = ?', (snapshot.taken_at.isoformat(),
+                                                        snapshot.first_day.isoformat(), snapshot.days,
+                                                        appointments, self.name))
+        self._snapshot = snapshot
+
+    def claim_refresh(self, seconds: float) -> bool:
+        # only one of the processes sharing the store runs the periodic scan
+        now = time()
+        with self._lock:
+            claimed = self._connection.execute('UPDATE snapshots SET refresh_claimed_until = ? '
+                                               'WHERE name = ? AND refresh_claimed_until <= ?',
+                                               (now + seconds, self.name, now)).rowcount
+        return 1 == claimed
+
+    def close(self):
+        with self._lock:
+            self._connection.close()
+
+
+class SnapshotRefresher:
+    def __init__(self, service: VaccinationAppointmentService, days: int = 30, interval: float = 60,
+                 strategy_factory: Callable[[], ScanStrategy] = DailyScan, store: SnapshotStore = None):
+        self.service = service
+        self.days = days
+        self.interval = interval
+        self.strategy_factory = strategy_factory
+        self.store = store if store is not None else SnapshotStore()
+        self._authentication: Optional[Authentication] = None
+        self._lock = Lock()
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self.log = getLogger(self.__class__.__name__).info
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    @property
+    def snapshot(self) -> Optional[SlotSnapshot]:
+        return self.store.load()
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def offer(self, authentication: Authentication):
+        # the scan needs some logged in account, the most recent visitor's is the freshest
+        with self._lock:
+            self._authentication = authentication
+            if self._thread is None and not self._stopped.is_set():
+                self._thread = Thread(target=self._run, name=self.__class__.__name__, daemon=True)
+                self._thread.start()
+
+    def withdraw(self, account_key: str):
+        # a logged out or expired account must not be scanned with, nor have its session kept alive
+        with self._lock:
+            if self._authentication is not None and account_key == self._authentication.account_key:
+                self._authentication = None
+                self.debug(f'withdrew authentication of [{account_key}]')
+
+    def refresh(self, authentication: Authentication = None) -> SlotSnapshot:
+        snapshots = []
+        for _ in self.stream(authentication, snapshots.append):
+            pass
+        return snapshots[0]
+
+    def stream(self, authentication: Authentication = None,
+               on_snapshot: Callable[[SlotSnapshot], None] = None) -> Iterator[Appointment]:
+        authentication = authentication or self._authentication
+        assert authentication, 'no authentication offered yet'
+        first_day = datetime.now().date()
+        appointments = set()
+        for appointment in self.service.iter_appointments_in_range(authentication, first_day, self.days,
+                                                                   strategy=self.strategy_factory()):
+            appointments.add(appointment)
+            yield appointment
+        # only a completed scan replaces the snapshot, an abandoned stream leaves the old one in place
+        snapshot = SlotSnapshot(frozenset(appointments), datetime.now(), first_day, self.days)
+        self.store.save(snapshot)
+        self.debug(f'refreshed snapshot with [{len(snapshot.appointments)}] slots')
+        if on_snapshot:
+            on_snapshot(snapshot)
+
+    def stop(self):
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None:
+            thread.join(timeout=self.interval)
+
+    def _run(self):
+        while not self._stopped.is_set():
+            snapshot = self.snapshot
+            authentication = self._authentication
+            if authentication is not None and (snapshot is None or snapshot.age >= self.interval) \
+                    and self.store.claim_refresh(self.interval):
+                try:
+                    self.refresh(authentication)
+                except InvalidCredentialsException:
+                    self.log('refreshing snapshot failed, the offered session has ended')
+                    self.withdraw(authentication.account_key)
+                except Exception as e:
+                    self.log(f'refreshing snapshot failed: {e!r}')
+            self._stopped.wait(self.interval)
@@ -0,0 +1,171 @@
+from __future__ import annotations
+
+import random
+from datetime import datetime
+from logging import getLogger
+from threading import Event, Thread, current_thread
+from typing import Callable, List, Set, Type, Optional, Iterable
+
+from vaccination.booking import BookingEngine, NoSlotBookedException
+from vaccination.connectors import Authentication, UpstreamUnavailableException, BookingRefusedException
+from vaccination.entities import Appointment
+from vaccination.resilience import CircuitOpenException
+from vaccination.scanning import ScanStrategy, DailyScan
+from vaccination.services import VaccinationAppointmentService
+
+
+class SlotEvent:
+    APPEARED = 'appeared'
+    DISAPPEARED = 'disappeared'
+
+    def __init__(self, kind: str, appointment: Type[Appointment], observed_at: datetime):
+        self.kind = kind
+        self.appointment = appointment
+        self.observed_at = observed_at
+
+    def __repr__(self):
+        return f'{self.__class__.__name__}({self.kind}->{self.appointment})'
+
+
+class Backoff:
+    def __init__(self, base: float = 5, factor: float = 2, maximum: float = 600):
+        self.base = base
+        self.factor = factor
+        self.maximum = maximum
+
+    def delay(self, failures: int) -> float:
+        return min(self.maximum, self.base * self.factor ** max(0, failures - 1))
+
+
+class SlotWatcher:
+    def __init__(self, service: VaccinationAppointmentService, authentication: Authentication, days: int = 30,
+                 interval: float = 60, jitter: float = .1, backoff: Backoff = None,
+                 strategy_factory: Callable[[], ScanStrategy] = DailyScan,
+                 callbacks: Iterable[Callable[[SlotEvent], None]] = ()):
+        assert 0 <= jitter < 1, jitter
+        self.service = service
+        self.authentication = authentication
+        self.days = days
+        self.interval = interval
+        self.jitter = jitter
+        self.backoff = backoff or Backoff()
+        self.strategy_factory = strategy_factory
+        self.callbacks: List[Callable[[SlotEvent], None]] = list(callbacks)
+        self.slots: Set[Type[Appointment]] = set()
+        self.polls = 0
+        self.failures = 0
+        self.last_polled_at: Optional[datetime] = None
+        self._stopped = Event()
+        self._thread: Optional[Thread] = None
+        self.log = getLogger(self.__class__.__name__).info
+        self.debug = getLogger(self.__class__.__name__).debug
+
+    def add_callback(self, callback: Callable[[SlotEvent], None]):
+        self.callbacks.append(callback)
+
+    @property
+    def running(self) -> bool:
+        return self._thread is not None and self._thread.is_alive()
+
+    def poll(self) -> List[SlotEvent]:
+        observed_at = datetime.now()
+        slots = self.service.appointments_in_range(self.authentication, observed_at.date(), self.days,
+                                                   strategy=self.strategy_factory())
+        events = [SlotEvent(SlotEvent.APPEARED, appointment, observed_at)
+                  for appointment in sorted(slots - self.slots)]
+        events += [SlotEvent(SlotEvent.DISAPPEARED, appointment, observed_at)
+                   for appointment in sorted(self.slots - slots)]
+        self.slots = slots
+        self.polls += 1
+        self.last_polled_at = observed_at
+        for event in events:
+            self._emit(event)
+        return events
+
+    def next_delay(self, error: Exception = None) -> float:
+        if error is None:
+            return self.interval * random.uniform(1 - self.jitter, 1 + self.jitter)
+        delay = self.backoff.delay(self.failures)
+        if isinstance(error, (UpstreamUnavailableException, CircuitOpenException)) and error.retry_after:
+            delay = max(delay, error.retry_after)
+        return delay * random.uniform(1, 1 + self.jitter)
+
+    def run(self, max_polls: int = None):
+        attempts = 0
+        while not self._stopped.is_set() and (max_polls is None or attempts < max_polls):
+            attempts += 1
+            try:
+                self.poll()
+                self.failures = 0
+                delay = self.next_delay()
+            except Exception as e:
+                self.failures += 1
+                delay = self.next_delay(e)
+                self.log(f'poll failed [{self.failures}] times ({e!r}), retrying in [{delay:.1f}s]')
+            self._stopped.wait(delay)
+
+    def start(self):
+        assert not self.running, 'already watching'
+        self._stopped.clear()
+        self._thread = Thread(target=self.run, name=self.__class__.__name__, daemon=True)
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        thread = self._thread
+        if thread is not None and thread is not current_thread():
+            thread.join()
+
+    def _emit(self, event: SlotEvent):
+        self.debug(f'emitting {event}')
+        for callback in self.callbacks:
+            try:
+                callback(event)
+            except Exception as e:
+                self.log(f'callback {callback} failed for {event}: {e!r}')
+
+
+class LoggingCallback:
+    def __init__(self):
+        self.log = getLogger(self.__class__.__name__).info
+
+    def __call__(self, event: SlotEvent):
+        self.log(f'slot {event.kind}: {event.appointment.date_time} at {event.appointment.site}')
+
+
+class AutoBookCallback:
+    def __init__(self, engine: BookingEngine, accept: Callable[[Type[Appointment]], bool] = lambda appointment: True,
+                 on_booked: Callable[[Type[Appointment]], None] = None):
+        self.engine = engine
+        self.accept = accept
+        self.on_booked = on_booked
+        self.booked: Optional[Type[Appointment]] = None
+        self.refused: Optional[BookingRefusedException] = None
+        self.log = getLogger(self.__class__.__name__).info
+
+    def __call__(self, event: SlotEvent):
+        if self.booked is not None or self.refused is not None:
+            return
+        if SlotEvent.DISAPPEARED == event.kind:
+            self.engine.withdraw([event.appointment])
+            return
+        if not self.accept(event.appointment):
+            return
+        # every visible slot is a fallback in case this one is gone before the booking arrives
+        self.engine.offer([event.appointment])
+        try:
+            result = self.engine.book()
+        except NoSlotBookedException as e:
+            self.log(f'every candidate was taken: {e.attempts}')
+            return
+        except BookingRefusedException as e:
+            # the portal refuses this account, not the slot, every further slot would be refused the same way
+            self.refused = e
+            self.engine.close()
+            self.log(f'booking refused with [{e.response.status_code}], no longer booking automatically')
+            return
+        self.booked = result.appointment
+        self.engine.close()
+        self.log(f'booked {result.appointment} after [{result.seconds:.3f}s]')
+        if self.on_booked:
+            self.on_booked(result.appointment)
@@ -1,18 +1,115 @@
+from __future__ import annotations
+
+import atexit
 import os
+from time import perf_counter
+from typing import TYPE_CHECKING
+
+from vaccination.booking import BookingEngines
+from vaccination.connectors import ImpzentrenBayernConnector
+from vaccination.history import SlotHistory
+from vaccination.metrics import REGISTRY, cache_families, rate_limiter_families, single_flight_families, \
+    resilience_families
+from vaccination.pool import ConnectorPool
+from vaccination.ratelimit import RateLimiter
+from vaccination.resilience import Hedging, CircuitBreaker
+from vaccination.sessions import MemorySessionStore, SqliteSessionStore
+from vaccination.singleflight import SingleFlight
+from vaccination.scanning import DailyScan
+from vaccination.services import VaccinationAppointmentService
+from vaccination.snapshot import SnapshotRefresher, SnapshotStore, SqliteSnapshotStore
+
+if TYPE_CHECKING:
+    from flask import Flask
 
-from flask import Flask
-from werkzeug.middleware.proxy_fix import ProxyFix
+SCAN_WORKERS = 8
 
-from web.views import add_views
 
+def create_app() -> Flask:
+    # flask and the views are only paid for by the processes that actually serve
+    from flask import Flask
+    from werkzeug.middleware.proxy_fix import ProxyFix
+    from web.views import add_views
 
-def create_app():
     flask_app = Flask(__name__, template_folder='../templates')
 
     flask_app.wsgi_app = ProxyFix(flask_app.wsgi_app)
 
     flask_app.secret_key = os.getenv('FLASK_SECRET_KEY', os.urandom(24))
 
+    add_connector_pool(flask_app)
+    add_session_store(flask_app)
+    add_slot_history(flask_app)
+    add_slot_refresher(flask_app)
+    add_booking_engines(flask_app)
+    add_metrics(flask_app)
     add_views(flask_app)
 
     return flask_app
+
+
+def add_connector_pool(flask_app: Flask):
+    pool = ConnectorPool(ImpzentrenBayernConnector,
+                         max_idle_seconds=float(os.getenv('CONNECTOR_MAX_IDLE_SECONDS', 300)),
+                         prefetch_logins=os.getenv('PREFETCH_LOGIN_LINKS', '1') == '1')
+    flask_app.extensions['connector_pool'] = pool
+    flask_app.teardown_appcontext(lambda _: pool.evict_idle())
+    atexit.register(pool.close)
+
+
+def add_session_store(flask_app: Flask):
+    ttl = float(os.getenv('SESSION_TTL_SECONDS', 3600))
+    if 'sqlite' == os.getenv('SESSION_STORE', 'memory'):
+        store = SqliteSessionStore(os.getenv('SESSION_DB', 'sessions.db'), ttl=ttl)
+    else:
+        store = MemorySessionStore(maxsize=int(os.getenv('SESSION_MAX_ENTRIES', 4096)), ttl=ttl)
+    flask_app.extensions['session_store'] = store
+    atexit.register(store.close)
+
+
+def add_slot_history(flask_app: Flask):
+    history = SlotHistory(os.getenv('SLOT_HISTORY_DB', ':memory:'))
+    flask_app.extensions['slot_history'] = history
+    atexit.register(history.close)
+
+
+def add_slot_refresher(flask_app: Flask):
+    service = VaccinationAppointmentService(ImpzentrenBayernConnector, flask_app.extensions['connector_pool'],
+                                            flask_app.extensions['slot_history'])
+    store = SqliteSnapshotStore(os.getenv('SNAPSHOT_DB')) if os.getenv('SNAPSHOT_DB') else SnapshotStore()
+    refresher = SnapshotRefresher(service, days=30, interval=float(os.getenv('SLOT_REFRESH_SECONDS', 60)),
+                                  strategy_factory=lambda: DailyScan(max_workers=SCAN_WORKERS), store=store)
+    flask_app.extensions['slot_refresher'] = refresher
+    atexit.register(store.close)
+    atexit.register(refresher.stop)
+
+
+def add_booking_engines(flask_app: Flask):
+    engines = BookingEngines(max_idle_seconds=float(os.getenv('BOOKING_ENGINE_MAX_IDLE_SECONDS', 300)))
+    flask_app.extensions['booking_engines'] = engines
+    atexit.register(engines.close_all)
+
+
+def add_metrics(flask_app: Flask):
+    from flask import g, request
+
+    request_latency = REGISTRY.histogram('vaccination_http_request_seconds', 'Latency of requests to this app',
+                                         ('endpoint', 'method', 'status'))
+    pool = flask_app.extensions['connector_pool']
+    flask_app.extensions['metrics_collectors'] = [
+        lambda: cache_families(pool.read_cache.caches),
+        lambda: rate_limiter_families(RateLimiter.shared().stats()),
+        lambda: single_flight_families(SingleFlight.shared()),
+        lambda: resilience_families(Hedging.shared(), CircuitBreaker.shared())]
+
+    @flask_app.before_request
+    def start_timer():
+        g.request_started = perf_counter()
+
+    @flask_app.after_request
+    def observe_request(response):
+        started = g.pop('request_started', None)
+        if started is not None:
+            request_latency.observe(perf_counter() - started, endpoint=request.endpoint or 'unknown',
+                                    method=request.method, status=response.status_code)
+        return response
@@ -0,0 +1,184 @@
+from __future__ import annotations
+
+import logging
+import os
+import signal
+import socket
+import sys
+import traceback
+from argparse import ArgumentParser
+from logging import basicConfig, getLogger
+from time import monotonic, sleep
+from typing import Callable, Dict, Optional, Tuple, TYPE_CHECKING
+
+from web import create_app
+
+if TYPE_CHECKING:
+    from flask import Flask
+
+SHARED_STATE_FILES = {'RATE_LIMIT_DB': 'ratelimit.db',
+                      'SESSION_DB': 'sessions.db',
+                      'SLOT_HISTORY_DB': 'history.db',
+                      'SNAPSHOT_DB': 'snapshots.db'}
+
+
+def share_state(directory: str):
+    # every worker reads these when it creates its app, explicit settings win
+    os.makedirs(directory, exist_ok=True)
+    for variable, file_name in SHARED_STATE_FILES.items():
+        os.environ.setdefault(variable, os.path.join(directory, file_name))
+    os.environ.setdefault('SESSION_STORE', 'sqlite')
+    # a cookie signed by one worker has to be accepted by all of them
+    os.environ.setdefault('FLASK_SECRET_KEY', os.urandom(24).hex())
+
+
+def bind(host: str, port: int, backlog: int = 1024) -> socket.socket:
+    listening = socket.socket(socket.AF_INET6 if ':' in host else socket.AF_INET, socket.SOCK_STREAM)
+    listening.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listening.bind((host, port))
+    listening.listen(backlog)
+    return listening
+
+
+class PreforkServer:
+    MIN_UPTIME_SECONDS = 5
+    RESTART_DELAY_SECONDS = 1
+    MAX_RESTART_DELAY_SECONDS = 30
+    MAX_FAST_FAILURES = 5
+
+    def __init__(self, app_factory: Callable[[], Flask], listening: socket.socket, workers: int = 2,
+                 threads: int = 4, min_uptime: float = MIN_UPTIME_SECONDS, restart_delay: float = RESTART_DELAY_SECONDS,
+                 max_restart_delay: float = MAX_RESTART_DELAY_SECONDS, max_fast_failures: int = MAX_FAST_FAILURES):
+        assert workers > 0, workers
+        self.app_factory = app_factory
+        self.listening = listening
+        self.workers = workers
+        self.threads = threads
+        self.min_uptime = min_uptime
+        self.restart_delay = restart_delay
+        self.max_restart_delay = max_restart_delay
+        self.max_fast_failures = max_fast_failures
+        self.failed = False
+        self._children: Dict[int, int] = {}
+        self._started: Dict[int, float] = {}
+        self._fast_failures: Dict[int, int] = {}
+        self._restarts: Dict[int, float] = {}
+        self._stopping = False
+        self.log = getLogger(self.__class__.__name__).info
+
+    def serve(self):
+        signal.signal(signal.SIGTERM, self._stop)
+        signal.signal(signal.SIGINT, self._stop)
+        for slot in range(self.workers):
+            self._spawn(slot)
+        while self._children or (self._restarts and not self._stopping):
+            pid, status = self._reap()
+            if pid is None:
+                break
+            if not pid:
+                continue
+            slot = self._children.pop(pid, None)
+            if slot is not None and not self._stopping:
+                self._restart(slot, pid, os.waitstatus_to_exitcode(status))
+
+    def _reap(self) -> Tuple[Optional[int], int]:
+        if self._restarts:
+            # keep reaping the other workers while a failed one waits for its restart
+            self._spawn_due()
+            try:
+                pid, status = os.waitpid(-1, os.WNOHANG)
+            except ChildProcessError:
+                pid, status = 0, 0
+            if not pid:
+                sleep(.05)
+            return pid, status
+        try:
+            return os.wait()
+        except ChildProcessError:
+            return None, 0
+        except InterruptedError:
+            return 0, 0
+
+    def _restart(self, slot: int, pid: int, exit_code: int):
+        if monotonic() - self._started[slot] >= self.min_uptime:
+            self._fast_failures[slot] = 0
+            self.log(f'worker [{pid}] exited with [{exit_code}], restarting')
+            self._spawn(slot)
+            return
+        failures = self._fast_failures[slot] = self._fast_failures.get(slot, 0) + 1
+        if failures >= self.max_fast_failures:
+            # a worker that cannot even start will not recover by forking it again
+            self.log(f'worker [{pid}] exited with [{exit_code}] after [{failures}] fast failures, giving up')
+            self.failed = True
+            self._restarts.clear()
+            self._stop()
+            return
+        delay = min(self.max_restart_delay, self.restart_delay * 2 ** (failures - 1))
+        self.log(f'worker [{pid}] exited with [{exit_code}] right after starting, restarting in [{delay}s]')
+        self._restarts[slot] = monotonic() + delay
+
+    def _spawn_due(self):
+        for slot, due in list(self._restarts.items()):
+            if due <= monotonic():
+                del self._restarts[slot]
+                self._spawn(slot)
+
+    def _spawn(self, slot: int):
+        self._started[slot] = monotonic()
+        pid = os.fork()
+        if pid:
+            self._children[pid] = slot
+            return
+        signal.signal(signal.SIGTERM, signal.SIG_DFL)
+        signal.signal(signal.SIGINT, signal.SIG_DFL)
+        exit_code = 0
+        try:
+            from waitress import serve
+            # the app is created after the fork, no threads, pooled sockets or sqlite handles cross processes
+            serve(self.app_factory(), sockets=[self.listening], threads=self.threads, ident=f'worker-{slot}')
+        except BaseException:
+            traceback.print_exc()
+            exit_code = 1
+        finally:
+            sys.stderr.flush()
+            os._exit(exit_code)
+
+    def _stop(self, *_):
+        self._stopping = True
+        for pid in list(self._children):
+            try:
+                os.kill(pid, signal.SIGTERM)
+            except ProcessLookupError:
+                pass
+
+
+def parse_arguments(argv=None):
+    parser = ArgumentParser(description='serve the web app from one or more worker processes')
+    parser.add_argument('--host', default='0.0.0.0')
+    parser.add_argument('--port', type=int, default=int(os.getenv('PORT', 8080)))
+    parser.add_argument('--workers', type=int, default=int(os.getenv('WEB_CONCURRENCY', 1)),
+                        help='worker processes sharing the listening socket')
+    parser.add_argument('--threads', type=int, default=4, help='request threads per worker')
+    parser.add_argument('--state-dir', default=os.getenv('SHARED_STATE_DIR', 'state'),
+                        help='directory of the SQLite files shared by the workers')
+    return parser.parse_args(argv)
+
+
+def main(argv=None):
+    arguments = parse_arguments(argv)
+    from waitress import serve
+    basicConfig(level=logging.INFO)
+    listening = bind(arguments.host, arguments.port)
+    getLogger(__name__).info(f'listening on [{listening.getsockname()}] with [{arguments.workers}] workers')
+    if 1 == arguments.workers:
+        serve(create_app(), sockets=[listening], threads=arguments.threads)
+        return
+    share_state(arguments.state_dir)
+    server = PreforkServer(create_app, listening, workers=arguments.workers, threads=arguments.threads)
+    server.serve()
+    if server.failed:
+        sys.exit('workers keep failing right after starting')
+
+
+if __name__ == '__main__':
+    main()
@@ -1,9 +1,13 @@
 from flask import Flask
 
+from web.views.api import add_api
 from web.views.appointment import AppointmentsView
 from web.views.home import HomeView
+from web.views.metrics import MetricsView
 
 
 def add_views(flask_app:Flask):
     HomeView.register(flask_app)
     AppointmentsView.register(flask_app)
+    MetricsView.register(flask_app)
+    add_api(flask_app)
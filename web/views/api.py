@@ -0,0 +1,187 @@
+from datetime import datetime
+from math import ceil
+
+from flask import Blueprint, Flask, request
+from flask_restx import Api, Namespace, Resource, Model, fields
+
+from vaccination.booking import BookingEngine, NoSlotBookedException
+from vaccination.connectors import InvalidCredentialsException, SlotTakenException, UpstreamUnavailableException, \
+    BookingRefusedException
+from vaccination.entities import Appointment, NoAppointment
+from vaccination.login import StaticLoginProvider
+from vaccination.resilience import CircuitOpenException
+from vaccination.snapshot import SlotSnapshot
+from web.views.base import WithService
+
+appointment_model = Model('Appointment', {
+    'siteId': fields.String(attribute='site', required=True),
+    'vaccinationDate': fields.String(attribute=lambda appointment: appointment.date_time.date().isoformat(),
+                                     required=True, example='2021-12-13'),
+    'vaccinationTime': fields.String(attribute=lambda appointment: appointment.date_time.time().isoformat('minutes'),
+                                     required=True, example='15:00'),
+})
+current_appointment_model = Model('CurrentAppointment', {
+    'appointment': fields.Nested(appointment_model, allow_null=True),
+})
+snapshot_model = Model('Slots', {
+    'takenAt': fields.DateTime(attribute='taken_at', dt_format='iso8601'),
+    'firstDay': fields.Date(attribute='first_day'),
+    'days': fields.Integer,
+    'slots': fields.List(fields.Nested(appointment_model),
+                         attribute=lambda snapshot: sorted(snapshot.appointments)),
+})
+watch_model = Model('Watch', {
+    'running': fields.Boolean,
+    'interval': fields.Float,
+    'days': fields.Integer,
+    'takenAt': fields.DateTime(attribute=lambda refresher: refresher.snapshot and refresher.snapshot.taken_at,
+                               dt_format='iso8601'),
+    'slots': fields.Integer(attribute=lambda refresher: refresher.snapshot and len(refresher.snapshot.appointments)),
+})
+slot_record_model = Model('SlotRecord', {
+    'siteId': fields.String(attribute='site'),
+    'dateTime': fields.String(attribute=lambda record: record.date_time.isoformat()),
+    'firstSeen': fields.String(attribute=lambda record: record.first_seen.isoformat()),
+    'lastSeen': fields.String(attribute=lambda record: record.last_seen.isoformat()),
+    'lifetime': fields.Float(description='seconds between the first and the last scan that found the slot'),
+})
+history_model = Model('SlotHistory', {
+    'slots': fields.List(fields.Nested(slot_record_model)),
+    'meanLifetime': fields.Float(attribute='mean_lifetime', allow_null=True),
+})
+candidates_model = Model('Candidates', {
+    'candidates': fields.List(fields.Nested(appointment_model), required=True, min_items=1,
+                              description='slots to try in this order until one is booked'),
+})
+login_model = Model('Login', {
+    'username': fields.String(required=True),
+    'password': fields.String(required=True),
+})
+
+sessions = Namespace('session', description='log in with the account of the vaccination portal')
+appointments = Namespace('appointments', description='the account\'s appointment')
+slots = Namespace('slots', description='free slots found by the latest scan')
+watch = Namespace('watch', description='the background scan keeping the slots fresh')
+for namespace, models in ((sessions, (login_model,)),
+                          (appointments, (appointment_model, current_appointment_model, candidates_model)),
+                          (slots, (appointment_model, snapshot_model, slot_record_model, history_model)),
+                          (watch, (watch_model,))):
+    for model in models:
+        namespace.add_model(model.name, model)
+
+
+@sessions.route('')
+class SessionResource(Resource, WithService):
+    @sessions.expect(login_model, validate=True)
+    @sessions.response(204, 'logged in, the session cookie authenticates further calls')
+    def post(self):
+        authentication = self.service.authentication(StaticLoginProvider(
+            {'username': sessions.payload['username'], 'password': sessions.payload['password']}))
+        self._start_session(authentication)
+        return None, 204
+
+    @sessions.response(204, 'logged out')
+    def delete(self):
+        self._end_session()
+        return None, 204
+
+
+@appointments.route('')
+class AppointmentsResource(Resource, WithService):
+    @appointments.marshal_with(current_appointment_model)
+    def get(self):
+        appointment = self.service.current_appointment(self._get_auth_from_session())
+        return {'appointment': None if isinstance(appointment, NoAppointment) else appointment}
+
+    @appointments.expect(appointment_model, validate=True)
+    @appointments.marshal_with(appointment_model, code=201)
+    @appointments.response(409, 'the slot is taken')
+    def post(self):
+        return self._book([Appointment.from_json(appointments.payload)]), 201
+
+    def _book(self, candidates):
+        with BookingEngine(self.service, self._get_auth_from_session(), rank=list) as engine:
+            return engine.book(candidates).appointment
+
+
+@appointments.route('/candidates')
+class CandidatesResource(AppointmentsResource):
+    @appointments.expect(candidates_model, validate=True)
+    @appointments.marshal_with(appointment_model, code=201)
+    @appointments.response(409, 'every candidate is taken')
+    def post(self):
+        return self._book([Appointment.from_json(candidate) for candidate in appointments.payload['candidates']]), 201
+
+
+@slots.route('')
+class SlotsResource(Resource, WithService):
+    @slots.response(200, 'slots of the latest scan', snapshot_model)
+    @slots.response(304, 'slots did not change since the scan tagged by If-None-Match')
+    @slots.param('rescan', 'scan now instead of answering with the latest scan', _in='query')
+    def get(self):
+        authentication = self._get_auth_from_session()
+        refresher = self.slot_refresher
+        snapshot = refresher.snapshot
+        if snapshot is None or 'rescan' in request.args:
+            snapshot = refresher.refresh(authentication)
+        refresher.offer(authentication)
+        return self._conditional(snapshot)
+
+    @staticmethod
+    def _conditional(snapshot: SlotSnapshot):
+        headers = {'ETag': f'"{snapshot.etag}"', 'Cache-Control': 'no-cache'}
+        if request.if_none_match.contains_weak(snapshot.etag):
+            return None, 304, headers
+        return slots.marshal(snapshot, snapshot_model), 200, headers
+
+
+@slots.route('/history')
+class SlotHistoryResource(Resource, WithService):
+    @slots.marshal_with(history_model)
+    @slots.param('site', 'only slots at this site', _in='query')
+    @slots.param('start', 'only slots at or after this ISO date or date time', _in='query')
+    @slots.param('end', 'only slots before this ISO date or date time', _in='query')
+    def get(self):
+        site = request.args.get('site')
+        try:
+            start, end = (datetime.fromisoformat(request.args[name]) if name in request.args else None
+                          for name in ('start', 'end'))
+        except ValueError as e:
+            slots.abort(400, str(e))
+        return {'slots': self.slot_history.slots(site=site, start=start, end=end),
+                'mean_lifetime': self.slot_history.mean_lifetime(site=site, start=start, end=end)}
+
+
+@watch.route('')
+class WatchResource(Resource, WithService):
+    @watch.marshal_with(watch_model)
+    def get(self):
+        return self.slot_refresher
+
+
+def add_api(flask_app: Flask):
+    blueprint = Blueprint('api_v1', __name__, url_prefix='/api/v1')
+    api = Api(blueprint, version='1.0', title='Bavarian Vaccination API', doc='/docs')
+    for namespace in (sessions, appointments, slots, watch):
+        api.add_namespace(namespace)
+
+    @api.errorhandler(InvalidCredentialsException)
+    def not_logged_in(_):
+        return {'message': 'log in first or check the credentials'}, 401
+
+    @api.errorhandler(SlotTakenException)
+    @api.errorhandler(NoSlotBookedException)
+    def slot_taken(_):
+        return {'message': 'somebody else booked the slot first'}, 409
+
+    @api.errorhandler(BookingRefusedException)
+    def booking_refused(error):
+        return {'message': f'the vaccination portal refused the booking with [{error.response.status_code}]'}, 422
+
+    @api.errorhandler(UpstreamUnavailableException)
+    @api.errorhandler(CircuitOpenException)
+    def upstream_unavailable(error):
+        headers = {'Retry-After': str(ceil(error.retry_after))} if error.retry_after else {}
+        return {'message': 'the vaccination portal is not answering, try again later'}, 503, headers
+
+    flask_app.register_blueprint(blueprint)
@@ -1,11 +1,11 @@
-from datetime import datetime
-
-from flask import render_template, url_for, request, session
+from flask import url_for, request, stream_template
 from flask_classful import FlaskView
 from werkzeug.utils import redirect
 
-from vaccination.connectors import InvalidCredentialsException, Authentication
+from vaccination.booking import BookingEngine, NoSlotBookedException
+from vaccination.connectors import InvalidCredentialsException, BookingRefusedException
 from vaccination.entities import Appointment
+from vaccination.snapshot import SlotSnapshot
 from web.views.base import WithService
 
 
@@ -16,21 +16,38 @@ class AppointmentsView(FlaskView, WithService):
             authentication = self._get_auth_from_session()
             if self.service.has_next_appointment(authentication):
                 return f'already has an appointment {self.service.current_appointment(authentication)}'
-            appointments = self.service.appointments_in_range(authentication, datetime.now().date(), days=30)
-            return render_template('appointments.html', appointments=appointments)
+            refresher = self.slot_refresher
+            engine = self._booking_engine(authentication)
+            snapshot = refresher.snapshot
+            if snapshot is None or 'rescan' in request.args:
+                def on_snapshot(scanned):
+                    refresher.offer(authentication)
+                    self._offer_visible(engine, scanned)
+                # send every slot as soon as the scan finds it, the background refresh starts once it completes
+                appointments = refresher.stream(authentication, on_snapshot=on_snapshot)
+                return stream_template('appointments.html', appointments=appointments, snapshot=None)
+            refresher.offer(authentication)
+            self._offer_visible(engine, snapshot)
+            return stream_template('appointments.html', appointments=sorted(snapshot.appointments), snapshot=snapshot)
         except InvalidCredentialsException:
             return redirect(url_for('HomeView:index'))
 
+    @staticmethod
+    def _offer_visible(engine: BookingEngine, snapshot: SlotSnapshot):
+        # every rendered slot is prepared before the click, so a booking is a single request with fallbacks
+        engine.withdraw([candidate for candidate in engine.candidates if candidate not in snapshot.appointments])
+        engine.offer(snapshot.appointments)
+
     def post(self):
         appointment = Appointment.from_json(request.form)
         try:
-            self.service.book_appointment(self._get_auth_from_session(), appointment)
-            return f'booked {appointment}'
+            authentication = self._get_auth_from_session()
+            result = self._booking_engine(authentication).book_first(appointment)
+            self.booking_engines.close(authentication.account_key)
+            return f'booked {result.appointment}'
+        except NoSlotBookedException:
+            return f'{appointment} was booked by somebody else, try another slot', 409
+        except BookingRefusedException as e:
+            return f'booking {appointment} was refused by the portal with [{e.response.status_code}]', 422
         except InvalidCredentialsException:
             return redirect(url_for('HomeView:index'))
-
-    def _get_auth_from_session(self):
-        if 'auth' not in session:
-            raise InvalidCredentialsException()
-        authentication = Authentication.from_session(session['auth'])
-        return authentication
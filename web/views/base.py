@@ -1,11 +1,73 @@
-from flask import g
+from flask import current_app, session, after_this_request
 
-from vaccination.connectors import ImpzentrenBayernConnector
-from vaccination.login import UsernamePasswordLoginProvider
+from vaccination.booking import BookingEngines, BookingEngine
+from vaccination.connectors import ImpzentrenBayernConnector, Authentication, InvalidCredentialsException
+from vaccination.history import SlotHistory
+from vaccination.pool import ConnectorPool
+from vaccination.sessions import SessionStore, SessionState
 from vaccination.services import VaccinationAppointmentService
+from vaccination.snapshot import SnapshotRefresher
 
 
 class WithService:
-    def __init__(self):
-        self.service = VaccinationAppointmentService(ImpzentrenBayernConnector)
+    @property
+    def connector_pool(self) -> ConnectorPool:
+        return current_app.extensions['connector_pool']
 
+    @property
+    def service(self) -> VaccinationAppointmentService:
+        return VaccinationAppointmentService(ImpzentrenBayernConnector, self.connector_pool, self.slot_history)
+
+    @property
+    def slot_history(self) -> SlotHistory:
+        return current_app.extensions['slot_history']
+
+    @property
+    def slot_refresher(self) -> SnapshotRefresher:
+        return current_app.extensions['slot_refresher']
+
+    @property
+    def booking_engines(self) -> BookingEngines:
+        return current_app.extensions['booking_engines']
+
+    def _booking_engine(self, authentication: Authentication) -> BookingEngine:
+        return self.booking_engines.engine(self.service, authentication)
+
+    @property
+    def session_store(self) -> SessionStore:
+        return current_app.extensions['session_store']
+
+    def _start_session(self, authentication: Authentication):
+        self._end_session()
+        session['sid'] = self.session_store.create(SessionState(authentication))
+
+    def _end_session(self):
+        session_id = session.pop('sid', None)
+        if session_id is not None:
+            state = self.session_store.get(session_id)
+            if state is not None:
+                self.slot_refresher.withdraw(state.authentication.account_key)
+                self.booking_engines.close(state.authentication.account_key)
+            self.session_store.delete(session_id)
+
+    def _get_auth_from_session(self) -> Authentication:
+        session_id = session.get('sid')
+        state = self.session_store.get(session_id) if session_id else None
+        if state is None:
+            raise InvalidCredentialsException()
+        account_key = state.authentication.account_key
+        citizens = self.connector_pool.read_cache.citizens
+        if state.citizen is not None and account_key not in citizens:
+            # the citizen of an account never changes, no need to look it up again after a restart
+            citizens.put(account_key, state.citizen)
+        stored = state.to_json()
+
+        @after_this_request
+        def store_session_state(response):
+            if state.citizen is None:
+                state.citizen = citizens.get(account_key, count=False)
+            if state.to_json() != stored:
+                self.session_store.save(session_id, state)
+            return response
+
+        return state.authentication
@@ -1,4 +1,4 @@
-from flask import render_template, url_for, request, session
+from flask import render_template, url_for, request
 from flask_classful import FlaskView
 from werkzeug.utils import redirect
 
@@ -20,10 +20,11 @@ class HomeView(FlaskView, WithService):
         self.login_provider.provide(username, password)
         try:
             authentication = self.service.authentication(self.login_provider)
-            session['auth'] = authentication.access_token
+            self._start_session(authentication)
             return redirect(url_for('AppointmentsView:index'))
         except InvalidCredentialsException:
             return render_template('home.html', error='invalid credentials')
 
     def index(self):
+        self.connector_pool.prefetch_login()
         return render_template('home.html')
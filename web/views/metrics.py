@@ -0,0 +1,13 @@
+from flask import Response, current_app
+from flask_classful import FlaskView
+
+from vaccination.metrics import REGISTRY
+
+
+class MetricsView(FlaskView):
+    route_base = '/metrics'
+    trailing_slash = False
+
+    def index(self):
+        return Response(REGISTRY.render(current_app.extensions['metrics_collectors']),
+                        mimetype='text/plain; version=0.0.4')